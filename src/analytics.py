@@ -0,0 +1,1211 @@
+"""
+Grant Analytics
+
+This module computes the analyses of Fetcher.analyze_grants from a narrow, typed
+projection of the grant data. The projection is prepared once and shared by all
+analyses, instead of each analysis copying and re-typing the whole dataset.
+
+Features:
+- Organizations, provinces and recipients as categoricals, funding values as floats
+- Group-by results shared between analyses with the same keys
+- Top recipients by partial selection, with funding organizations kept as bitmasks
+  and turned into labels only for the winners
+- The same tables as the individual Fetcher analysis methods
+- Mergeable aggregate state, updated by inserting and retracting rows
+- Approximate organization summaries from mergeable sketches, with error bounds
+- Multi-year grants spread over the calendar or fiscal years they run through
+- Funding concentration (Gini, HHI, top shares) of every slice in one pass
+- On-disk cache of analysis results keyed by the data's content and the parameters
+"""
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from preprocessor import (_fingerprint_frame, companion_path, parse_numbers, prune_entries, read_frames, read_meta,
+                          write_frames)
+from sketches import HyperLogLog, KLLSketch
+
+logger = logging.getLogger(__name__)
+
+# Funding range labels and their upper bounds
+FUNDING_RANGE_LABELS = ['0-10K', '10K-50K', '50K-100K', '100K-500K', '500K+']
+FUNDING_RANGE_BINS = [0, 10000, 50000, 100000, 500000, float('inf')]
+
+# Agencies shown in the provincial distribution, in display order
+PROVINCIAL_ORGS = ['CIHR', 'NSERC', 'SSHRC']
+
+# First month of the federal fiscal year (April 1 to March 31); fiscal years are
+# labelled by the calendar year they start in
+FISCAL_YEAR_START_MONTH = 4
+
+# Units whose share of funding the concentration metrics measure
+CONCENTRATION_UNITS = {
+    'institutions': 'research_organization_name',
+    'recipients': 'recipient_legal_name',
+    'provinces': 'recipient_province',
+}
+
+# Bump when any analysis changes its results, so cached results are recomputed
+ANALYSIS_VERSION = "1"
+
+# Number of analysis results kept in the analysis cache
+ANALYSIS_CACHE_ENTRIES = 20
+
+# Columns any analysis reads; the analysis cache is keyed on their content
+ANALYSIS_COLUMNS = ['org', 'year', 'agreement_value', 'recipient_legal_name', 'recipient_province',
+                    'research_organization_name', 'agreement_start_date', 'agreement_end_date']
+
+# Default error bounds of approximate summaries: relative error of distinct counts
+# and normalized rank error of percentiles
+DEFAULT_DISTINCT_ERROR = 0.01
+DEFAULT_QUANTILE_ERROR = 0.01
+
+def to_float(values: pd.Series) -> pd.Series:
+    """Get funding values as float64, parsing them only if they are not numeric yet."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64', copy=False)
+    return parse_numbers(values)[0]
+
+def _labels(index: pd.Index) -> pd.Index:
+    """Turn a categorical group index back into plain labels."""
+    return index.astype(object) if isinstance(index, pd.CategoricalIndex) else index
+
+def _canonical_frame(df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """Get columns as float64 numbers or Python objects (None if missing), on a RangeIndex."""
+    canonical = {}
+    for col in columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            canonical[col] = values.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            canonical[col] = values.astype(object).where(values.notna(), None).to_numpy()
+    return pd.DataFrame(canonical, columns=list(columns))
+
+def content_fingerprint(df: pd.DataFrame, columns: Sequence[str]) -> str:
+    """
+    Fingerprint the content of DataFrame columns independently of how they are stored.
+
+    Numbers are compared as float64 and everything else as Python objects with None
+    for missing values, so a dataset read back from its CSV file has the fingerprint
+    of the frame it was written from.
+
+    Args:
+        df: DataFrame with the columns
+        columns: Columns to fingerprint
+
+    Returns:
+        Hash of the values of the columns, in row order
+    """
+    return _fingerprint_frame(_canonical_frame(df, columns))
+
+def year_label(year: float) -> str:
+    """Get the label of a year in year_fingerprints ('' for a missing year)."""
+    return '' if pd.isna(year) else f"{float(year):g}"
+
+def year_fingerprints(df: pd.DataFrame, columns: Sequence[str]) -> Dict[str, str]:
+    """
+    Fingerprint the content of DataFrame columns per year.
+
+    A year range extracted from a dataset has the fingerprints of those years of
+    the dataset, as long as the extraction keeps the order of the rows.
+
+    Args:
+        df: DataFrame with a year column and the columns
+        columns: Columns to fingerprint
+
+    Returns:
+        content_fingerprint of the rows of each year, keyed by year_label
+    """
+    years = pd.to_numeric(df['year'], errors='coerce').astype('float64')
+    canonical = _canonical_frame(df, columns)
+    return {year_label(year): _fingerprint_frame(group.reset_index(drop=True))
+            for year, group in canonical.groupby(years.to_numpy(), dropna=False, sort=True)}
+
+def totals_match(df: pd.DataFrame, rows: int, count: int, total: float) -> bool:
+    """
+    Check whether aggregates describe a DataFrame by its row count and funding totals.
+
+    Args:
+        df: DataFrame with a numeric agreement_value column
+        rows: Number of rows of the aggregates
+        count: Number of known agreement values of the aggregates
+        total: Total agreement value of the aggregates
+
+    Returns:
+        True if df has the same number of rows and known values and the same total
+    """
+    if 'agreement_value' not in df.columns or not pd.api.types.is_numeric_dtype(df['agreement_value']):
+        return False
+    values = df['agreement_value']
+    return (len(df) == rows and values.count() == count
+            and bool(np.isclose(values.sum(), total, rtol=1e-9, atol=0.005)))
+
+def org_summary_table(stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the organization summary table from per-organization statistics.
+
+    Args:
+        stats: count, sum, mean, median and recipients of each organization
+
+    Returns:
+        DataFrame with grant count, total, average and median funding and the
+        number of recipients of each organization
+    """
+    data = stats[['count', 'sum', 'mean', 'median', 'recipients']].round(2)
+    data.columns = ['# of Grants', 'Total Funding ($)', 'Average Funding ($)', 'Median Funding ($)', '# of Recipients']
+    data.index = _labels(data.index)
+    data.index.name = 'Organization'
+    return data.reset_index()
+
+def top_positions(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k largest values, largest first, without sorting all values.
+
+    Ties are broken by position, so the selection is deterministic. Missing values
+    rank last.
+
+    Args:
+        values: Values to rank
+        k: Number of positions to select
+
+    Returns:
+        int64 positions of the selected values
+    """
+    values = np.where(np.isnan(values), -np.inf, np.asarray(values, dtype=np.float64))
+    k = max(min(k, len(values)), 0)
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(values):
+        threshold = np.partition(values, len(values) - k)[len(values) - k]
+        above = np.flatnonzero(values > threshold)
+        tied = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+def org_bitmasks(members: np.ndarray, orgs: np.ndarray, n_members: int, n_orgs: int) -> np.ndarray:
+    """
+    Encode the organizations of each member (e.g. recipient) as a bitmask.
+
+    Args:
+        members: Member code of each row (negative if missing)
+        orgs: Organization code of each row (negative if missing)
+        n_members: Number of member codes
+        n_orgs: Number of organization codes (at most 64)
+
+    Returns:
+        uint64 mask per member with bit i set if organization i appears with it
+    """
+    if n_orgs > 64:
+        raise ValueError(f"Organization bitmasks hold at most 64 organizations, got {n_orgs}")
+    valid = (members >= 0) & (orgs >= 0)
+    pairs = members[valid].astype(np.int64) * n_orgs + orgs[valid]
+    present = np.bincount(pairs, minlength=n_members * n_orgs).reshape(n_members, n_orgs) > 0
+    bits = np.left_shift(np.uint64(1), np.arange(n_orgs, dtype=np.uint64))
+    return np.bitwise_or.reduce(np.where(present, bits, np.uint64(0)), axis=1) if n_orgs else np.zeros(n_members, dtype=np.uint64)
+
+def org_labels(masks: np.ndarray, orgs: Sequence[str]) -> list:
+    """
+    Turn organization bitmasks into comma-separated, sorted organization names.
+
+    Args:
+        masks: Organization bitmasks (see org_bitmasks)
+        orgs: Organization name of each bit
+
+    Returns:
+        Label of each mask (each distinct mask is decoded once)
+    """
+    labels = {}
+    for mask in np.unique(masks):
+        names = [str(org) for bit, org in enumerate(orgs) if int(mask) >> bit & 1]
+        labels[mask] = ', '.join(sorted(names))
+    return [labels[mask] for mask in masks]
+
+def top_recipients_table(stats: pd.DataFrame, top: int, orgs: Sequence[str]) -> pd.DataFrame:
+    """
+    Build the top recipients table from per-recipient statistics.
+
+    Args:
+        stats: sum, count and mean of each recipient's agreements and the bitmask
+            of the organizations that funded them ('orgs')
+        top: Number of recipients to include
+        orgs: Organization name of each bitmask bit
+
+    Returns:
+        DataFrame with the total, count and average of each top recipient's
+        agreements and the organizations that funded them
+    """
+    winners = stats.iloc[top_positions(stats['sum'].to_numpy(dtype=np.float64), top)]
+
+    data = winners[['sum', 'count', 'mean']].copy()
+    data['Organizations'] = org_labels(winners['orgs'].to_numpy(dtype=np.uint64), orgs)
+    data.columns = ['Total Funding ($)', 'Number of Agreements', 'Average Funding ($)', 'Organizations']
+    data.index = _labels(data.index)
+    data.index.name = 'recipient_legal_name'
+    data = data.reset_index()
+    data.index = data.index + 1  # Start index at 1
+    return data
+
+def provincial_table(province_funding: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the provincial distribution table from funding sums.
+
+    Args:
+        province_funding: Funding per province/state (rows) and organization (columns)
+
+    Returns:
+        DataFrame with each organization's share and total of the funding of every
+        province/state, largest total first
+    """
+    province_funding = province_funding.copy()
+    province_funding.index = _labels(province_funding.index)
+    province_funding.columns = _labels(province_funding.columns)
+
+    # Add total column
+    province_funding['Total'] = province_funding.sum(axis=1)
+
+    # Calculate percentages
+    province_pct = province_funding.div(province_funding.sum(axis=1), axis=0) * 100
+
+    # Combine funding and percentage data
+    combined_data = pd.DataFrame(index=province_funding.index)
+    for org in PROVINCIAL_ORGS:
+        if org in province_funding.columns:
+            combined_data[f'{org} (%)'] = province_pct[org]
+            combined_data[f'{org} ($)'] = province_funding[org]
+
+    combined_data['Total ($)'] = province_funding['Total']
+    combined_data = combined_data.sort_values('Total ($)', ascending=False).reset_index()
+    combined_data.index += 1  # Start index at 1
+    combined_data.rename(columns={'recipient_province': 'Province/State'}, inplace=True)
+    return combined_data
+
+def funding_range_table(counts: np.ndarray, orgs: pd.Index) -> pd.DataFrame:
+    """
+    Build the funding range table from grant counts.
+
+    Args:
+        counts: Array of shape (organizations, funding ranges) with grant counts
+        orgs: Organization of each row of counts
+
+    Returns:
+        DataFrame with one row per organization that has grants in a range and one
+        column per funding range
+    """
+    observed = counts.sum(axis=1) > 0
+    return pd.DataFrame(
+        counts[observed],
+        index=pd.Index(np.asarray(orgs, dtype=object)[observed], name='Organization'),
+        columns=pd.CategoricalIndex(FUNDING_RANGE_LABELS, categories=FUNDING_RANGE_LABELS,
+                                    ordered=True, name='funding_range')
+    )
+
+def provincial_table_of(sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the provincial distribution table from aggregated funding.
+
+    Args:
+        sums: Aggregates with recipient_province, org and sum columns
+
+    Returns:
+        The provincial distribution table (missing provinces as 'Unknown')
+    """
+    sums = sums[sums['org'].notna()]
+    province = sums['recipient_province'].astype(object).fillna('Unknown')
+    funding = sums.groupby([province, sums['org'].astype(object)], sort=True)['sum'].sum()
+    return provincial_table(funding.unstack('org', fill_value=0))
+
+def funding_range_table_of(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the funding range table from aggregated grant counts.
+
+    Args:
+        counts: Aggregates with org, funding_range and rows columns
+
+    Returns:
+        The funding range table
+    """
+    counts = counts[counts['org'].notna() & counts['funding_range'].notna()]
+    grants = counts.groupby([counts['org'].astype(object), 'funding_range'], sort=True)['rows'].sum()
+    grants = grants.unstack('funding_range', fill_value=0).reindex(columns=FUNDING_RANGE_LABELS, fill_value=0)
+    return funding_range_table(grants.to_numpy(), grants.index)
+
+def funding_ranges_of(values: pd.Series) -> pd.Series:
+    """Assign funding values to the standard funding ranges (missing if out of range)."""
+    return pd.cut(values, bins=FUNDING_RANGE_BINS, labels=FUNDING_RANGE_LABELS).rename('funding_range')
+
+def _year_start_days(years: np.ndarray, fiscal: bool) -> np.ndarray:
+    """Days since the epoch of the first day of each calendar (or fiscal) year."""
+    months = (years.astype(np.int64) - 1970) * 12 + (FISCAL_YEAR_START_MONTH - 1 if fiscal else 0)
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+def _year_of_days(days: np.ndarray, fiscal: bool) -> np.ndarray:
+    """Calendar (or fiscal) year of each day given as days since the epoch."""
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if fiscal:
+        months = months - (FISCAL_YEAR_START_MONTH - 1)
+    return months // 12 + 1970
+
+def annualize_funding(df: pd.DataFrame, fiscal: bool = False) -> pd.DataFrame:
+    """
+    Spread each grant's agreement_value over the years between its start and end date.
+
+    Each year gets the share of the value matching its share of the agreement's days
+    (both dates inclusive). Grants without a usable date range keep their whole value
+    in their start year, or in the year column if the start date is missing too;
+    grants without a year or value are left out.
+
+    Args:
+        df: Grant data with agreement_value, agreement_start_date and
+            agreement_end_date columns (and optionally year)
+        fiscal: Spread over fiscal years (April to March) instead of calendar years
+
+    Returns:
+        DataFrame with one row per grant and year: grant (row position in df),
+        year and amount
+    """
+    values = to_float(df['agreement_value']).to_numpy()
+    start = pd.to_datetime(df['agreement_start_date'], errors='coerce').to_numpy().astype('datetime64[D]')
+    end = pd.to_datetime(df['agreement_end_date'], errors='coerce').to_numpy().astype('datetime64[D]')
+    known_start = ~np.isnat(start)
+    spread = known_start & ~np.isnat(end) & (end >= start)
+
+    start_days = start.astype(np.int64)
+    end_days = end.astype(np.int64) + 1  # exclusive
+    first_year = np.full(len(df), -1, dtype=np.int64)
+    first_year[known_start] = _year_of_days(start_days[known_start], fiscal)
+    if 'year' in df.columns:
+        years = pd.to_numeric(df['year'], errors='coerce').to_numpy(dtype=np.float64)
+        fallback = ~known_start & ~np.isnan(years)
+        first_year[fallback] = years[fallback]
+    last_year = first_year.copy()
+    last_year[spread] = _year_of_days(end_days[spread] - 1, fiscal)
+
+    keep = (first_year >= 0) & ~np.isnan(values)
+    grants = np.flatnonzero(keep)
+    n_years = (last_year - first_year + 1)[grants]
+
+    # One output row per grant and year: repeat each grant, then offset its first year
+    rows = np.repeat(grants, n_years)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n_years) - n_years, n_years)
+    year = first_year[rows] + offsets
+
+    amount = values[rows]
+    spread_rows = spread[rows]
+    if spread_rows.any():
+        period_start = _year_start_days(year[spread_rows], fiscal)
+        period_end = _year_start_days(year[spread_rows] + 1, fiscal)
+        grant_start, grant_end = start_days[rows][spread_rows], end_days[rows][spread_rows]
+        overlap = np.minimum(grant_end, period_end) - np.maximum(grant_start, period_start)
+        amount[spread_rows] *= overlap / (grant_end - grant_start)
+
+    return pd.DataFrame({
+        'grant': rows.astype(np.int32),
+        'year': year.astype(np.int16),
+        'amount': amount,
+    })
+
+def annual_funding_table(flows: pd.DataFrame, df: pd.DataFrame, by: str = 'org') -> pd.DataFrame:
+    """
+    Annualized funding per year and grant attribute.
+
+    Args:
+        flows: Annualized funding of df (see annualize_funding)
+        df: The grant data the flows were expanded from
+        by: Column of df to break the funding down by
+
+    Returns:
+        DataFrame with one row per year, one column per value of the by column
+        and a Total column
+    """
+    codes, labels = pd.factorize(df[by].to_numpy()[flows['grant'].to_numpy()], sort=True)
+    years = flows['year'].to_numpy(dtype=np.int64)
+    known = codes >= 0
+    if not known.any():
+        return pd.DataFrame(columns=['Total'], index=pd.Index([], name='Year'))
+
+    # Sum the amounts by year and label on integer codes
+    first = years.min()
+    n_labels = len(labels)
+    sums = np.bincount((years[known] - first) * n_labels + codes[known], weights=flows['amount'].to_numpy()[known],
+                       minlength=(years.max() - first + 1) * n_labels).reshape(-1, n_labels)
+    table = pd.DataFrame(sums, index=pd.Index(np.arange(first, years.max() + 1), name='Year'),
+                         columns=pd.Index(labels, name=by))
+    table = table[table.sum(axis=1) > 0]
+    table['Total'] = table.sum(axis=1)
+    return table.round(2)
+
+def concentration_metrics(df: pd.DataFrame, unit: str = 'research_organization_name',
+                          by: Sequence[str] = ('org', 'year'), tops: Sequence[int] = (1, 5, 10)) -> pd.DataFrame:
+    """
+    Concentration of funding across units (e.g. institutions) within every slice.
+
+    Funding is summed per slice and unit, sorted by slice and decreasing amount, and
+    all metrics are read off one cumulative sum over the partitioned arrays. Units
+    without positive funding in a slice are not counted.
+
+    Args:
+        df: Grant data with agreement_value, the unit column and the by columns
+        unit: Column naming the units funding is shared between
+        by: Columns defining the slices
+        tops: Numbers of largest units whose combined share is reported
+
+    Returns:
+        DataFrame indexed by slice with the number of units, total funding, Gini
+        coefficient, Herfindahl-Hirschman index (sum of squared shares, 0 to 1) and
+        a top{k}_share column per entry of tops
+    """
+    by = list(by)
+    values = to_float(df['agreement_value'])
+    amounts = values.groupby([df[col] for col in by + [unit]], observed=True, sort=True).sum()
+    amounts = amounts[amounts > 0]
+    slices = amounts.index.droplevel(-1) if len(by) > 1 else amounts.index.get_level_values(0)
+    if amounts.empty:
+        # No slice has positive funding
+        columns = {'units': np.int64, 'total': np.float64, 'gini': np.float64, 'hhi': np.float64}
+        columns.update({f'top{k}_share': np.float64 for k in tops})
+        return pd.DataFrame({col: np.array([], dtype=dtype) for col, dtype in columns.items()}, index=slices[:0])
+    slice_codes, slice_index = pd.factorize(slices, sort=True)
+    if len(by) == 1:
+        slice_index = pd.Index(slice_index, name=by[0])
+    else:
+        slice_index = pd.MultiIndex.from_tuples(slice_index, names=by)
+
+    # Partition by slice with the largest amount first
+    x = amounts.to_numpy(dtype=np.float64)
+    order = np.lexsort((-x, slice_codes))
+    x, slice_codes = x[order], slice_codes[order]
+    n_slices = len(slice_index)
+    starts = np.searchsorted(slice_codes, np.arange(n_slices))
+    units = np.bincount(slice_codes, minlength=n_slices)
+    total = np.bincount(slice_codes, weights=x, minlength=n_slices)
+
+    cumulative = np.cumsum(x)
+    before = np.where(starts > 0, cumulative[np.maximum(starts - 1, 0)], 0.0)
+    position = np.arange(len(x)) - starts[slice_codes]
+
+    # Gini from the ascending rank (units - position) of each amount
+    ascending_rank = units[slice_codes] - position
+    weighted = np.bincount(slice_codes, weights=ascending_rank * x, minlength=n_slices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini = 2 * weighted / (units * total) - (units + 1) / units
+        hhi = np.bincount(slice_codes, weights=(x / total[slice_codes]) ** 2, minlength=n_slices)
+
+        result = pd.DataFrame({'units': units, 'total': total, 'gini': gini, 'hhi': hhi}, index=slice_index)
+        for k in tops:
+            last = starts + np.minimum(k, units) - 1
+            result[f'top{k}_share'] = (cumulative[np.maximum(last, 0)] - before) / total
+    return result
+
+class AnalyticsContext:
+    """
+    Shared, typed projection of grant data for the standard analyses.
+
+    The context holds only the columns the analyses read. Group-by results are
+    computed on first use and reused by every analysis with the same keys.
+    """
+
+    # Columns of the projection
+    COLUMNS = ['org', 'recipient_province', 'recipient_legal_name', 'agreement_value']
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Build the projection.
+
+        Args:
+            df: Grant data with org, recipient_province, recipient_legal_name and
+                agreement_value columns
+        """
+        self.frame = pd.DataFrame({
+            'org': df['org'].astype('category'),
+            'recipient_province': df['recipient_province'].astype('category'),
+            'recipient_legal_name': df['recipient_legal_name'].astype('category'),
+            'agreement_value': to_float(df['agreement_value']),
+        }).reset_index(drop=True)
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def _org_stats(self) -> pd.DataFrame:
+        """Funding statistics and number of recipients per organization, in one group-by."""
+        if 'org_stats' not in self._cache:
+            self._cache['org_stats'] = self.frame.groupby('org', observed=True).agg(
+                count=('agreement_value', 'count'),
+                sum=('agreement_value', 'sum'),
+                mean=('agreement_value', 'mean'),
+                median=('agreement_value', 'median'),
+                recipients=('recipient_legal_name', 'nunique'),
+            )
+        return self._cache['org_stats']
+
+    def _recipient_stats(self) -> pd.DataFrame:
+        """Sum, count and mean of agreement_value and the organizations bitmask per recipient."""
+        if 'recipient_stats' not in self._cache:
+            stats = self.frame.groupby('recipient_legal_name', observed=True)[
+                'agreement_value'].agg(['sum', 'count', 'mean'])
+
+            recipients, org = self.frame['recipient_legal_name'].cat, self.frame['org'].cat
+            masks = org_bitmasks(recipients.codes.to_numpy(), org.codes.to_numpy(),
+                                 len(recipients.categories), len(org.categories))
+            stats['orgs'] = masks[stats.index.codes]
+            self._cache['recipient_stats'] = stats
+        return self._cache['recipient_stats']
+
+    def org_summary(self) -> pd.DataFrame:
+        """
+        Summary statistics per organization.
+
+        Returns:
+            DataFrame with grant count, total, average and median funding and the
+            number of recipients of each organization
+        """
+        return org_summary_table(self._org_stats())
+
+    def provincial_distribution(self) -> pd.DataFrame:
+        """
+        Funding per province/state and organization.
+
+        Returns:
+            DataFrame with each organization's share and total of the funding of every
+            province/state (missing provinces as 'Unknown'), largest total first
+        """
+        province = self.frame['recipient_province']
+        if province.isna().any():
+            if 'Unknown' not in province.cat.categories:
+                province = province.cat.add_categories('Unknown')
+            province = province.fillna('Unknown')
+
+        sums = self.frame.groupby([province, self.frame['org']], observed=True)['agreement_value'].sum()
+        return provincial_table(sums.unstack('org', fill_value=0))
+
+    def top_recipients(self, top: int = 10) -> pd.DataFrame:
+        """
+        Recipients with the most total funding.
+
+        Args:
+            top: Number of recipients to include
+
+        Returns:
+            DataFrame with the total, count and average of each top recipient's
+            agreements and the organizations that funded them
+        """
+        return top_recipients_table(self._recipient_stats(), top, self.frame['org'].cat.categories)
+
+    def funding_ranges(self) -> pd.DataFrame:
+        """
+        Number of grants per organization and funding range.
+
+        Returns:
+            DataFrame with one row per organization and one column per funding range
+        """
+        org = self.frame['org'].cat
+        ranges = funding_ranges_of(self.frame['agreement_value']).cat.codes.to_numpy()
+        org_codes = org.codes.to_numpy()
+
+        # Count grants by organization and funding range on the category codes
+        valid = (org_codes >= 0) & (ranges >= 0)
+        n_ranges = len(FUNDING_RANGE_LABELS)
+        counts = np.bincount(
+            org_codes[valid].astype(np.int64) * n_ranges + ranges[valid],
+            minlength=len(org.categories) * n_ranges
+        ).reshape(-1, n_ranges)
+        return funding_range_table(counts, org.categories)
+
+    def analyze(self, top: int = 10) -> Dict[str, pd.DataFrame]:
+        """
+        Run all standard analyses.
+
+        Args:
+            top: Number of top recipients to include
+
+        Returns:
+            Dictionary with summary_by_org, provincial_distribution, top_recipients
+            and funding_ranges tables
+        """
+        return {
+            'summary_by_org': self.org_summary(),
+            'provincial_distribution': self.provincial_distribution(),
+            'top_recipients': self.top_recipients(top),
+            'funding_ranges': self.funding_ranges(),
+        }
+
+# Bump when the layout or meaning of stored aggregate states changes
+STATE_VERSION = "2"
+
+# Key columns and additive measures of each table of an AnalyticsState
+STATE_TABLES = {
+    'values': (['org', 'agreement_value'], ['rows']),
+    'recipients': (['org', 'recipient_legal_name'], ['rows', 'count', 'sum']),
+    'provinces': (['recipient_province', 'org'], ['rows', 'sum']),
+    'ranges': (['org', 'funding_range'], ['rows']),
+}
+
+# Columns a dataset needs for an aggregate state to be built from it
+STATE_SOURCE_COLUMNS = AnalyticsContext.COLUMNS
+
+def state_path(data_file: Union[str, Path]) -> Path:
+    """Get the path (without suffix) of the aggregate state stored for a dataset file."""
+    return companion_path(data_file, "aggregates")
+
+class AnalyticsState:
+    """
+    Mergeable aggregates of grant data for the standard analyses.
+
+    Every table holds additive measures per key, so the state of a union of rows is
+    the sum of their states and rows are retracted by subtracting their state. This
+    keeps the state exact under updates: the value counts per organization act as a
+    quantile summary for medians, and the recipient counts per organization as a
+    distinct count that, unlike a HyperLogLog sketch, can forget a recipient again.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], fingerprint: Optional[str] = None):
+        """
+        Initialize the state.
+
+        Args:
+            tables: One DataFrame per entry of STATE_TABLES, with its key and
+                measure columns
+            fingerprint: content_fingerprint of the STATE_SOURCE_COLUMNS of the
+                aggregated rows, if known
+        """
+        self.tables = tables
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'AnalyticsState':
+        """
+        Build the state of a DataFrame.
+
+        Args:
+            df: Grant data with the STATE_SOURCE_COLUMNS
+
+        Returns:
+            AnalyticsState of the rows of df
+        """
+        values = to_float(df['agreement_value'])
+        frame = pd.DataFrame({
+            'org': df['org'].astype('category'),
+            'recipient_province': df['recipient_province'].astype('category'),
+            'recipient_legal_name': df['recipient_legal_name'].astype('category'),
+            'agreement_value': values,
+            'funding_range': funding_ranges_of(values),
+        }).reset_index(drop=True)
+
+        tables = {}
+        for name, (keys, measures) in STATE_TABLES.items():
+            grouped = frame.groupby(keys, dropna=False, observed=True, sort=True)
+            aggregations = {
+                'rows': ('agreement_value', 'size'),
+                'count': ('agreement_value', 'count'),
+                'sum': ('agreement_value', 'sum'),
+            }
+            table = grouped.agg(**{measure: aggregations[measure] for measure in measures}).reset_index()
+            for key in keys:
+                if isinstance(table[key].dtype, pd.CategoricalDtype):
+                    table[key] = table[key].astype(object)
+            tables[name] = table
+        return cls(tables)
+
+    @classmethod
+    def merge(cls, *states: 'AnalyticsState') -> 'AnalyticsState':
+        """
+        Combine states, e.g. of chunks of a dataset, into the state of all their rows.
+
+        Args:
+            *states: States to combine (retracted rows as negated states)
+
+        Returns:
+            Combined AnalyticsState
+
+        Raises:
+            ValueError: If more rows are retracted from a key than it holds
+        """
+        tables = {}
+        for name, (keys, measures) in STATE_TABLES.items():
+            combined = pd.concat([state.tables[name] for state in states], ignore_index=True)
+            table = combined.groupby(keys, dropna=False, sort=True)[measures].sum().reset_index()
+            if (table['rows'] < 0).any():
+                raise ValueError(f"Retracted rows are not part of the aggregate state ({name})")
+            tables[name] = table[table['rows'] > 0].reset_index(drop=True)
+        return cls(tables)
+
+    def negate(self) -> 'AnalyticsState':
+        """Get the state that cancels this one when merged with it."""
+        tables = {}
+        for name, (keys, measures) in STATE_TABLES.items():
+            table = self.tables[name].copy()
+            table[measures] = -table[measures]
+            tables[name] = table
+        return AnalyticsState(tables)
+
+    def apply(self, inserted: Optional[pd.DataFrame] = None,
+              retracted: Optional[pd.DataFrame] = None) -> 'AnalyticsState':
+        """
+        Update the state with inserted and retracted rows.
+
+        An amended grant is applied by retracting the row it replaces and inserting
+        its new row.
+
+        Args:
+            inserted: Rows added to the aggregated data
+            retracted: Rows removed from the aggregated data
+
+        Returns:
+            AnalyticsState of the updated data
+
+        Raises:
+            ValueError: If retracted rows are not part of the state
+        """
+        states = [self]
+        if inserted is not None and not inserted.empty:
+            states.append(AnalyticsState.from_frame(inserted))
+        if retracted is not None and not retracted.empty:
+            states.append(AnalyticsState.from_frame(retracted).negate())
+        return AnalyticsState.merge(*states) if len(states) > 1 else self
+
+    def describes(self, df: pd.DataFrame) -> bool:
+        """
+        Check whether the state holds the aggregates of a DataFrame.
+
+        Args:
+            df: DataFrame with the STATE_SOURCE_COLUMNS
+
+        Returns:
+            True if the state's fingerprint is the one of df's STATE_SOURCE_COLUMNS
+        """
+        if self.fingerprint is None or any(col not in df.columns for col in STATE_SOURCE_COLUMNS):
+            return False
+        return content_fingerprint(df, STATE_SOURCE_COLUMNS) == self.fingerprint
+
+    def matches_totals(self, df: pd.DataFrame) -> bool:
+        """
+        Check whether the state has the row count and funding totals of a DataFrame.
+
+        Args:
+            df: DataFrame with an agreement_value column
+
+        Returns:
+            True if df has the state's number of rows and known values and its total
+        """
+        values = self.tables['values']
+        known = values[values['agreement_value'].notna()]
+        return totals_match(df, values['rows'].sum(), known['rows'].sum(),
+                            (known['agreement_value'] * known['rows']).sum())
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Store the state; the metadata file is written last and marks it as complete.
+
+        Args:
+            path: State path (see state_path)
+
+        Returns:
+            Path of the state's metadata file
+        """
+        return write_frames(path, self.tables, {
+            "version": STATE_VERSION,
+            "tables": {name: len(table) for name, table in self.tables.items()},
+            "rows": int(self.tables['values']['rows'].sum()),
+            "fingerprint": self.fingerprint,
+        })
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional['AnalyticsState']:
+        """
+        Load a stored state.
+
+        Args:
+            path: State path (see state_path)
+
+        Returns:
+            The stored AnalyticsState, or None if there is no complete, current state
+        """
+        meta = read_meta(path, version=STATE_VERSION)
+        tables = read_frames(path, list(STATE_TABLES)) if meta is not None else None
+        if tables is None:
+            return None
+        return cls(tables, meta.get("fingerprint"))
+
+    def org_summary(self) -> pd.DataFrame:
+        """
+        Summary statistics per organization.
+
+        Returns:
+            The organization summary table
+        """
+        values = self.tables['values']
+        values = values[values['org'].notna()]
+        known = values[values['agreement_value'].notna()].sort_values(['org', 'agreement_value'], kind='stable')
+
+        count = known.groupby('org', sort=True)['rows'].sum()
+        total = (known['agreement_value'] * known['rows']).groupby(known['org'], sort=True).sum()
+
+        # Medians from the sorted value counts: find the values at the middle ranks
+        counts = count.to_numpy()
+        offsets = np.cumsum(counts) - counts
+        cumulative = known['rows'].to_numpy().cumsum()
+        sorted_values = known['agreement_value'].to_numpy()
+        lower = np.searchsorted(cumulative, offsets + (counts - 1) // 2, side='right')
+        upper = np.searchsorted(cumulative, offsets + counts // 2, side='right')
+        median = pd.Series((sorted_values[lower] + sorted_values[upper]) / 2, index=count.index)
+
+        recipients = self.tables['recipients']
+        recipients = recipients[recipients['org'].notna() & recipients['recipient_legal_name'].notna()]
+
+        orgs = pd.Index(values['org'].unique()).sort_values()
+        stats = pd.DataFrame({
+            'count': count.reindex(orgs, fill_value=0),
+            'sum': total.reindex(orgs, fill_value=0.0),
+            'median': median.reindex(orgs),
+            'recipients': recipients.groupby('org', sort=True).size().reindex(orgs, fill_value=0),
+        }, index=orgs)
+        stats['mean'] = stats['sum'] / stats['count'].where(stats['count'] > 0)
+        return org_summary_table(stats)
+
+    def provincial_distribution(self) -> pd.DataFrame:
+        """
+        Funding per province/state and organization.
+
+        Returns:
+            The provincial distribution table
+        """
+        return provincial_table_of(self.tables['provinces'])
+
+    def top_recipients(self, top: int = 10) -> pd.DataFrame:
+        """
+        Recipients with the most total funding.
+
+        Args:
+            top: Number of recipients to include
+
+        Returns:
+            The top recipients table
+        """
+        recipients = self.tables['recipients']
+        recipients = recipients[recipients['recipient_legal_name'].notna()]
+        org_codes, orgs = pd.factorize(recipients['org'], sort=True)
+        if len(orgs) > 64:
+            raise ValueError(f"Organization bitmasks hold at most 64 organizations, got {len(orgs)}")
+
+        # Each (org, recipient) key appears once, so summing the org bits ORs them
+        bits = np.where(org_codes >= 0, np.left_shift(np.uint64(1), np.maximum(org_codes, 0).astype(np.uint64)),
+                        np.uint64(0))
+        stats = recipients.assign(orgs=bits).groupby('recipient_legal_name', sort=True)[
+            ['sum', 'count', 'orgs']].sum()
+        stats['mean'] = stats['sum'] / stats['count'].where(stats['count'] > 0)
+
+        return top_recipients_table(stats, top, orgs)
+
+    def funding_ranges(self) -> pd.DataFrame:
+        """
+        Number of grants per organization and funding range.
+
+        Returns:
+            The funding range table
+        """
+        return funding_range_table_of(self.tables['ranges'])
+
+    def analyze(self, top: int = 10) -> Dict[str, pd.DataFrame]:
+        """
+        Run all standard analyses.
+
+        Args:
+            top: Number of top recipients to include
+
+        Returns:
+            Dictionary with summary_by_org, provincial_distribution, top_recipients
+            and funding_ranges tables
+        """
+        return {
+            'summary_by_org': self.org_summary(),
+            'provincial_distribution': self.provincial_distribution(),
+            'top_recipients': self.top_recipients(top),
+            'funding_ranges': self.funding_ranges(),
+        }
+
+class ApproximateSummary:
+    """
+    Mergeable per-organization sketches for an approximate organization summary.
+
+    Grant counts and funding totals stay exact. Medians and other percentiles of
+    agreement_value come from KLL sketches, and the distinct recipients and
+    institutions from HyperLogLog sketches, sized from the requested error bounds.
+    Summaries of separate chunks of a dataset merge into the summary of all of them.
+    """
+
+    # Columns the summary reads (research_organization_name is optional)
+    COLUMNS = ['org', 'agreement_value', 'recipient_legal_name', 'research_organization_name']
+
+    def __init__(self, distinct_error: float = DEFAULT_DISTINCT_ERROR,
+                 quantile_error: float = DEFAULT_QUANTILE_ERROR):
+        """
+        Initialize an empty summary.
+
+        Args:
+            distinct_error: Relative standard error of the distinct counts
+            quantile_error: Normalized rank error of the medians and percentiles
+        """
+        self.distinct_error = distinct_error
+        self.quantile_error = quantile_error
+        self.has_institutions = False
+        self.orgs: Dict[str, Dict] = {}
+
+    def _sketches(self, org: str) -> Dict:
+        """Get the sketches of an organization, creating empty ones if needed."""
+        if org not in self.orgs:
+            self.orgs[org] = {
+                'rows': 0,
+                'count': 0,
+                'sum': 0.0,
+                'values': KLLSketch.for_error(self.quantile_error),
+                'recipients': HyperLogLog.for_error(self.distinct_error),
+                'institutions': HyperLogLog.for_error(self.distinct_error),
+            }
+        return self.orgs[org]
+
+    def update(self, df: pd.DataFrame) -> 'ApproximateSummary':
+        """
+        Add rows to the summary.
+
+        Args:
+            df: Grant data with org, agreement_value and recipient_legal_name columns
+                (and optionally research_organization_name)
+
+        Returns:
+            The updated summary
+        """
+        values = to_float(df['agreement_value']).to_numpy()
+        institutions = df['research_organization_name'] if 'research_organization_name' in df.columns else None
+        self.has_institutions = self.has_institutions or institutions is not None
+
+        codes, orgs = pd.factorize(df['org'], sort=True)
+        for code, org in enumerate(orgs):
+            positions = np.flatnonzero(codes == code)
+            org_values = values[positions]
+            sketches = self._sketches(str(org))
+            sketches['rows'] += len(positions)
+            sketches['count'] += int(np.count_nonzero(~np.isnan(org_values)))
+            sketches['sum'] += float(np.nansum(org_values))
+            sketches['values'].update(org_values)
+            sketches['recipients'].update(df['recipient_legal_name'].iloc[positions])
+            if institutions is not None:
+                sketches['institutions'].update(institutions.iloc[positions])
+        return self
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, distinct_error: float = DEFAULT_DISTINCT_ERROR,
+                   quantile_error: float = DEFAULT_QUANTILE_ERROR) -> 'ApproximateSummary':
+        """Build the summary of a DataFrame."""
+        return cls(distinct_error, quantile_error).update(df)
+
+    def merge(self, other: 'ApproximateSummary') -> 'ApproximateSummary':
+        """
+        Add the rows of another summary with the same error bounds to this one.
+
+        Args:
+            other: Summary of other rows
+
+        Returns:
+            The merged summary
+        """
+        if (other.distinct_error, other.quantile_error) != (self.distinct_error, self.quantile_error):
+            raise ValueError("Cannot merge approximate summaries with different error bounds")
+        self.has_institutions = self.has_institutions or other.has_institutions
+        for org, theirs in other.orgs.items():
+            ours = self._sketches(org)
+            for measure in ('rows', 'count', 'sum'):
+                ours[measure] += theirs[measure]
+            for sketch in ('values', 'recipients', 'institutions'):
+                ours[sketch].merge(theirs[sketch])
+        return self
+
+    def org_summary(self) -> pd.DataFrame:
+        """
+        Approximate summary statistics per organization.
+
+        Returns:
+            The organization summary table with approximate medians and recipient
+            counts, plus the approximate number of institutions if they were available
+        """
+        orgs = sorted(self.orgs)
+        stats = pd.DataFrame({
+            'count': [self.orgs[org]['count'] for org in orgs],
+            'sum': [self.orgs[org]['sum'] for org in orgs],
+            'median': [self.orgs[org]['values'].quantiles([0.5])[0] for org in orgs],
+            'recipients': [round(self.orgs[org]['recipients'].estimate()) for org in orgs],
+        }, index=pd.Index(orgs, dtype=object))
+        stats['mean'] = stats['sum'] / stats['count'].where(stats['count'] > 0)
+
+        data = org_summary_table(stats)
+        if self.has_institutions:
+            data['# of Institutions'] = [round(self.orgs[org]['institutions'].estimate()) for org in orgs]
+        return data
+
+    def percentiles(self, qs: Sequence[float] = (0.25, 0.5, 0.75, 0.9)) -> pd.DataFrame:
+        """
+        Approximate percentiles of agreement_value per organization.
+
+        Args:
+            qs: Quantiles between 0 and 1
+
+        Returns:
+            DataFrame with one row per organization and one column per percentile
+        """
+        orgs = sorted(self.orgs)
+        return pd.DataFrame(
+            [self.orgs[org]['values'].quantiles(qs) for org in orgs],
+            index=pd.Index(orgs, dtype=object, name='Organization'),
+            columns=[f'P{q * 100:g}' for q in qs]
+        )
+
+    def error_bounds(self) -> pd.DataFrame:
+        """
+        Error bounds of the approximate statistics.
+
+        Returns:
+            DataFrame with the sketch behind each approximate statistic and its error bound
+        """
+        values = KLLSketch.for_error(self.quantile_error)
+        distinct = HyperLogLog.for_error(self.distinct_error)
+        distinct_sketch = f'HyperLogLog (2^{distinct.precision} registers)'
+        rows = [
+            ('Median Funding ($)', f'KLL (k={values.k})', 'rank (99% confidence)', values.rank_error),
+            ('# of Recipients', distinct_sketch, 'relative (standard error)', distinct.relative_error),
+        ]
+        if self.has_institutions:
+            rows.append(('# of Institutions', distinct_sketch, 'relative (standard error)', distinct.relative_error))
+        bounds = pd.DataFrame(rows, columns=['Statistic', 'Sketch', 'Error', 'Bound (%)'])
+        bounds['Bound (%)'] = (bounds['Bound (%)'] * 100).round(2)
+        return bounds
+
+def _summarize_chunk(chunk: pd.DataFrame, distinct_error: float, quantile_error: float) -> ApproximateSummary:
+    """Build the approximate summary of one chunk (run in worker processes)."""
+    return ApproximateSummary.from_frame(chunk, distinct_error, quantile_error)
+
+def summarize_approximately(df: pd.DataFrame, distinct_error: float = DEFAULT_DISTINCT_ERROR,
+                            quantile_error: float = DEFAULT_QUANTILE_ERROR,
+                            chunk_size: int = 100000, max_workers: int = 1) -> ApproximateSummary:
+    """
+    Build the approximate summary of a DataFrame from the summaries of its chunks.
+
+    Args:
+        df: Grant data
+        distinct_error: Relative standard error of the distinct counts
+        quantile_error: Normalized rank error of the medians and percentiles
+        chunk_size: Number of rows per chunk
+        max_workers: Number of worker processes summarizing chunks
+
+    Returns:
+        ApproximateSummary of all rows
+    """
+    columns = [col for col in ApproximateSummary.COLUMNS if col in df.columns]
+    chunks = [df.iloc[start:start + chunk_size][columns] for start in range(0, len(df), chunk_size)]
+
+    if max_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(_summarize_chunk, chunks, repeat(distinct_error), repeat(quantile_error)))
+    else:
+        parts = [_summarize_chunk(chunk, distinct_error, quantile_error) for chunk in chunks]
+
+    summary = ApproximateSummary(distinct_error, quantile_error)
+    for part in parts:
+        summary.merge(part)
+    return summary
+
+def analysis_cache_key(df: pd.DataFrame, params: Dict) -> str:
+    """
+    Build the analysis cache key of a DataFrame.
+
+    Args:
+        df: Grant data to be analyzed
+        params: Analysis parameters (e.g. top, engine, optional analyses)
+
+    Returns:
+        Hash of the analyzed columns' content, the parameters and ANALYSIS_VERSION
+    """
+    columns = [col for col in ANALYSIS_COLUMNS if col in df.columns]
+    key = [_fingerprint_frame(df, columns), json.dumps(params, sort_keys=True, default=str), ANALYSIS_VERSION]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+class AnalysisCache:
+    """
+    On-disk cache of analysis results, one columnar file per result table.
+
+    Entries are keyed by analysis_cache_key; an entry's metadata file is written
+    last and marks it as complete. Storing an entry removes the least recently
+    used ones beyond max_entries.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_entries: int = ANALYSIS_CACHE_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cached results
+            max_entries: Number of entries kept
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+
+    def load(self, key: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Load cached analysis results.
+
+        Args:
+            key: Cache key (see analysis_cache_key)
+
+        Returns:
+            Dictionary of result tables, or None if there is no complete entry
+        """
+        meta = read_meta(self.cache_dir / key)
+        results = read_frames(self.cache_dir / key, meta.get("tables", [])) if meta is not None else None
+        if results is None:
+            return None
+        for name, categories in meta.get("categorical_columns", {}).items():
+            # Parquet keeps column labels as plain strings
+            results[name].columns = pd.CategoricalIndex(results[name].columns, categories=categories["categories"],
+                                                        ordered=categories["ordered"], name=categories["name"])
+        # Mark the entry as recently used, so pruning keeps it
+        os.utime(self.cache_dir / f"{key}.json")
+        return results
+
+    def store(self, key: str, results: Dict[str, pd.DataFrame]) -> None:
+        """
+        Store analysis results.
+
+        Args:
+            key: Cache key (see analysis_cache_key)
+            results: Dictionary of result tables
+        """
+        try:
+            tables = {}
+            categorical_columns = {}
+            for name, table in results.items():
+                if isinstance(table.columns, pd.CategoricalIndex):
+                    categorical_columns[name] = {
+                        "name": table.columns.name,
+                        "categories": table.columns.categories.tolist(),
+                        "ordered": bool(table.columns.ordered),
+                    }
+                    table = table.copy()
+                    table.columns = pd.Index(table.columns.astype(object), name=table.columns.name)
+                tables[name] = table
+            write_frames(self.cache_dir / key, tables, {
+                "version": ANALYSIS_VERSION,
+                "tables": list(results),
+                "categorical_columns": categorical_columns,
+            })
+            prune_entries(self.cache_dir, self.max_entries)
+        except Exception as e:
+            logger.warning(f"Could not cache analysis results: {str(e)}")
@@ -0,0 +1,269 @@
+"""
+Aggregate Cube
+
+This module materializes a precomputed aggregate cube of processed grant data so
+that common summaries can be answered by rolling up a few thousand cells instead
+of scanning every row.
+
+Features:
+- Cells over org x year x province x program x funding range
+- Count, sum, min/max and sum of squares of agreement_value per cell
+- A mergeable HyperLogLog sketch of the distinct recipients per cell
+- Slicing and roll-ups to any subset of the dimensions
+- The provincial distribution and funding range tables of the Fetcher analyses
+- Storage next to the dataset file it was built from
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from analytics import (funding_range_table_of, funding_ranges_of, provincial_table_of, to_float, year_fingerprints,
+                       year_label)
+from preprocessor import companion_path, read_frames, read_meta, write_frames
+from sketches import HLL_PRECISION, hash_values, hll_group_estimate, hll_observations
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout or meaning of stored cubes changes
+CUBE_VERSION = "2"
+
+# Dimensions of the cube, in cell order
+CUBE_DIMENSIONS = ['org', 'year', 'recipient_province', 'prog_name_en', 'funding_range']
+
+# Columns a dataset needs for a cube to be built from it
+CUBE_SOURCE_COLUMNS = ['org', 'year', 'recipient_province', 'prog_name_en',
+                       'agreement_value', 'recipient_legal_name']
+
+def cube_path(data_file: Union[str, Path]) -> Path:
+    """Get the path (without suffix) of the cube stored for a dataset file."""
+    return companion_path(data_file, "cube")
+
+class AggregateCube:
+    """
+    Precomputed aggregates of agreement_value over the cube dimensions.
+
+    Each cell holds the number of rows, the number of known values, their sum,
+    minimum, maximum and sum of squares. The distinct recipients of each cell are
+    kept as sparse HyperLogLog observations, so any set of cells can be merged into
+    a distinct count without the rows. The cube also keeps a fingerprint of the
+    source rows of every year, so it is only used for the data it was built from.
+    """
+
+    def __init__(self, cells: pd.DataFrame, sketch: pd.DataFrame, precision: int = HLL_PRECISION,
+                 fingerprints: Optional[Dict[str, str]] = None):
+        """
+        Initialize the cube.
+
+        Args:
+            cells: Cell aggregates, indexed by cell id
+            sketch: Distinct-recipient observations (cell, register, rank)
+            precision: HyperLogLog precision of the sketch
+            fingerprints: year_fingerprints of the CUBE_SOURCE_COLUMNS of the rows
+                in the cells, if known
+        """
+        self.cells = cells
+        self.sketch = sketch
+        self.precision = precision
+        self.fingerprints = fingerprints
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, precision: int = HLL_PRECISION) -> 'AggregateCube':
+        """
+        Build the cube of a processed dataset.
+
+        Args:
+            df: Processed grant data with the CUBE_SOURCE_COLUMNS
+            precision: HyperLogLog precision of the distinct-recipient sketch
+
+        Returns:
+            AggregateCube of the dataset
+        """
+        values = to_float(df['agreement_value'])
+        frame = pd.DataFrame({dim: df[dim].to_numpy() for dim in CUBE_DIMENSIONS[:-1]})
+        frame['funding_range'] = funding_ranges_of(values).to_numpy()
+        frame['value'] = values.to_numpy()
+        frame['square'] = frame['value'] ** 2
+
+        grouped = frame.groupby(CUBE_DIMENSIONS, dropna=False, observed=True, sort=True)
+        cells = grouped.agg(
+            rows=('value', 'size'),
+            count=('value', 'count'),
+            sum=('value', 'sum'),
+            min=('value', 'min'),
+            max=('value', 'max'),
+            sumsq=('square', 'sum'),
+        ).reset_index()
+        cells['funding_range'] = cells['funding_range'].astype(object)
+        cells.index.name = 'cell'
+        cell_ids = grouped.ngroup().to_numpy()
+
+        # Keep the highest rank per cell and register
+        recipients = df['recipient_legal_name']
+        register, rank = hll_observations(hash_values(recipients), precision)
+        sketch = pd.DataFrame({
+            'cell': cell_ids[recipients.notna().to_numpy()].astype(np.int32),
+            'register': register.astype(np.int16),
+            'rank': rank,
+        }).groupby(['cell', 'register'], sort=True)['rank'].max().reset_index()
+
+        return cls(cells, sketch, precision, year_fingerprints(df, CUBE_SOURCE_COLUMNS))
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Store the cube; the metadata file is written last and marks it as complete.
+
+        Args:
+            path: Cube path (see cube_path)
+
+        Returns:
+            Path of the cube's metadata file
+        """
+        return write_frames(path, {'': self.cells, 'recipients': self.sketch}, {
+            "version": CUBE_VERSION,
+            "dimensions": CUBE_DIMENSIONS,
+            "precision": self.precision,
+            "cells": len(self.cells),
+            "rows": int(self.cells['rows'].sum()),
+            "fingerprints": self.fingerprints,
+        })
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional['AggregateCube']:
+        """
+        Load a stored cube.
+
+        Args:
+            path: Cube path (see cube_path)
+
+        Returns:
+            The stored AggregateCube, or None if there is no complete, current cube
+        """
+        meta = read_meta(path, version=CUBE_VERSION, dimensions=CUBE_DIMENSIONS)
+        frames = read_frames(path, ['', 'recipients']) if meta is not None else None
+        if frames is None:
+            return None
+        return cls(frames[''], frames['recipients'], meta.get("precision", HLL_PRECISION), meta.get("fingerprints"))
+
+    def slice(self, **where) -> 'AggregateCube':
+        """
+        Restrict the cube to some dimension values.
+
+        Args:
+            **where: Dimension filters: a (low, high) tuple selects an inclusive
+                range, a list or set selects any of its values, anything else
+                selects that single value
+
+        Returns:
+            AggregateCube with only the matching cells (sharing the sketch); only
+            slices by year keep the fingerprints of their years
+        """
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, condition in where.items():
+            if dim not in CUBE_DIMENSIONS:
+                raise ValueError(f"Unknown cube dimension '{dim}'. Choose from: {', '.join(CUBE_DIMENSIONS)}")
+            values = self.cells[dim]
+            if isinstance(condition, tuple):
+                low, high = condition
+                mask &= (values >= low).to_numpy(dtype=bool, na_value=False)
+                mask &= (values <= high).to_numpy(dtype=bool, na_value=False)
+            elif isinstance(condition, (list, set)):
+                mask &= values.isin(list(condition)).to_numpy(dtype=bool)
+            else:
+                mask &= (values == condition).to_numpy(dtype=bool, na_value=False)
+        cells = self.cells[mask]
+
+        fingerprints = None
+        if self.fingerprints is not None and set(where) <= {'year'}:
+            years = {year_label(year) for year in pd.to_numeric(cells['year'], errors='coerce').unique()}
+            fingerprints = {year: fingerprint for year, fingerprint in self.fingerprints.items() if year in years}
+        return AggregateCube(cells, self.sketch, self.precision, fingerprints)
+
+    def describes(self, df: pd.DataFrame) -> bool:
+        """
+        Check whether the cube holds the aggregates of a DataFrame.
+
+        Every year of df has to have the content fingerprint of that year's rows in
+        the cube, which rules out any other selection or labelling of rows.
+
+        Args:
+            df: DataFrame with the CUBE_SOURCE_COLUMNS
+
+        Returns:
+            True if analyses of df can be answered from the cube
+        """
+        if self.fingerprints is None or any(col not in df.columns for col in CUBE_SOURCE_COLUMNS):
+            return False
+        return year_fingerprints(df, CUBE_SOURCE_COLUMNS) == self.fingerprints
+
+    def rollup(self, by: Sequence[str] = ()) -> pd.DataFrame:
+        """
+        Aggregate the cells to a subset of the dimensions.
+
+        Args:
+            by: Dimensions to keep (none for a grand total)
+
+        Returns:
+            DataFrame indexed by the kept dimensions with rows, count, sum, min,
+            max, mean and std of agreement_value and an estimate of the distinct
+            recipients
+        """
+        by = list(by)
+        unknown = [dim for dim in by if dim not in CUBE_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown cube dimension '{unknown[0]}'. Choose from: {', '.join(CUBE_DIMENSIONS)}")
+
+        cells = self.cells.assign(_all='All') if not by else self.cells
+        grouped = cells.groupby(by or ['_all'], dropna=False, sort=True)
+        result = grouped.agg(
+            rows=('rows', 'sum'),
+            count=('count', 'sum'),
+            sum=('sum', 'sum'),
+            min=('min', 'min'),
+            max=('max', 'max'),
+            sumsq=('sumsq', 'sum'),
+        )
+        count = result['count'].where(result['count'] > 0)
+        result['mean'] = result['sum'] / count
+        variance = (result['sumsq'] - result['sum'] ** 2 / count) / (count - 1)
+        result['std'] = np.sqrt(variance.clip(lower=0))
+        result['recipients'] = self._distinct_recipients(grouped.ngroup().to_numpy(), len(result))
+        if not by:
+            result.index.name = None
+        return result.drop(columns='sumsq')
+
+    def _distinct_recipients(self, cell_groups: np.ndarray, n_groups: int) -> np.ndarray:
+        """Merge the sketches of the cells of each group into distinct-recipient estimates."""
+        group_of_cell = np.full(int(self.sketch['cell'].max()) + 1 if len(self.sketch) else 0, -1, dtype=np.int64)
+        cell_ids = self.cells.index.to_numpy()
+        known = cell_ids < len(group_of_cell)
+        group_of_cell[cell_ids[known]] = cell_groups[known]
+
+        groups = group_of_cell[self.sketch['cell'].to_numpy()] if len(group_of_cell) else np.empty(0, dtype=np.int64)
+        selected = groups >= 0
+        return hll_group_estimate(groups[selected], self.sketch['register'].to_numpy()[selected],
+                                  self.sketch['rank'].to_numpy()[selected], n_groups, self.precision)
+
+    def provincial_distribution(self) -> pd.DataFrame:
+        """
+        Funding per province/state and organization, as in the Fetcher analysis.
+
+        Returns:
+            The provincial distribution table
+        """
+        return provincial_table_of(self.cells)
+
+    def funding_ranges(self) -> pd.DataFrame:
+        """
+        Number of grants per organization and funding range, as in the Fetcher analysis.
+
+        Returns:
+            The funding range table
+        """
+        return funding_range_table_of(self.cells)
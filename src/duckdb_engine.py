@@ -0,0 +1,351 @@
+"""
+DuckDB Engine for Grant Data
+
+This module runs the relational parts of the grant workflow as SQL in an embedded
+DuckDB database: amendment consolidation ("latest row per grant plus a list of the
+earlier ones") and the summary tables of Fetcher.analyze_grants. DuckDB reads the
+Parquet/CSV files directly, runs the queries vectorized on all cores and spills
+to disk when the data does not fit in memory, so the data never has to be loaded
+into pandas first.
+
+Features:
+- Amendment consolidation with window functions and list()/to_json aggregation
+- Organization, province, recipient and funding range summaries in SQL
+- Sources can be Parquet files, CSV files (optionally gzipped) or DataFrames
+- Results can be streamed in batches or written straight to a CSV file
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analytics import FUNDING_RANGE_BINS, FUNDING_RANGE_LABELS, funding_range_table_of, provincial_table_of
+from preprocessor import AMENDMENT_DISCRIMINATOR_COLUMNS, AMENDMENT_HISTORY_COLUMNS, ISO_DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Column with the position of each row in its source, used to break ties
+SEQUENCE_COLUMN = '_amend_seq'
+
+Source = Union[pd.DataFrame, str, Path, Sequence[Union[str, Path]]]
+
+def _quote(name: str) -> str:
+    """Quote an identifier for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(value: str) -> str:
+    """Quote a string literal for use in SQL."""
+    return "'" + value.replace("'", "''") + "'"
+
+def _json_value(col: str, column_type: str) -> str:
+    """SQL expression serializing a column value to JSON, with dates as ISO strings."""
+    if column_type == 'DATE' or column_type.startswith('TIMESTAMP'):
+        return f"to_json(strftime({_quote(col)}, {_literal(ISO_DATE_FORMAT)}))"
+    return f"to_json({_quote(col)})"
+
+def _file_format(path: str) -> Optional[str]:
+    """Get the format of an input file from its name: 'parquet', 'csv' or None."""
+    suffixes = Path(path).suffixes
+    if suffixes[-1:] == ['.parquet']:
+        return 'parquet'
+    if suffixes[-1:] == ['.csv'] or suffixes[-2:] == ['.csv', '.gz']:
+        return 'csv'
+    return None
+
+class DuckDBEngine:
+    """
+    Runs amendment consolidation and grant analytics as SQL in DuckDB.
+    """
+
+    def __init__(self, threads: Optional[int] = None, memory_limit: Optional[str] = None,
+                 temp_dir: Optional[Union[str, Path]] = None):
+        """
+        Initialize the engine with an in-memory database.
+
+        Args:
+            threads: Number of threads DuckDB may use (defaults to all cores)
+            memory_limit: Memory limit such as '4GB', beyond which DuckDB spills to disk
+            temp_dir: Directory for spilled data (defaults to DuckDB's own choice)
+        """
+        self.connection = duckdb.connect()
+        if threads is not None:
+            self.connection.execute(f"SET threads = {int(threads)}")
+        if memory_limit is not None:
+            self.connection.execute(f"SET memory_limit = {_literal(memory_limit)}")
+        if temp_dir is not None:
+            self.connection.execute(f"SET temp_directory = {_literal(str(temp_dir))}")
+        self._relations = 0
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+    def __enter__(self) -> 'DuckDBEngine':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _relation(self, source: Source, sequence: bool = False) -> str:
+        """
+        Get a SQL expression that reads a source.
+
+        Args:
+            source: DataFrame, or path(s) of Parquet or CSV files
+            sequence: Whether the relation must provide the SEQUENCE_COLUMN
+
+        Returns:
+            SQL expression usable in a FROM clause
+        """
+        if isinstance(source, pd.DataFrame):
+            table = pa.Table.from_pandas(source, preserve_index=False)
+            if sequence and SEQUENCE_COLUMN not in table.column_names:
+                table = table.append_column(SEQUENCE_COLUMN, pa.array(np.arange(len(table), dtype=np.int64)))
+            self._relations += 1
+            name = f"_source_{self._relations}"
+            self.connection.register(name, table)
+            return name
+
+        paths = [str(source)] if isinstance(source, (str, Path)) else [str(path) for path in source]
+        if not paths:
+            raise ValueError("No input files given")
+        files = "[" + ", ".join(_literal(path) for path in paths) + "]"
+        formats = {_file_format(path) for path in paths}
+
+        if formats == {'parquet'}:
+            relation = f"read_parquet({files}, union_by_name = true, filename = true, file_row_number = true)"
+            order = "filename, file_row_number"
+        elif formats == {'csv'}:
+            relation = f"read_csv({files}, union_by_name = true, filename = true)"
+            # CSV files have no row numbers, so rows are numbered in the order they are read
+            order = None
+        else:
+            raise ValueError(f"Unsupported input files: {', '.join(paths)} (expected Parquet or CSV)")
+
+        if not sequence or SEQUENCE_COLUMN in self._columns(relation):
+            return f"(SELECT * EXCLUDE (filename{', file_row_number' if order else ''}) FROM {relation})"
+        window = f"ORDER BY {order}" if order else ""
+        return (f"(SELECT * EXCLUDE (filename{', file_row_number' if order else ''}), "
+                f"row_number() OVER ({window}) AS {SEQUENCE_COLUMN} FROM {relation})")
+
+    def _columns(self, relation: str) -> Dict[str, str]:
+        """Get the column names and types of a relation."""
+        described = self.connection.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()
+        return {row[0]: row[1] for row in described}
+
+    #
+    # Amendment consolidation
+    #
+
+    def amendments_query(self, source: Source) -> str:
+        """
+        Build the query that consolidates grant amendments.
+
+        Rows are grouped by ref_number and the discriminator columns, like
+        ProcessingPipeline._process_amendments. The row with the highest
+        amendment_number is kept, renamed to latest_amendment_number, and the earlier
+        rows are serialized to amendments_history as a JSON list.
+
+        Args:
+            source: Rows after the row-local stages
+
+        Returns:
+            SQL query producing one row per grant, ordered by grant identifier
+        """
+        relation = self._relation(source, sequence=True)
+        columns = self._columns(relation)
+        for col in ['ref_number', 'amendment_number']:
+            if col not in columns:
+                raise ValueError(f"Required column '{col}' not found. Cannot process amendments.")
+
+        output_columns = [col for col in columns if col != SEQUENCE_COLUMN]
+        discriminator_columns = [col for col in AMENDMENT_DISCRIMINATOR_COLUMNS if col in columns]
+        history_columns = [col for col in AMENDMENT_HISTORY_COLUMNS if col in columns]
+        logger.info(f"Creating unique identifiers using columns: ref_number and {discriminator_columns}")
+
+        amendment_number = _quote('amendment_number')
+        if columns['amendment_number'] in ('VARCHAR', 'BOOLEAN'):
+            amendment_number = f"coalesce(TRY_CAST({amendment_number} AS DOUBLE), 0)"
+
+        unique_id = "concat_ws('|', " + ", ".join(
+            ["coalesce(CAST(ref_number AS VARCHAR), 'nan')"] +
+            [f"coalesce(CAST({_quote(col)} AS VARCHAR), '')" for col in discriminator_columns]) + ")"
+
+        # JSON object of an earlier amendment; concat_ws skips the missing values
+        fields = [f"CASE WHEN {_quote(col)} IS NOT NULL THEN {_literal(json.dumps(col) + ': ')} || {_json_value(col, columns[col])} END"
+                  for col in history_columns]
+        amendment_json = "'{' || concat_ws(', ', " + ", ".join(fields) + ") || '}'"
+
+        select_columns = ", ".join(
+            f"ranked.{_quote(col)} AS latest_amendment_number" if col == 'amendment_number' else f"ranked.{_quote(col)}"
+            for col in output_columns)
+
+        return f"""
+            WITH keyed AS (
+                SELECT * REPLACE ({amendment_number} AS amendment_number), {unique_id} AS _unique_id
+                FROM {relation}
+            ),
+            ranked AS (
+                SELECT *, row_number() OVER (
+                    PARTITION BY _unique_id
+                    ORDER BY amendment_number DESC NULLS LAST, {SEQUENCE_COLUMN}
+                ) AS _rank
+                FROM keyed
+            ),
+            history AS (
+                SELECT _unique_id,
+                       '[' || array_to_string(list({amendment_json} ORDER BY _rank), ', ') || ']' AS amendments_history
+                FROM ranked
+                WHERE _rank > 1
+                GROUP BY _unique_id
+            )
+            SELECT {select_columns}, history.amendments_history
+            FROM ranked LEFT JOIN history USING (_unique_id)
+            WHERE ranked._rank = 1
+            ORDER BY ranked._unique_id
+        """
+
+    def consolidate_amendments(self, source: Source) -> pd.DataFrame:
+        """
+        Consolidate grant amendments into one row per grant.
+
+        Args:
+            source: Rows after the row-local stages
+
+        Returns:
+            DataFrame with the same columns as ProcessingPipeline._process_amendments
+        """
+        return self._to_pandas(self.connection.execute(self.amendments_query(source)).fetch_arrow_table())
+
+    def iter_consolidated_amendments(self, source: Source, batch_size: int = 100000) -> Iterator[pd.DataFrame]:
+        """
+        Consolidate grant amendments and yield the result in batches.
+
+        Args:
+            source: Rows after the row-local stages
+            batch_size: Number of grants per yielded DataFrame
+
+        Yields:
+            DataFrames of consolidated grants, in grant identifier order
+        """
+        reader = self.connection.execute(self.amendments_query(source)).fetch_record_batch(batch_size)
+        for batch in reader:
+            yield self._to_pandas(pa.Table.from_batches([batch]))
+
+    def write_consolidated_amendments(self, source: Source, output_path: Union[str, Path]) -> int:
+        """
+        Consolidate grant amendments straight into a CSV file.
+
+        Args:
+            source: Rows after the row-local stages
+            output_path: CSV file to write
+
+        Returns:
+            Number of grants written
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        query = self.amendments_query(source)
+        self.connection.execute(f"COPY ({query}) TO {_literal(str(output_path))} (HEADER, DELIMITER ',')")
+        return self.connection.execute(f"SELECT count(*) FROM read_csv({_literal(str(output_path))})").fetchone()[0]
+
+    @staticmethod
+    def _to_pandas(table: pa.Table) -> pd.DataFrame:
+        """Convert query results to pandas with NaN for missing values, like the pandas engine."""
+        df = table.to_pandas()
+        for col in df.columns[df.dtypes == 'object']:
+            if col != 'amendments_history':
+                df[col] = df[col].where(df[col].notna(), np.nan)
+        return df
+
+    #
+    # Grant analytics
+    #
+
+    def analyze_grants(self, source: Source, top: int = 10) -> Dict[str, pd.DataFrame]:
+        """
+        Compute the summary tables of Fetcher.analyze_grants.
+
+        Args:
+            source: Processed grant data
+            top: Number of top recipients to include
+
+        Returns:
+            Dictionary with the same keys and tables as Fetcher.analyze_grants
+        """
+        relation = self._relation(source)
+        columns = self._columns(relation)
+        value = "TRY_CAST(agreement_value AS DOUBLE)" if columns.get('agreement_value') != 'DOUBLE' else "agreement_value"
+        self.connection.execute(f"CREATE OR REPLACE TEMP VIEW grants AS SELECT *, {value} AS _value FROM {relation}")
+        try:
+            return {
+                'summary_by_org': self.get_org_summary(),
+                'provincial_distribution': self.get_provincial_distribution(),
+                'top_recipients': self.get_top_recipients(top),
+                'funding_ranges': self.get_funding_ranges(),
+            }
+        finally:
+            self.connection.execute("DROP VIEW IF EXISTS grants")
+
+    def get_org_summary(self) -> pd.DataFrame:
+        """Summary statistics by organization."""
+        data = self.connection.execute("""
+            SELECT org AS "Organization",
+                   count(_value) AS "# of Grants",
+                   coalesce(sum(_value), 0) AS "Total Funding ($)",
+                   avg(_value) AS "Average Funding ($)",
+                   median(_value) AS "Median Funding ($)",
+                   count(DISTINCT recipient_legal_name) AS "# of Recipients"
+            FROM grants
+            WHERE org IS NOT NULL
+            GROUP BY org
+            ORDER BY org
+        """).df()
+        return data.round(2)
+
+    def get_provincial_distribution(self) -> pd.DataFrame:
+        """Funding by province and organization, with each organization's share."""
+        sums = self.connection.execute("""
+            SELECT recipient_province, org, coalesce(sum(_value), 0) AS sum
+            FROM grants
+            WHERE org IS NOT NULL
+            GROUP BY ALL
+        """).df()
+        return provincial_table_of(sums)
+
+    def get_top_recipients(self, top: int = 10) -> pd.DataFrame:
+        """Recipients with the most total funding."""
+        data = self.connection.execute(f"""
+            SELECT recipient_legal_name,
+                   coalesce(sum(_value), 0) AS "Total Funding ($)",
+                   count(_value) AS "Number of Agreements",
+                   avg(_value) AS "Average Funding ($)",
+                   string_agg(DISTINCT org, ', ' ORDER BY org) AS "Organizations"
+            FROM grants
+            WHERE recipient_legal_name IS NOT NULL
+            GROUP BY recipient_legal_name
+            ORDER BY "Total Funding ($)" DESC, recipient_legal_name
+            LIMIT {int(top)}
+        """).df()
+        data.index = data.index + 1
+        return data
+
+    def get_funding_ranges(self) -> pd.DataFrame:
+        """Number of grants by organization and funding range."""
+        # Ranges include their upper bound, like funding_ranges_of
+        cases = " ".join(
+            f"WHEN _value > {low}" + (f" AND _value <= {high}" if np.isfinite(high) else "") + f" THEN {_literal(label)}"
+            for label, low, high in zip(FUNDING_RANGE_LABELS, FUNDING_RANGE_BINS[:-1], FUNDING_RANGE_BINS[1:]))
+        counts = self.connection.execute(f"""
+            SELECT org, funding_range, count(*) AS rows
+            FROM (SELECT org, CASE {cases} END AS funding_range FROM grants WHERE org IS NOT NULL)
+            WHERE funding_range IS NOT NULL
+            GROUP BY ALL
+        """).df()
+        return funding_range_table_of(counts)
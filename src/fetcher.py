@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
 import requests
-from typing import Dict, Optional, List, Tuple, Any
+from typing import Dict, Optional, List, Tuple, Any, Union
 from pathlib import Path
 import logging
 import argparse
@@ -17,10 +17,16 @@ from datetime import datetime
 import concurrent.futures
 import subprocess
 import gzip
+import inspect
 import tempfile
 
 # Import the preprocessor module
-from preprocessor import DataPreprocessor
+from preprocessor import DataPreprocessor, open_shared_frame, release_shared_frame, remove_companions, share_frame
+from analytics import (ANALYSIS_COLUMNS, CONCENTRATION_UNITS, AnalysisCache, AnalyticsContext, AnalyticsState, ApproximateSummary,
+                       DEFAULT_DISTINCT_ERROR, DEFAULT_QUANTILE_ERROR, analysis_cache_key, annual_funding_table,
+                       annualize_funding, concentration_metrics, state_path, summarize_approximately)
+from cube import AggregateCube, cube_path
+from trajectories import TrajectoryIndex, trajectory_path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -39,6 +45,22 @@ class ThousandsSeparatorTqdm(tqdm):
             d['total_fmt'] = f"{total:,}"
         return d
 
+def _run_analysis_step(func, df: Union[pd.DataFrame, Tuple], context, options: Dict) -> Tuple[pd.DataFrame, float]:
+    """
+    Run one analysis step and measure its wall time
+    
+    Module-level so that worker processes can run it; there, df is a handle to the
+    shared read-only projection of the analyzed data. The context is only passed to
+    steps that take one.
+    """
+    start = time.perf_counter()
+    if isinstance(df, tuple):
+        df = open_shared_frame(df)
+    if 'context' in inspect.signature(func).parameters:
+        options = {**options, 'context': context}
+    result = func(df, **options)
+    return result, time.perf_counter() - start
+
 class FetcherConfig:
     """Configuration for the Fetcher class"""
     dataset_id = "432527ab-7aac-45b5-81d6-7597107a7013"
@@ -46,8 +68,24 @@ class FetcherConfig:
     base_url = "https://open.canada.ca/data/api/action"
     tri_agencies = ["cihr-irsc", "nserc-crsng", "sshrc-crsh"]
 
-    def __init__(self, quiet=False):
+    def __init__(self, quiet=False, engine="pandas", projection=None, approximate=False,
+                 distinct_error=DEFAULT_DISTINCT_ERROR, quantile_error=DEFAULT_QUANTILE_ERROR, annualize=None,
+                 concentration=None, cache_analysis=True, analysis_workers=1, analysis_executor="thread"):
+        if analysis_executor not in ("thread", "process"):
+            raise ValueError(f"Unknown analysis executor '{analysis_executor}'")
+        if approximate and engine == "duckdb":
+            raise ValueError("Approximate analysis is not supported by the duckdb engine")
         self.quiet = quiet
+        self.engine = engine
+        self.projection = projection
+        self.approximate = approximate
+        self.distinct_error = distinct_error
+        self.quantile_error = quantile_error
+        self.annualize = annualize
+        self.concentration = concentration
+        self.cache_analysis = cache_analysis
+        self.analysis_workers = analysis_workers
+        self.analysis_executor = analysis_executor
         self.orgs = {
             'nserc-crsng': 'NSERC',
             'sshrc-crsh': 'SSHRC',
@@ -73,7 +111,28 @@ class Fetcher:
         self.metadata_file = self.production_dir / "dataset_metadata.json"
         self._setup_signal_handlers()
         self.interrupted = False
-        self.preprocessor = DataPreprocessor(quiet=self.config.quiet)
+        self.preprocessor = DataPreprocessor(
+            quiet=self.config.quiet,
+            cache_dir=self.cache_dir / "preprocessed",
+            incremental_dir=self.cache_dir / "incremental",
+            projection=self.config.projection
+        )
+        # Aggregate cube and state of the processed dataset in use, if they were materialized
+        self.cube: Optional[AggregateCube] = None
+        self.aggregates: Optional[AnalyticsState] = None
+        self.trajectories: Optional[TrajectoryIndex] = None
+        # Analysis results keyed by the analyzed data and parameters
+        self.analysis_cache = AnalysisCache(self.cache_dir / "analysis")
+        # Wall time of each step of the last computed analysis, in seconds
+        self.analysis_timings: Dict[str, float] = {}
+        
+    def __getstate__(self) -> Dict:
+        """Drop the loaded aggregates when analysis steps are pickled for worker processes."""
+        state = self.__dict__.copy()
+        state["cube"] = None
+        state["aggregates"] = None
+        state["trajectories"] = None
+        return state
         
     def _setup_signal_handlers(self):
         """Set up handlers for interruption signals"""
@@ -100,9 +159,11 @@ class Fetcher:
         self.processed_dir = self.data_dir / "processed"
         self.sample_dir = self.data_dir / "sample"
         self.filtered_dir = self.data_dir / "filtered"
+        self.cache_dir = self.data_dir / "cache"
         
         for dir_path in [self.data_dir, self.raw_dir, self.production_dir, 
-                        self.processed_dir, self.sample_dir, self.filtered_dir]:
+                        self.processed_dir, self.sample_dir, self.filtered_dir,
+                        self.cache_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
             
     def _save_metadata(self, metadata: Dict) -> None:
@@ -181,6 +242,59 @@ class Fetcher:
         latest_file = max(files, key=os.path.getctime)
         return Path(latest_file)
         
+    def _current_raw_file(self) -> Optional[Path]:
+        """Get the raw snapshot that preprocessing would currently start from"""
+        latest_raw = self._get_latest_dataset_file(type="raw")
+        if latest_raw is not None:
+            return latest_raw
+        file_path = self._load_metadata().get('file_path')
+        if file_path and Path(file_path).exists():
+            return Path(file_path)
+        return None
+    
+    def _is_processed_file_current(self, processed_file: Path) -> bool:
+        """
+        Check whether a processed file was produced from the current raw snapshot
+        with the current pipeline configuration
+        
+        Args:
+            processed_file: Path to the processed dataset file
+            
+        Returns:
+            True if the file can be used, False if it should be recomputed
+        """
+        current_raw = self._current_raw_file()
+        if current_raw is None:
+            # Nothing to recompute from, so any processed file is the best we have
+            return True
+        
+        provenance = self._load_metadata().get('processed', {})
+        if provenance.get('file') != str(processed_file):
+            self._print(f"==> No record of how {processed_file.name} was produced")
+            return False
+        if provenance.get('source') != str(current_raw):
+            self._print(f"==> {processed_file.name} was produced from an older raw snapshot")
+            return False
+        if provenance.get('pipeline_signature') != self.preprocessor.pipeline.get_signature():
+            self._print(f"==> {processed_file.name} was produced with a different pipeline configuration")
+            return False
+        if (provenance.get('projection') == 'minimal') != (self.preprocessor.projection == 'minimal'):
+            self._print(f"==> {processed_file.name} was produced with a different column projection")
+            return False
+        return True
+    
+    def _record_processed_provenance(self, processed_file: Path, source: Optional[Path]) -> None:
+        """Record which raw snapshot and pipeline configuration produced a processed file"""
+        metadata = self._load_metadata()
+        metadata['processed'] = {
+            'file': str(processed_file),
+            'source': str(source) if source is not None else None,
+            'pipeline_signature': self.preprocessor.pipeline.get_signature(),
+            'projection': self.preprocessor.projection,
+            'created': datetime.now().isoformat()
+        }
+        self._save_metadata(metadata)
+    
     def _compress_file(self, file_path: Path, method: str = '7z') -> Path:
         """Compress a file using either 7z or gzip"""
         if not file_path.exists():
@@ -293,13 +407,20 @@ class Fetcher:
         """
         raw_df = pd.DataFrame()
         processed_df = pd.DataFrame()
+        raw_source = None
         
         # Check for existing files unless force_refresh is True
         if not force_refresh:
-            # First check for a processed file
+            # First check for a processed file produced from the current raw snapshot and pipeline
             latest_processed = self._get_latest_dataset_file(type="processed")
+            if latest_processed and latest_processed.exists() and not self._is_processed_file_current(latest_processed):
+                self._print("--> Reprocessing from the raw dataset instead...")
+                latest_processed = None
             if latest_processed and latest_processed.exists():
                 self._print(f"==> Using existing preprocessed dataset: {latest_processed}")
+                self.cube = AggregateCube.load(cube_path(latest_processed))
+                self.aggregates = AnalyticsState.load(state_path(latest_processed))
+                self.trajectories = TrajectoryIndex.load(trajectory_path(latest_processed))
                 try:
                     # Load the processed dataset
                     if latest_processed.suffix == '.gz':
@@ -327,9 +448,13 @@ class Fetcher:
             
             # If no processed file or error, check for raw file
             if processed_df.empty:
+                self.cube = None
+                self.aggregates = None
+                self.trajectories = None
                 latest_raw = self._get_latest_dataset_file(type="raw")
                 if latest_raw and latest_raw.exists():
                     self._print(f"==> Using existing raw dataset file: {latest_raw}")
+                    raw_source = latest_raw
                     try:
                         if latest_raw.suffix == '.gz':
                             self._print("    --> Reading compressed CSV file...")
@@ -368,6 +493,7 @@ class Fetcher:
                         file_path = Path(current_metadata.get('file_path'))
                         if file_path.exists():
                             raw_df = pd.read_csv(file_path, low_memory=False)
+                            raw_source = file_path
                             self._print(f"Using cached dataset from: {file_path}")
             else:
                 self._print("📢 DATASET STATUS: Dataset has been updated since last download!")
@@ -486,6 +612,7 @@ class Fetcher:
                     self._print(f"  ==> Saving raw dataset to {raw_file}...")
                     raw_df.to_csv(raw_file, index=False)
                     self._print(f"      ✓ Saved raw data: {raw_file}")
+                    raw_source = raw_file
 
                     # Compress the raw file if it's large enough to warrant compression
                     if raw_file.stat().st_size > 50 * 1024 * 1024:  # If more than 50MB
@@ -513,17 +640,18 @@ class Fetcher:
         # Preprocess data if requested and raw_df is not empty
         if auto_preprocess and not raw_df.empty and processed_df.empty:
             self._print("\n==> Automatically preprocessing data...")
-            processed_df = self.preprocess_data(raw_df)
+            processed_df = self.preprocess_data(raw_df, source=raw_source)
         
         return raw_df, processed_df
 
-    def preprocess_data(self, df: pd.DataFrame, save: bool = True) -> pd.DataFrame:
+    def preprocess_data(self, df: pd.DataFrame, save: bool = True, source: Optional[Path] = None) -> pd.DataFrame:
         """
         Process raw data using the preprocessor
         
         Args:
             df: Raw DataFrame to process
             save: Whether to save the processed data
+            source: Raw snapshot file the DataFrame was read from, recorded as provenance
             
         Returns:
             Processed DataFrame
@@ -532,6 +660,9 @@ class Fetcher:
             self._print("Warning: Empty DataFrame provided for preprocessing")
             return df
             
+        # The previous processed file, whose aggregates an incremental run can update
+        previous_file = self._load_metadata().get('processed', {}).get('file')
+        
         # Start the preprocessing
         processed_df = self.preprocessor.preprocess_data(df)
         
@@ -539,7 +670,7 @@ class Fetcher:
         if save and not processed_df.empty:
             processed_file = self.processed_dir / f"processed_{self.timestamp}.csv"
             self._print(f"==> Saving processed dataset to {processed_file}...")
-            processed_df.to_csv(processed_file, index=False)
+            self.preprocessor.restore_deferred_columns(processed_df).to_csv(processed_file, index=False)
             self._print(f"    ✓ Saved processed data: {processed_file}")
             
             # Compress if it's large enough
@@ -548,8 +679,21 @@ class Fetcher:
                     compressed_file = self._compress_file(processed_file, '7z')
                     if compressed_file != processed_file:
                         self._print(f"  ✓ Compressed processed dataset: {compressed_file.name}")
+                        if not processed_file.exists():
+                            processed_file = compressed_file
                 except Exception as e:
                     self._print(f"  ⚠️ Processed file compression failed: {e}")
+            
+            self._record_processed_provenance(processed_file, source)
+            self.cube = self.preprocessor.materialize_cube(processed_df, processed_file)
+            self.aggregates = self.preprocessor.materialize_aggregates(processed_df, processed_file, previous_file)
+            self.trajectories = self.preprocessor.materialize_trajectories(processed_df, processed_file)
+            
+            # Only the latest processed file's cube, aggregates and trajectories are read again
+            current = processed_file.name.split('.')[0]
+            for older_file in self.processed_dir.glob("processed_*.csv*"):
+                if older_file.name.split('.')[0] != current:
+                    remove_companions(older_file)
         
         return processed_df
 
@@ -640,7 +784,7 @@ class Fetcher:
                 
                 # Save the processed sample
                 processed_sample_file = self.sample_dir / f"processed_sample_{sample_size}_{self.timestamp}.csv"
-                processed_sample.to_csv(processed_sample_file, index=False)
+                self.preprocessor.restore_deferred_columns(processed_sample).to_csv(processed_sample_file, index=False)
                 self._print(f"    ✓ Saved processed sample: {processed_sample_file}")
         else:
             # If no preprocessing requested, return the raw sample
@@ -712,7 +856,7 @@ class Fetcher:
             year_str = f"{year_start}_{year_end}" if year_start != year_end else f"{year_start}"
             filtered_file = self.filtered_dir / f"data_{year_str}_{self.timestamp}.csv"
             self._print(f"==> Saving filtered dataset to {filtered_file}...")
-            filtered_df.to_csv(filtered_file, index=False)
+            self.preprocessor.restore_deferred_columns(filtered_df).to_csv(filtered_file, index=False)
             self._print(f"    ✓ Saved filtered data: {filtered_file}")
             
         return filtered_df
@@ -736,7 +880,8 @@ class Fetcher:
                 if pd.notna(year):
                     print(f'  {year}: {count:,}')
 
-    def analyze_grants(self, df: pd.DataFrame, top: int = 10, show: bool = False) -> Dict:
+    def analyze_grants(self, df: pd.DataFrame, top: int = 10, show: bool = False,
+                       source: Optional[Path] = None) -> Dict:
         """
         Analyze grant data to produce summary statistics
         
@@ -744,31 +889,88 @@ class Fetcher:
             df: DataFrame containing grant data
             top: Number of top recipients to include
             show: Whether to display the analysis results
+            source: Processed Parquet/CSV file to query instead of df (duckdb engine only;
+                annualized funding and concentration still need df)
             
         Returns:
             Dictionary containing analysis results
         """
-        if df.empty:
+        if source is None and df.empty:
             self._print('No data to analyze!')
             return {}
             
         self.top = top
+        
+        # Results for the same data and parameters are reused from the analysis cache
+        cache_key = None
+        if self.config.cache_analysis and source is None:
+            cache_key = analysis_cache_key(df, self._analysis_params(top))
+            analysis_results = self.analysis_cache.load(cache_key)
+            if analysis_results is not None:
+                self._print('==> Using cached analysis results')
+                if show:
+                    self._print_analysis_results(analysis_results)
+                return analysis_results
+        
+        # Optional steps run on the rows with either engine and take no analytics context
+        optional_steps = []
+        if self.config.annualize:
+            optional_steps.append(('annual_funding', f'Annualizing funding by {self.config.annualize} year',
+                                   self.get_annual_funding, {'fiscal': self.config.annualize == 'fiscal'}))
+        if self.config.concentration:
+            optional_steps.append(('concentration', f'Measuring funding concentration across {self.config.concentration}',
+                                   self.get_funding_concentration, {'units': self.config.concentration}))
+        
+        if self.config.engine == "duckdb":
+            from duckdb_engine import DuckDBEngine
+            if optional_steps and (df is None or df.empty):
+                raise ValueError("Annualized funding and concentration need the grant rows, not only a source file")
+            self._print('==> Performing grant analysis with DuckDB... ', end='', flush=True)
+            with DuckDBEngine() as engine:
+                analysis_results = engine.analyze_grants(source if source is not None else df, top=top)
+            self._print('✓')
+            if optional_steps:
+                analysis_results.update(self._run_analysis_steps(df, optional_steps, None))
+            if cache_key is not None:
+                self.analysis_cache.store(cache_key, analysis_results)
+            if show:
+                self._print_analysis_results(analysis_results)
+            return analysis_results
+        
         self._print('==> Performing grant analysis... ')
         
+        # The maintained aggregates of the whole processed dataset answer every step; otherwise
+        # the steps the aggregate cube can express are answered from it, the rest from the rows
+        state = self.aggregates if self.aggregates is not None and self.aggregates.describes(df) else None
+        cube = self._matching_cube(df) if state is None else None
+        if state is not None:
+            self._print('  Using the maintained aggregates of the processed dataset')
+        
+        # In approximate mode, medians and distinct counts come from sketches unless exact
+        # aggregates are already at hand
+        summary = None
+        if self.config.approximate and state is None:
+            summary = summarize_approximately(df, self.config.distinct_error, self.config.quantile_error,
+                                              chunk_size=self.preprocessor.chunk_size,
+                                              max_workers=self.preprocessor.max_workers)
+        
         # Define analysis steps
         analysis_steps = [
-            ('summary_by_org', 'Calculating summary by organization', self.get_org_summary),
-            ('provincial_distribution', 'Calculating provincial distribution', self.get_provincial_distribution),
-            ('top_recipients', 'Identifying top recipients', self.get_top_recipients),
-            ('funding_ranges', 'Analyzing funding ranges', self.get_funding_ranges)
-        ]
-        
-        # Execute each analysis step
-        analysis_results = {}
-        for i, (key, message, func) in enumerate(analysis_steps, 1):
-            self._print(f'  [{i}/{len(analysis_steps)}] {message}... ', end='', flush=True)
-            analysis_results[key] = func(df)
-            self._print('✓')
+            ('summary_by_org', 'Calculating summary by organization', self.get_org_summary, {'approximate': summary}),
+            ('provincial_distribution', 'Calculating provincial distribution', self.get_provincial_distribution, {'cube': cube}),
+            ('top_recipients', 'Identifying top recipients', self.get_top_recipients, {}),
+            ('funding_ranges', 'Analyzing funding ranges', self.get_funding_ranges, {'cube': cube})
+        ] + optional_steps
+        
+        # Prepare the typed projection shared by all steps
+        context = state if state is not None else AnalyticsContext(df)
+        
+        # Execute the analysis steps
+        analysis_results = self._run_analysis_steps(df, analysis_steps, context)
+        if summary is not None:
+            analysis_results['error_bounds'] = summary.error_bounds()
+        if cache_key is not None:
+            self.analysis_cache.store(cache_key, analysis_results)
             
         # Display results if requested
         if show:
@@ -776,33 +978,117 @@ class Fetcher:
             
         return analysis_results
 
-    def get_org_summary(self, df: pd.DataFrame, display_table=False) -> pd.DataFrame:
+    def _run_analysis_steps(self, df: pd.DataFrame, analysis_steps: List[Tuple],
+                            context: Optional[Union[AnalyticsContext, AnalyticsState]]) -> Dict:
+        """
+        Run independent analysis steps, concurrently if analysis workers are configured
+        
+        Threads share the analytics context; worker processes read a shared read-only
+        projection of the analyzed columns and build their own context. Results are
+        collected in step order either way, so they don't depend on scheduling.
+        
+        Args:
+            df: DataFrame to be analyzed
+            analysis_steps: Steps as (key, message, function, options) tuples
+            context: Analytics context or aggregate state shared by the steps that take one
+            
+        Returns:
+            Dictionary of each step's result, by key (timings go to analysis_timings)
+        """
+        def describe(i: int, message: str, options: Dict) -> str:
+            if options.get('cube') is not None:
+                message += ' (from aggregate cube)'
+            elif options.get('approximate') is not None:
+                message += ' (approximate)'
+            return f'  [{i}/{len(analysis_steps)}] {message}... '
+        
+        results = {}
+        self.analysis_timings = {}
+        workers = min(self.config.analysis_workers, len(analysis_steps))
+        if workers <= 1:
+            for i, (key, message, func, options) in enumerate(analysis_steps, 1):
+                self._print(describe(i, message, options), end='', flush=True)
+                results[key], self.analysis_timings[key] = _run_analysis_step(func, df, context, options)
+                self._print(f'✓ ({self.analysis_timings[key]:.2f}s)')
+            return results
+        
+        handle = None
+        step_df, step_context = df, context
+        if self.config.analysis_executor == "process":
+            handle = share_frame(df[[col for col in ANALYSIS_COLUMNS if col in df.columns]])
+            step_df = handle
+            # A row-level context is rebuilt by each worker from the shared projection
+            step_context = None if isinstance(context, AnalyticsContext) else context
+        
+        executor_class = (concurrent.futures.ThreadPoolExecutor if self.config.analysis_executor == "thread"
+                          else concurrent.futures.ProcessPoolExecutor)
+        try:
+            with executor_class(max_workers=workers) as executor:
+                futures = [executor.submit(_run_analysis_step, func, step_df, step_context, options)
+                           for _, _, func, options in analysis_steps]
+                for i, ((key, message, _, options), future) in enumerate(zip(analysis_steps, futures), 1):
+                    results[key], self.analysis_timings[key] = future.result()
+                    self._print(f'{describe(i, message, options)}✓ ({self.analysis_timings[key]:.2f}s)')
+        finally:
+            if handle is not None:
+                release_shared_frame(handle)
+        return results
+
+    def _analysis_params(self, top: int) -> Dict:
+        """Get the parameters that analysis results depend on, for the analysis cache key"""
+        params = {
+            'top': top,
+            'engine': self.config.engine,
+            'annualize': self.config.annualize,
+            'concentration': self.config.concentration,
+        }
+        if self.config.approximate:
+            params['approximate'] = [self.config.distinct_error, self.config.quantile_error]
+        return params
+
+    def _matching_cube(self, df: pd.DataFrame) -> Optional[AggregateCube]:
+        """
+        Get the slice of the loaded aggregate cube that holds the aggregates of df
+        
+        The full dataset and year ranges of it (as extracted by fetch_all_orgs) are
+        expressible as cube slices; any other selection of rows is not.
+        
+        Args:
+            df: DataFrame to be analyzed
+            
+        Returns:
+            The matching AggregateCube slice, or None if df has to be analyzed from its rows
+        """
+        if self.cube is None or 'year' not in df.columns:
+            return None
+        
+        cube = self.cube
+        years = pd.to_numeric(df['year'], errors='coerce')
+        if len(years) and not years.isna().any():
+            cube = cube.slice(year=(years.min(), years.max()))
+        
+        if not cube.describes(df):
+            logger.debug("Aggregate cube does not match the analyzed data, using the rows")
+            return None
+        return cube
+    
+    def get_org_summary(self, df: pd.DataFrame, display_table=False,
+                        context: Optional[Union[AnalyticsContext, AnalyticsState]] = None,
+                        approximate: Optional[ApproximateSummary] = None) -> pd.DataFrame:
         """
         Generate summary statistics grouped by organization
         
         Args:
             df: DataFrame containing grant data
             display_table: Whether to display the summary table
+            context: Prepared analytics context or aggregate state of df (a context is built if not given)
+            approximate: Approximate summary of df, to estimate medians and distinct counts from
             
         Returns:
             DataFrame with organization summary statistics
         """
-        # Make a copy to avoid modifying the original
-        temp_df = df.copy()
-        
-        # Ensure agreement_value is numeric
-        temp_df['agreement_value'] = pd.to_numeric(temp_df['agreement_value'], errors='coerce')
-        
         # Group by organization and calculate statistics
-        data = temp_df.groupby('org').agg({
-            'agreement_value': ['count', 'sum', 'mean', 'median'],
-            'recipient_legal_name': 'nunique'
-        }).round(2)
-        
-        # Rename columns
-        data.columns = ['# of Grants', 'Total Funding ($)', 'Average Funding ($)', 'Median Funding ($)', '# of Recipients']
-        data.index.name = 'Organization'
-        data.reset_index(inplace=True)
+        data = (approximate or context or AnalyticsContext(df)).org_summary()
         
         # Display a formatted table if requested
         if display_table:
@@ -820,48 +1106,26 @@ class Fetcher:
                 
         return data
 
-    def get_provincial_distribution(self, df: pd.DataFrame, display_table=False) -> pd.DataFrame:
+    def get_provincial_distribution(self, df: pd.DataFrame, display_table=False,
+                                    context: Optional[Union[AnalyticsContext, AnalyticsState]] = None,
+                                    cube: Optional[AggregateCube] = None) -> pd.DataFrame:
         """
         Analyze funding distribution by province/state
         
         Args:
             df: DataFrame containing grant data
             display_table: Whether to display the distribution table
+            context: Prepared analytics context or aggregate state of df (a context is built if not given)
+            cube: Aggregate cube slice holding the aggregates of df, to answer from instead of the rows
             
         Returns:
             DataFrame with provincial distribution statistics
         """
-        # Make a copy and ensure proper data types
-        temp_df = df.copy()
-        temp_df['agreement_value'] = pd.to_numeric(temp_df['agreement_value'], errors='coerce')
-        temp_df['recipient_province'] = temp_df['recipient_province'].fillna('Unknown')
-        
-        # Create pivot table for funding by province and organization
-        province_funding = temp_df.pivot_table(
-            index='recipient_province',
-            columns='org',
-            values='agreement_value',
-            aggfunc='sum'
-        ).fillna(0)
-        
-        # Add total column
-        province_funding['Total'] = province_funding.sum(axis=1)
-        
-        # Calculate percentages
-        province_pct = province_funding.div(province_funding.sum(axis=1), axis=0) * 100
-        
-        # Combine funding and percentage data
-        combined_data = pd.DataFrame(index=province_funding.index)
-        orgs = ['CIHR', 'NSERC', 'SSHRC']
-        for org in orgs:
-            if org in province_funding.columns:
-                combined_data[f'{org} (%)'] = province_pct[org]
-                combined_data[f'{org} ($)'] = province_funding[org]
-        
-        combined_data['Total ($)'] = province_funding['Total']
-        combined_data = combined_data.sort_values('Total ($)', ascending=False).reset_index()
-        combined_data.index += 1  # Start index at 1
-        combined_data.rename(columns={'recipient_province': 'Province/State'}, inplace=True)
+        # Funding by province and organization, with percentages and totals
+        if cube is not None:
+            combined_data = cube.provincial_distribution()
+        else:
+            combined_data = (context or AnalyticsContext(df)).provincial_distribution()
         
         # Display table if requested
         if display_table:
@@ -881,7 +1145,8 @@ class Fetcher:
                 
         return combined_data
 
-    def get_top_recipients(self, df: pd.DataFrame, display_table=False, top=10) -> pd.DataFrame:
+    def get_top_recipients(self, df: pd.DataFrame, display_table=False, top=10,
+                           context: Optional[Union[AnalyticsContext, AnalyticsState]] = None) -> pd.DataFrame:
         """
         Identify top recipients by total funding
         
@@ -889,26 +1154,16 @@ class Fetcher:
             df: DataFrame containing grant data
             display_table: Whether to display the recipients table
             top: Number of top recipients to include
+            context: Prepared analytics context or aggregate state of df (a context is built if not given)
             
         Returns:
             DataFrame with top recipients
         """
-        # Make a copy and ensure proper data types
-        temp_df = df.copy()
-        temp_df['agreement_value'] = pd.to_numeric(temp_df['agreement_value'], errors='coerce')
-        
         # Use the top value from the instance or the provided parameter
         n = self.top if hasattr(self, 'top') else top
         
         # Group by recipient and calculate statistics
-        grouped = temp_df.groupby('recipient_legal_name').agg({
-            'agreement_value': ['sum', 'count', 'mean'],
-            'org': lambda x: ', '.join(sorted(set(x)))
-        })
-        
-        grouped.columns = ['Total Funding ($)', 'Number of Agreements', 'Average Funding ($)', 'Organizations']
-        data = grouped.sort_values('Total Funding ($)', ascending=False).head(n).reset_index()
-        data.index = data.index + 1  # Start index at 1
+        data = (context or AnalyticsContext(df)).top_recipients(n)
         
         # Display table if requested
         if display_table:
@@ -924,50 +1179,110 @@ class Fetcher:
                 
         return data
 
-    def get_funding_ranges(self, df: pd.DataFrame, display_table=False) -> pd.DataFrame:
+    def get_funding_ranges(self, df: pd.DataFrame, display_table=False,
+                           context: Optional[Union[AnalyticsContext, AnalyticsState]] = None,
+                           cube: Optional[AggregateCube] = None) -> pd.DataFrame:
         """
         Analyze the distribution of grants by funding range
         
         Args:
             df: DataFrame containing grant data
             display_table: Whether to display the funding ranges table
+            context: Prepared analytics context or aggregate state of df (a context is built if not given)
+            cube: Aggregate cube slice holding the aggregates of df, to answer from instead of the rows
             
         Returns:
             DataFrame with funding range distribution
         """
-        # Make a copy and ensure proper data types
-        temp_df = df.copy()
-        temp_df['agreement_value'] = pd.to_numeric(temp_df['agreement_value'], errors='coerce')
-        
-        # Create funding range categories
-        temp_df['funding_range'] = pd.cut(
-            temp_df['agreement_value'],
-            bins=[0, 10000, 50000, 100000, 500000, float('inf')],
-            labels=['0-10K', '10K-50K', '50K-100K', '100K-500K', '500K+']
-        )
-        
         # Count grants by organization and funding range
-        data = temp_df.groupby(['org', 'funding_range'], observed=True).size().unstack(fill_value=0)
+        if cube is not None:
+            data = cube.funding_ranges()
+        else:
+            data = (context or AnalyticsContext(df)).funding_ranges()
         
-        # Ensure all columns exist
-        for col in ['0-10K', '10K-50K', '50K-100K', '100K-500K', '500K+']:
-            if col not in data.columns:
-                data[col] = 0
+        # Display table if requested
+        if display_table:
+            try:
+                from IPython.display import display
+                display(data.style.format('{:,}'))
+            except ImportError:
+                self._print(data)
                 
-        # Reorder columns
-        data = data[['0-10K', '10K-50K', '50K-100K', '100K-500K', '500K+']]
-        data.index.name = 'Organization'
+        return data
+
+    def get_annual_funding(self, df: pd.DataFrame, display_table=False, fiscal: bool = False) -> pd.DataFrame:
+        """
+        Analyze funding per year with multi-year grants spread over the years they run
+        
+        Args:
+            df: DataFrame containing grant data
+            display_table: Whether to display the annual funding table
+            fiscal: Use fiscal years (April to March) instead of calendar years
+            
+        Returns:
+            DataFrame with the funding of each organization per year
+        """
+        # Expand each grant into its yearly amounts, then sum them by year and organization
+        data = annual_funding_table(annualize_funding(df, fiscal=fiscal), df, by='org')
         
         # Display table if requested
         if display_table:
             try:
                 from IPython.display import display
-                display(data.style.format('{:,}'))
+                display(data.style.format('${:,.2f}'))
+            except ImportError:
+                self._print(data)
+                
+        return data
+
+    def get_funding_concentration(self, df: pd.DataFrame, display_table=False,
+                                  units: str = 'institutions') -> pd.DataFrame:
+        """
+        Measure how concentrated each organization's funding is per year
+        
+        Args:
+            df: DataFrame containing grant data
+            display_table: Whether to display the concentration table
+            units: Units funding is shared between (institutions, recipients or provinces)
+            
+        Returns:
+            DataFrame with the Gini coefficient, HHI and top-1/5/10 shares per organization and year
+        """
+        if units not in CONCENTRATION_UNITS:
+            raise ValueError(f"Unknown concentration units '{units}'. Choose from: {', '.join(CONCENTRATION_UNITS)}")
+        
+        # One pass over the funding of every organization x year slice
+        data = concentration_metrics(df, unit=CONCENTRATION_UNITS[units], by=['org', 'year']).round(4)
+        
+        # Display table if requested
+        if display_table:
+            try:
+                from IPython.display import display
+                display(data.style.format({'total': '${:,.2f}'}))
             except ImportError:
                 self._print(data)
                 
         return data
 
+    def get_funding_trajectory(self, df: pd.DataFrame, name: str) -> Optional[pd.DataFrame]:
+        """
+        Get the yearly funding of an institution or recipient with its trend statistics
+        
+        The trajectory index of the processed dataset is used when it was built from
+        df; otherwise an index of df is built (and kept for further lookups).
+        
+        Args:
+            df: DataFrame containing grant data
+            name: Research organization or recipient name
+            
+        Returns:
+            DataFrame indexed by year with total, count, yoy_growth, moving_average,
+            rank and rank_change, or None if nothing in df is funded under that name
+        """
+        if self.trajectories is None or not self.trajectories.describes(df):
+            self.trajectories = TrajectoryIndex.from_frame(df)
+        return self.trajectories.lookup(name)
+
     def _print_analysis_results(self, results: Dict) -> None:
         """Print the analysis results in a readable format"""
         print('\nAnalysis Results')
@@ -984,6 +1299,18 @@ class Fetcher:
         
         print(f'\nFunding Range Distribution:')
         print(results['funding_ranges'])
+        
+        if 'annual_funding' in results:
+            print(f'\nAnnualized Funding by Year:')
+            print(results['annual_funding'])
+        
+        if 'concentration' in results:
+            print(f'\nFunding Concentration by Organization and Year:')
+            print(results['concentration'])
+        
+        if 'error_bounds' in results:
+            print(f'\nError Bounds of Approximate Statistics:')
+            print(results['error_bounds'].to_string(index=False))
 
     def save_year_range_data(self, df: pd.DataFrame, year_start: int, year_end: int) -> Optional[Path]:
         """
@@ -1011,7 +1338,7 @@ class Fetcher:
         
         try:
             self._print(f"Saving year range data to {output_file}...")
-            df.to_csv(output_file, index=False)
+            self.preprocessor.restore_deferred_columns(df).to_csv(output_file, index=False)
             self._print(f"✅ Saved {len(df):,} records for years {year_start}-{year_end} to {output_file}")
             
             # Ask if compression is desired
@@ -1046,9 +1373,39 @@ def main():
     parser.add_argument('--compress', choices=['gzip', '7z'], help='Compression method')
     parser.add_argument('--quiet', action='store_true', help='Suppress output')
     parser.add_argument('--no-preprocess', action='store_true', help='Skip automatic preprocessing')
+    parser.add_argument('--engine', choices=['pandas', 'duckdb'], default='pandas',
+                        help='Engine used for the grant analysis')
+    parser.add_argument('--projection', choices=['minimal', 'full'], default=None,
+                        help='Leave out (minimal) or defer until saving (full) the heavy text columns')
+    parser.add_argument('--approximate', action='store_true',
+                        help='Estimate medians and distinct counts from mergeable sketches')
+    parser.add_argument('--distinct-error', type=float, default=DEFAULT_DISTINCT_ERROR,
+                        help=f'Relative error of approximate distinct counts (default: {DEFAULT_DISTINCT_ERROR})')
+    parser.add_argument('--quantile-error', type=float, default=DEFAULT_QUANTILE_ERROR,
+                        help=f'Rank error of approximate medians (default: {DEFAULT_QUANTILE_ERROR})')
+    parser.add_argument('--annualize', choices=['calendar', 'fiscal'], default=None,
+                        help='Also show funding per year with multi-year grants spread over their duration')
+    parser.add_argument('--concentration', choices=list(CONCENTRATION_UNITS), default=None,
+                        help='Also show funding concentration (Gini, HHI, top shares) per organization and year')
+    parser.add_argument('--no-analysis-cache', action='store_true',
+                        help='Recompute the analysis even if cached results exist')
+    parser.add_argument('--analysis-workers', type=int, default=1,
+                        help='Number of workers running independent analysis steps concurrently')
+    parser.add_argument('--analysis-executor', choices=['thread', 'process'], default='thread',
+                        help='How analysis steps run concurrently (default: thread)')
+    parser.add_argument('--trajectory', metavar='NAME',
+                        help='Show the yearly funding trajectory of an institution or recipient')
     
     args = parser.parse_args()
-    fetcher = Fetcher(FetcherConfig(quiet=args.quiet))
+    if args.approximate and args.engine == 'duckdb':
+        parser.error("--approximate is not supported with --engine duckdb")
+    fetcher = Fetcher(FetcherConfig(quiet=args.quiet, engine=args.engine, projection=args.projection,
+                                    approximate=args.approximate, distinct_error=args.distinct_error,
+                                    quantile_error=args.quantile_error, annualize=args.annualize,
+                                    concentration=args.concentration,
+                                    cache_analysis=not args.no_analysis_cache,
+                                    analysis_workers=args.analysis_workers,
+                                    analysis_executor=args.analysis_executor))
     start_time = time.time()
     
     # Determine whether to preprocess data automatically
@@ -1082,6 +1439,14 @@ def main():
     print("Running data analysis...")
     analysis_results = fetcher.analyze_grants(df, top=args.top, show=args.show)
     
+    if args.trajectory:
+        trajectory = fetcher.get_funding_trajectory(df, args.trajectory)
+        if trajectory is None:
+            print(f"\n❌ No funding found for '{args.trajectory}'")
+        else:
+            print(f"\nFunding Trajectory of {args.trajectory}:")
+            print(trajectory)
+    
     if args.save:
         print("\n" + "="*40)
         output_folder = fetcher.sample_dir if args.sample else fetcher.processed_dir
@@ -1091,7 +1456,7 @@ def main():
         output_file = output_folder / f"data_{fetcher.timestamp}{final_label}.csv"
         try:
             print(f"Saving to {output_file}...")
-            df.to_csv(output_file, index=False)
+            fetcher.preprocessor.restore_deferred_columns(df).to_csv(output_file, index=False)
             print(f"✅ Saved {len(df):,} records")
             if args.compress:
                 try:
@@ -0,0 +1,586 @@
+"""
+Polars Execution Engine for the Grant Data Preprocessor
+
+This module runs the stages of a ProcessingPipeline on Polars LazyFrames instead of
+pandas DataFrames. Polars evaluates string, date and group-by operations in parallel
+across all cores, which turns the slowest parts of the pipeline (regex cleaning of
+text columns and amendment consolidation) from minutes into seconds.
+
+Features:
+- Lazy query plans per stage, collected together with the quality report counts
+- Native implementations of every default processor, including amendment
+  consolidation as a group-by aggregation
+- Rules that depend on Python regex semantics run once per distinct value
+- Custom processors run through their pandas implementation
+- Output with the same columns and dtypes as the pandas engine
+"""
+
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from preprocessor import (
+    NUMERIC_COLUMNS,
+    DATE_COLUMNS,
+    AMENDMENT_DISCRIMINATOR_COLUMNS,
+    AMENDMENT_HISTORY_COLUMNS,
+    ISO_DATE_FORMAT,
+    PLAIN_NUMBER_PATTERN,
+    NUMBER_NOISE_PATTERN,
+    DECIMAL_COMMA_PATTERN,
+    _usage_since,
+    _usage_snapshot,
+    parse_dates,
+    to_arrow_strings,
+)
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for null values in join keys, so nulls match each other
+_NULL_KEY = "\x00null"
+
+# Dtype of parsed dates, matching the datetime64[ns] columns of the pandas engine
+_DATE_DTYPE = pl.Datetime("ns")
+
+def _is_temporal(dtype: pl.DataType) -> bool:
+    """Check whether a Polars dtype holds dates."""
+    return dtype == pl.Date or isinstance(dtype, pl.Datetime)
+
+def to_polars(df: pd.DataFrame) -> pl.DataFrame:
+    """
+    Convert a pandas DataFrame to Polars.
+
+    Object columns holding a mix of strings and other values are converted to
+    strings, as Polars columns have a single type.
+    """
+    try:
+        return pl.from_pandas(df)
+    except Exception:
+        converted = df.copy()
+        for col in converted.columns[converted.dtypes == 'object']:
+            values = converted[col]
+            converted[col] = values.where(values.isna(), values.astype(str))
+        return pl.from_pandas(converted)
+
+def to_pandas(df: pl.DataFrame, keep_none: Tuple[str, ...] = ('amendments_history',)) -> pd.DataFrame:
+    """
+    Convert a Polars DataFrame to pandas with the conventions of the pandas engine.
+
+    Missing strings become NaN, except in the columns listed in keep_none, which the
+    pandas engine fills with None.
+    """
+    result = df.to_pandas()
+    for col, dtype in df.schema.items():
+        if dtype == pl.Utf8 and col not in keep_none:
+            values = result[col]
+            result[col] = values.where(values.notna(), np.nan)
+    return result
+
+class PolarsEngine:
+    """
+    Runs the stages of a ProcessingPipeline with Polars.
+
+    Each stage adds to a lazy query plan. The plan is only collected when a stage
+    needs to look at the data (e.g. to find distinct values), and quality report
+    counts are collected in the same pass as the data they describe.
+
+    Stage metrics record the time spent planning (and any collection) in each stage
+    and the issues and fixes it found. Row and byte counts are not recorded, as the
+    data between stages is never materialized.
+    """
+
+    def __init__(self, pipeline):
+        """
+        Initialize the engine.
+
+        Args:
+            pipeline: ProcessingPipeline whose stages, registry and quality report are used
+        """
+        self.pipeline = pipeline
+        self.implementations = {
+            "clean_column_names": self._clean_column_names,
+            "map_organization_codes": self._map_organization_codes,
+            "clean_research_organization_names": self._clean_research_organization_names,
+            "standardize_city_names": self._standardize_city_names,
+            "extract_year_from_date": self._extract_year_from_date,
+            "fix_research_organizations": self._fix_research_organizations,
+            "clean_encoded_characters": self._clean_encoded_characters,
+            "ensure_numeric_values": self._ensure_numeric_values,
+            "normalize_date_fields": self._normalize_date_fields,
+            "process_amendments": self._process_amendments,
+        }
+        # Quality report records waiting for the next collection of the plan
+        self._pending = []
+        # Stage whose records are being queued
+        self._stage = None
+
+    @property
+    def quality_report(self):
+        """Quality report of the pipeline being run."""
+        return self.pipeline.quality_report
+
+    def _is_default(self, name: str) -> bool:
+        """Check whether a stage still uses the pipeline's default processor."""
+        if name not in self.implementations:
+            return False
+        func = self.pipeline.registry.get(name)
+        return getattr(func, "__self__", None) is self.pipeline and func.__name__ == f"_{name}"
+
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Process a DataFrame through all pipeline stages.
+
+        Args:
+            df: Input DataFrame
+
+        Returns:
+            Processed DataFrame with the same schema as the pandas engine produces
+        """
+        lf = to_polars(df).lazy()
+
+        for stage in self.pipeline.stages:
+            processor_name = stage["processor"]
+            params = stage["params"]
+            self._stage = processor_name
+            snapshot = _usage_snapshot()
+
+            try:
+                if self._is_default(processor_name):
+                    lf = self.implementations[processor_name](lf, **params)
+                else:
+                    # Custom processors run on pandas
+                    processor = self.pipeline.registry.get(processor_name)
+                    lf = to_polars(processor(to_pandas(self._materialize(lf)), **params)).lazy()
+            except Exception as e:
+                # Log the error but continue processing, like the pandas engine
+                logger.error(f"Error in processor '{processor_name}': {str(e)}")
+                self.quality_report.record_stage(processor_name, {"errors": 1})
+                continue
+            finally:
+                self._stage = None
+
+            usage = _usage_since(snapshot)
+            self.quality_report.record_stage(processor_name, usage)
+            logger.debug(f"Planned '{processor_name}' in {usage['wall_time']:.2f}s")
+
+        result = to_pandas(self._materialize(lf))
+        if not self.pipeline.arrow_strings:
+            return result
+        # The pandas engine converts its input, so the amendments_history column that
+        # consolidation adds stays object there
+        converted = to_arrow_strings(result)
+        if 'amendments_history' in result.columns:
+            converted['amendments_history'] = result['amendments_history']
+        return converted
+
+    #
+    # Plan collection and quality report records
+    #
+
+    def _defer_record(self, kind: str, entry_type: str, column: str, lf: pl.LazyFrame,
+                      count: pl.Expr, guard: Optional[pl.Expr] = None, record_zero: bool = False) -> None:
+        """
+        Queue a quality report record whose count is computed with the next collection.
+
+        Args:
+            kind: 'issue' or 'fix'
+            entry_type: Issue or fix type
+            column: Column the record refers to
+            lf: Plan the count is computed on
+            count: Expression evaluating to the count
+            guard: Optional expression that must be true for the record to be made
+            record_zero: Whether to record a count of zero
+        """
+        query = lf.select(count.alias("count"), (guard if guard is not None else pl.lit(True)).alias("guard"))
+        self._pending.append((kind, entry_type, column, query, record_zero, self._stage))
+
+    def _materialize(self, lf: pl.LazyFrame, *queries: pl.LazyFrame) -> Tuple:
+        """
+        Collect a plan together with the queued record counts and any extra queries.
+
+        Returns:
+            The collected DataFrame, or a tuple of it and the extra query results when
+            extra queries are given
+        """
+        pending, self._pending = self._pending, []
+        results = pl.collect_all([lf, *queries, *[entry[3] for entry in pending]])
+
+        for (kind, entry_type, column, _, record_zero, stage), counts in zip(pending, results[1 + len(queries):]):
+            count = counts["count"][0] or 0
+            if not counts["guard"][0] or (count == 0 and not record_zero):
+                continue
+            if kind == "issue":
+                self.quality_report.record_issue(entry_type, column, int(count))
+            else:
+                self.quality_report.record_fix(entry_type, column, int(count))
+            if stage is not None:
+                # Counts of a stage arrive with a later collection, so they add to its run
+                self.quality_report.record_stage(stage, {"runs": 0, "issues" if kind == "issue" else "fixes": int(count)})
+
+        if queries:
+            return (results[0], *results[1:1 + len(queries)])
+        return results[0]
+
+    def _run_pandas_kernel(self, name: str, df: pd.DataFrame, **params) -> pd.DataFrame:
+        """Run a default pandas processor on a small frame without touching the quality report."""
+        report = self.pipeline.quality_report
+        self.pipeline.quality_report = type(report)()
+        try:
+            return self.pipeline.registry.get(name)(df, **params)
+        finally:
+            self.pipeline.quality_report = report
+
+    @staticmethod
+    def _columns(lf: pl.LazyFrame) -> List[str]:
+        """Get the column names of a plan."""
+        return lf.collect_schema().names()
+
+    #
+    # Processor implementations
+    #
+
+    def _clean_column_names(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Standardize column names to snake_case format."""
+        mapping = {}
+        for col in self._columns(lf):
+            name = col.strip().lower()
+            name = re.sub(r'[^a-z0-9_]+', '_', name)
+            name = re.sub(r'_+', '_', name)
+            mapping[col] = name.strip('_')
+        return lf.rename(mapping)
+
+    def _map_organization_codes(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Map raw organization codes to standardized names."""
+        org_mapping = {
+            'cihr-irsc': 'CIHR',
+            'nserc-crsng': 'NSERC',
+            'sshrc-crsh': 'SSHRC'
+        }
+        columns = self._columns(lf)
+        if 'owner_org' in columns:
+            lf = lf.with_columns(pl.col('owner_org').replace(org_mapping)).rename({'owner_org': 'org'})
+        if 'owner_org_title' in columns:
+            lf = lf.rename({'owner_org_title': 'org_title'})
+        return lf
+
+    def _clean_research_organization_names(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Clean and standardize research organization names."""
+        col = 'research_organization_name'
+        if col not in self._columns(lf):
+            logger.warning(f"Column '{col}' not found in DataFrame")
+            return lf
+
+        values = pl.col(col).cast(pl.Utf8)
+        has_values = values.is_not_null().any()
+        error_count = values.str.contains(r'\s*[|/\\]\s*').fill_null(False).sum()
+        self._defer_record("issue", "invalid_formats", col, lf, error_count, guard=has_values)
+        self._defer_record("fix", "formats_corrected", col, lf, error_count, guard=has_values, record_zero=True)
+
+        # Put single spaces around delimiters, collapse repeated whitespace and trim
+        cleaned = (values
+            .str.replace_all(r'\s*([|/\\])\s*', ' ${1} ')
+            .str.replace_all(r'\s{2,}', ' ')
+            .str.strip_chars())
+        return lf.with_columns(cleaned.alias(col))
+
+    def _standardize_city_names(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Standardize city names to consistent format."""
+        col = 'recipient_city'
+        if col not in self._columns(lf):
+            logger.warning(f"Column '{col}' not found in DataFrame")
+            return lf
+
+        values = pl.col(col).cast(pl.Utf8)
+        has_values = values.is_not_null().any()
+        non_standard = (values.is_not_null() &
+                        ~values.str.contains(r'^[A-Z][a-z]+(?:[\s-][A-Z][a-z]+)*$').fill_null(False)).sum()
+        self._defer_record("issue", "inconsistencies", col, lf, non_standard, guard=has_values)
+        self._defer_record("fix", "inconsistencies_resolved", col, lf, non_standard, guard=has_values, record_zero=True)
+
+        # Title casing follows Python's rules, so it runs once per distinct city in Python
+        df, distinct = self._materialize(lf, lf.select(values.drop_nulls().unique()))
+        cities = distinct.get_column(col).to_list()
+        if not cities:
+            return df.lazy()
+        standardized = self._run_pandas_kernel('standardize_city_names', pd.DataFrame({col: cities}))[col].tolist()
+        return df.lazy().with_columns(pl.col(col).cast(pl.Utf8).replace(cities, standardized))
+
+    def _parse_dates(self, lf: pl.LazyFrame, columns: List[str]) -> Tuple[pl.DataFrame, Dict[str, pl.Expr]]:
+        """
+        Parse date strings with the pandas date parser, once per distinct value.
+
+        Returns:
+            Tuple of (collected DataFrame, expression per column mapping its strings
+            to dates, null for invalid values)
+        """
+        df, *distincts = self._materialize(lf, *[lf.select(pl.col(col).drop_nulls().unique()) for col in columns])
+        expressions = {}
+        for col, distinct in zip(columns, distincts):
+            values = distinct.get_column(col).to_list()
+            if not values:
+                expressions[col] = pl.lit(None, dtype=_DATE_DTYPE)
+                continue
+            parsed, _ = parse_dates(pd.Series(values, dtype=object))
+            expressions[col] = pl.col(col).replace_strict(
+                values, pl.from_pandas(parsed).cast(_DATE_DTYPE), default=None, return_dtype=_DATE_DTYPE)
+        return df, expressions
+
+    def _extract_year_from_date(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Extract year from date fields and add as a column."""
+        col = 'agreement_start_date'
+        schema = lf.collect_schema()
+        if col not in schema:
+            logger.warning(f"Column '{col}' not found in DataFrame")
+            return lf.with_columns(pl.lit(None, dtype=pl.Float64).alias('year'))
+
+        # Take the year from the parsed dates, parsing them first if they are still strings
+        dates = pl.col(col)
+        if not _is_temporal(schema[col]):
+            df, expressions = self._parse_dates(lf, [col])
+            lf, dates = df.lazy(), expressions[col]
+        year = dates.dt.year().cast(pl.Float64)
+        lf = lf.with_columns(year.alias('year'))
+        self._defer_record("issue", "missing_values", "year", lf, pl.col('year').is_null().sum())
+        return lf
+
+    def _fix_research_organizations(self, lf: pl.LazyFrame, fill_missing: bool = True) -> pl.LazyFrame:
+        """
+        Fix recipient and research organization names.
+
+        The parsing rules run in Python once per distinct combination of recipient,
+        research organization and city. Filling missing research organizations from
+        institution-like recipient names then runs on all rows in Polars, so its
+        counts are per row.
+        """
+        recipient_col = 'recipient_legal_name'
+        research_org_col = 'research_organization_name'
+        city_col = 'recipient_city'
+
+        columns = self._columns(lf)
+        for col in (recipient_col, research_org_col):
+            if col not in columns:
+                logger.warning(f"Column '{col}' not found in DataFrame")
+                return lf
+
+        key_columns = [col for col in (recipient_col, research_org_col, city_col) if col in columns]
+        keys = [pl.col(col).cast(pl.Utf8).fill_null(_NULL_KEY).alias(f"_key_{col}") for col in key_columns]
+
+        df, distinct = self._materialize(lf, lf.select([pl.col(col).cast(pl.Utf8) for col in key_columns]).unique())
+        fixed = self._run_pandas_kernel('fix_research_organizations', distinct.to_pandas(), fill_missing=False)
+
+        # Join the fixed values back on the original values
+        mapping = to_polars(fixed[key_columns].reset_index(drop=True)).with_columns(
+            [pl.col(col).cast(pl.Utf8) for col in key_columns])
+        mapping = pl.concat([distinct.select(keys), mapping.rename({col: f"_fixed_{col}" for col in key_columns})],
+                            how="horizontal")
+        lf = (df.lazy()
+            .with_columns(keys)
+            .join(mapping.lazy(), on=[f"_key_{col}" for col in key_columns], how="left", maintain_order="left")
+            .with_columns([pl.col(f"_fixed_{col}").alias(col) for col in key_columns])
+            .drop([f"_key_{col}" for col in key_columns] + [f"_fixed_{col}" for col in key_columns]))
+
+        if not fill_missing:
+            return lf
+
+        # Fill missing research organizations with institution-like recipient names
+        missing = pl.col(research_org_col).is_null()
+        self._defer_record("issue", "missing_values", research_org_col, lf, missing.sum())
+
+        df, candidates = self._materialize(lf, lf.filter(missing & pl.col(recipient_col).is_not_null())
+                                           .select(pl.col(recipient_col).unique()))
+        institutions = [name for name in candidates.get_column(recipient_col).to_list()
+                        if self.pipeline._is_likely_institution(name)]
+        fill = missing & pl.col(recipient_col).is_in(institutions)
+        lf = df.lazy()
+        self._defer_record("fix", "missing_values_filled", research_org_col, lf, fill.sum())
+        return lf.with_columns(
+            pl.when(fill)
+            .then(pl.col(recipient_col).str.replace(r'(?i)^The\s+', ''))
+            .otherwise(pl.col(research_org_col))
+            .alias(research_org_col))
+
+    def _clean_encoded_characters(self, lf: pl.LazyFrame, columns_to_clean: List[str] = None) -> pl.LazyFrame:
+        """Clean encoded characters like _x000D_ and _x000B_ in text fields."""
+        schema = lf.collect_schema()
+        if columns_to_clean is None:
+            columns_to_clean = [col for col, dtype in schema.items() if dtype == pl.Utf8]
+        else:
+            columns_to_clean = [col for col in columns_to_clean if col in schema and schema[col] == pl.Utf8]
+
+        replacements = []
+        for col in columns_to_clean:
+            values = pl.col(col)
+            encoded_count = (values.str.contains('_x000D_', literal=True).fill_null(False).sum() +
+                             values.str.contains('_x000B_', literal=True).fill_null(False).sum())
+            self._defer_record("issue", "invalid_formats", col, lf, encoded_count)
+            self._defer_record("fix", "formats_corrected", col, lf, encoded_count)
+
+            # Columns without encoded characters are left untouched, including their spacing
+            cleaned = (values
+                .str.replace_all('_x000D_', ' ', literal=True)
+                .str.replace_all('_x000B_', ' ', literal=True)
+                .str.replace_all(r'\s{2,}', ' '))
+            replacements.append(pl.when(encoded_count > 0).then(cleaned).otherwise(values).alias(col))
+
+        return lf.with_columns(replacements) if replacements else lf
+
+    def _ensure_numeric_values(self, lf: pl.LazyFrame, numeric_columns: List[str] = None) -> pl.LazyFrame:
+        """Ensure specified columns are properly formatted as numeric values."""
+        if numeric_columns is None:
+            numeric_columns = NUMERIC_COLUMNS
+        schema = lf.collect_schema()
+        existing_columns = [col for col in numeric_columns if col in schema]
+
+        text_columns = [col for col in existing_columns if schema[col] == pl.Utf8]
+        parsed = {}
+        for col in text_columns:
+            # Same rules as parse_numbers: plain numbers convert as they are, formatted
+            # ones keep only digits, separators and minus signs and have their separators resolved
+            values = pl.col(col)
+            plain = values.str.contains(f'^(?:{PLAIN_NUMBER_PATTERN})$').fill_null(False)
+            non_numeric = (~plain).sum()
+            self._defer_record("issue", "invalid_formats", col, lf, non_numeric)
+            self._defer_record("fix", "formats_corrected", col, lf, non_numeric)
+
+            cleaned = values.str.replace_all(NUMBER_NOISE_PATTERN, '')
+            decimal_comma = cleaned.str.contains(f'^(?:{DECIMAL_COMMA_PATTERN})$')
+            cleaned = (pl.when(decimal_comma)
+                .then(cleaned.str.replace_all('.', '', literal=True).str.replace_all(',', '.', literal=True))
+                .otherwise(cleaned)
+                .str.replace_all(',', '', literal=True))
+            parsed[col] = pl.when(plain).then(values).otherwise(cleaned).cast(pl.Float64, strict=False).fill_nan(None)
+
+        # Like pandas, a column is integer only if no value is missing or fractional
+        integer_columns = set()
+        if parsed:
+            _, flags = self._materialize(lf.head(0), lf.select(
+                [(expr.is_not_null() & (expr % 1 == 0)).all().alias(col) for col, expr in parsed.items()]))
+            integer_columns = {col for col in parsed if flags[col][0]}
+
+        conversions = []
+        for col in existing_columns:
+            dtype = schema[col]
+            if col in parsed:
+                target = pl.Int64 if col in integer_columns else pl.Float64
+                conversions.append(parsed[col].fill_null(0).cast(target).alias(col))
+            elif dtype.is_float():
+                conversions.append(pl.col(col).fill_nan(None).fill_null(0).alias(col))
+            elif dtype.is_numeric():
+                conversions.append(pl.col(col).fill_null(0).alias(col))
+            else:
+                conversions.append(pl.col(col).cast(pl.Float64, strict=False).fill_null(0).alias(col))
+
+        return lf.with_columns(conversions) if conversions else lf
+
+    def _normalize_date_fields(self, lf: pl.LazyFrame, date_columns: List[str] = None) -> pl.LazyFrame:
+        """Parse date fields into datetimes at midnight."""
+        if date_columns is None:
+            date_columns = DATE_COLUMNS
+        schema = lf.collect_schema()
+        existing_columns = [col for col in date_columns if col in schema]
+        if not existing_columns:
+            return lf
+
+        # The distinct values of every text column are parsed in one collection
+        text_columns = [col for col in existing_columns if schema[col] == pl.Utf8]
+        parsed_columns = {}
+        if text_columns:
+            df, parsed_columns = self._parse_dates(lf, text_columns)
+            lf = df.lazy()
+
+        conversions = []
+        for col in existing_columns:
+            dtype = schema[col]
+            values = pl.col(col)
+            if _is_temporal(dtype):
+                conversions.append(values.cast(_DATE_DTYPE).dt.truncate('1d').alias(col))
+                continue
+            if col not in text_columns:
+                conversions.append(values.cast(_DATE_DTYPE, strict=False).dt.truncate('1d').alias(col))
+                continue
+
+            parsed = parsed_columns[col]
+            invalid_count = parsed.is_null().sum() - values.is_null().sum()
+            self._defer_record("issue", "invalid_formats", col, lf, invalid_count)
+            self._defer_record("fix", "formats_corrected", col, lf, invalid_count)
+            conversions.append(parsed.alias(col))
+
+        return lf.with_columns(conversions)
+
+    def _process_amendments(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        """
+        Consolidate grant amendments with a group-by on the grant identifier.
+
+        Groups are ordered by identifier and rows within a group by amendment_number
+        (descending) like the pandas engine; only amendments_history is serialized
+        in Python, for the groups that have previous amendments.
+        """
+        schema = lf.collect_schema()
+        for col in ['ref_number', 'amendment_number']:
+            if col not in schema:
+                logger.warning(f"Required column '{col}' not found. Cannot process amendments.")
+                return lf
+
+        if not schema['amendment_number'].is_numeric():
+            lf = lf.with_columns(pl.col('amendment_number').cast(pl.Float64, strict=False).fill_null(0))
+
+        columns = list(schema.names())
+        discriminator_columns = [col for col in AMENDMENT_DISCRIMINATOR_COLUMNS if col in schema]
+        history_columns = [col for col in AMENDMENT_HISTORY_COLUMNS if col in schema]
+        logger.info(f"Creating unique identifiers using columns: ref_number and {discriminator_columns}")
+
+        unique_id = pl.concat_str(
+            [pl.col('ref_number').cast(pl.Utf8).fill_null('nan')] +
+            [pl.col(col).cast(pl.Utf8).fill_null('') for col in discriminator_columns],
+            separator='|')
+
+        grouped = (lf
+            .with_row_index('_row')
+            .with_columns(unique_id.alias('_unique_id'))
+            .sort(['_unique_id', 'amendment_number', '_row'], descending=[False, True, False], nulls_last=True)
+            .group_by('_unique_id', maintain_order=True)
+            .agg([pl.col(col).first() for col in columns] +
+                 [pl.len().alias('_amendments')] +
+                 [(pl.col(col).dt.strftime(ISO_DATE_FORMAT) if _is_temporal(schema[col]) else pl.col(col))
+                  .slice(1).alias(f"_history_{col}") for col in history_columns]))
+
+        rows_before = lf.select(pl.len())
+        df, counts = self._materialize(grouped, rows_before)
+        total_rows_before = counts.item()
+
+        # Serialize the previous amendments of each grant that has any
+        histories = [None] * len(df)
+        with_history = df.get_column('_amendments').to_numpy() > 1
+        if with_history.any():
+            positions = np.flatnonzero(with_history)
+            history_values = {col: df.get_column(f"_history_{col}").gather(positions).to_list()
+                              for col in history_columns}
+            for index, position in enumerate(positions):
+                amendments = []
+                for offset in range(len(history_values[history_columns[0]][index])):
+                    amendment = {}
+                    for col in history_columns:
+                        value = history_values[col][index][offset]
+                        if value is not None and not (isinstance(value, float) and np.isnan(value)):
+                            amendment[col] = value
+                    amendments.append(amendment)
+                histories[position] = json.dumps(amendments)
+
+        result = (df
+            .select(columns)
+            .with_columns(pl.Series('amendments_history', histories, dtype=pl.Utf8))
+            .rename({'amendment_number': 'latest_amendment_number'}))
+
+        rows_reduced = total_rows_before - len(result)
+        logger.info(f"Amendment processing complete")
+        logger.info(f"Processed dataset: {len(result):,} rows (one per unique combination)")
+        self.quality_report.record_fix("inconsistencies_resolved", "amendments", rows_reduced)
+        # The consolidation collects the plan, so its row counts are known
+        self.quality_report.record_stage("process_amendments", {"runs": 0, "rows_in": total_rows_before,
+                                                                "rows_out": len(result), "fixes": rows_reduced})
+        return result.lazy()
@@ -15,20 +15,36 @@ Features:
 """
 
 import pandas as pd
+import numpy as np
 import json
 import logging
 from pathlib import Path
 import time
-from typing import List, Dict, Optional, Callable, Union
+from typing import List, Dict, Optional, Callable, Union, Tuple, Set
 from tqdm.auto import tqdm
 import os
 import sys
 import gzip
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from contextlib import contextmanager
+import hashlib
+import importlib
+import inspect
+import threading
 import re
+import shutil
+import tempfile
 from datetime import datetime
+from collections import Counter
+from functools import lru_cache
 import warnings
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -36,6 +52,556 @@ logger = logging.getLogger(__name__)
 # Suppress pandas warnings during processing
 warnings.filterwarnings("ignore", category=pd.errors.PerformanceWarning)
 
+# Columns handled by the numeric and date processors when no explicit list is given
+NUMERIC_COLUMNS = ['agreement_value', 'foreign_currency_value', 'amendment_number']
+DATE_COLUMNS = ['agreement_start_date', 'agreement_end_date', 'amendment_date']
+
+# Columns that, together with ref_number, identify a grant across its amendments
+AMENDMENT_DISCRIMINATOR_COLUMNS = ['recipient_legal_name', 'org', 'prog_name_en', 'agreement_title_en']
+
+# Columns kept for each previous amendment in amendments_history
+AMENDMENT_HISTORY_COLUMNS = [
+    'amendment_number', 'amendment_date', 'agreement_value',
+    'agreement_start_date', 'agreement_end_date', 'additional_information_en'
+]
+
+# Long free-text columns that no analysis reads
+HEAVY_TEXT_COLUMNS = [
+    'description_en', 'expected_results_en', 'prog_purpose_en', 'additional_information_en', 'coverage'
+]
+
+# Column projections of DataPreprocessor: 'minimal' leaves the heavy text out, 'full'
+# defers it until the processed rows are saved
+PROJECTIONS = ("minimal", "full")
+
+# Column identifying the raw row of each processed row when deferred columns are joined back
+ROW_ID_COLUMN = 'source_row_id'
+
+# Prefix of the incremental state columns holding the rows matched by a stage's row probe
+PROBE_COLUMN_PREFIX = '_probe:'
+
+# Number of pipeline results kept in a result cache; storing a result removes the
+# least recently used ones beyond it
+DEFAULT_CACHE_ENTRIES = 5
+
+# Storage of text columns inside the pipeline: Arrow-backed strings take a fraction of
+# the memory of Python string objects and their .str methods run as Arrow kernels
+STRING_STORAGE = "pyarrow"
+
+# Format of normalized dates, which the date parser also tries first
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+# Number of distinct values of a date column used to infer its format
+DATE_FORMAT_SAMPLE_SIZE = 200
+
+# Numbers that need no cleaning before conversion
+PLAIN_NUMBER_PATTERN = r'-?\d+(\.\d+)?'
+
+# Whitespace as matched by Python's \s. With pyarrow string storage, regular expressions
+# run on RE2, whose \s only matches ASCII whitespace
+WHITESPACE = '[\\s\x1c-\x1f\x85\u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+
+# Characters dropped from formatted numbers: anything but digits, separators and the
+# minus sign, such as currency signs and codes, (non-breaking) spaces and parentheses
+NUMBER_NOISE_PATTERN = r'[^0-9.,-]'
+
+# Formatted numbers with a decimal comma or dots between thousands, e.g. 1234,5,
+# 1.234,50 or 1.234.567
+DECIMAL_COMMA_PATTERN = r'-?\d*,(\d{1,2}|\d{4,})|-?\d{1,3}(\.\d{3})+,\d*|-?\d{1,3}(\.\d{3}){2,}'
+
+def _fingerprint_frame(df: pd.DataFrame, columns: Optional[List[str]] = None) -> str:
+    """Compute a content hash of a DataFrame (or a subset of its columns), including the index."""
+    subset = df if columns is None else df[columns]
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in subset.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in subset.dtypes]).encode())
+    if len(subset.columns) > 0:
+        digest.update(pd.util.hash_pandas_object(subset, index=True).values.tobytes())
+    else:
+        digest.update(pd.util.hash_pandas_object(subset.index).values.tobytes())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def _module_version(module_name: str) -> str:
+    """Hash the source of a module, so edits to helpers and constants change the versions built on it."""
+    try:
+        source = inspect.getsource(importlib.import_module(module_name))
+    except (ImportError, ValueError, OSError, TypeError):
+        return module_name
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+@lru_cache(maxsize=None)
+def string_dtype() -> Optional[pd.StringDtype]:
+    """Get the dtype of text columns inside the pipeline, or None when pyarrow is unavailable."""
+    try:
+        return pd.StringDtype(STRING_STORAGE)
+    except ImportError:
+        logger.warning("pyarrow is not installed; text columns stay Python objects")
+        return None
+
+def _peak_rss() -> Optional[int]:
+    """Get the peak resident set size of this process in bytes, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _usage_snapshot() -> Tuple[float, float, Optional[int]]:
+    """Take a (wall clock, thread CPU time, peak RSS) snapshot to measure a stage with."""
+    return time.perf_counter(), time.thread_time(), _peak_rss()
+
+def _usage_since(snapshot: Tuple[float, float, Optional[int]]) -> Dict:
+    """Get the wall time, CPU time and peak RSS growth since a snapshot of the same thread."""
+    wall, cpu, rss = snapshot
+    peak = _peak_rss()
+    return {
+        "wall_time": time.perf_counter() - wall,
+        "cpu_time": time.thread_time() - cpu,
+        "peak_rss_delta": peak - rss if peak is not None and rss is not None else None
+    }
+
+def _same_rows(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Check whether two DataFrames hold the same rows and columns, in any order."""
+    if len(a) != len(b) or set(a.columns) != set(b.columns):
+        return False
+    hashes = [np.sort(pd.util.hash_pandas_object(frame[list(b.columns)].astype(str), index=False).to_numpy())
+              for frame in (a, b)]
+    return bool(np.array_equal(*hashes))
+
+def _frame_bytes(df: pd.DataFrame, columns: Optional[List[str]] = None) -> int:
+    """Get the memory used by a DataFrame's columns (all if None), including string contents."""
+    columns = df.columns if columns is None else columns
+    return int(sum(df[col].memory_usage(deep=True, index=False) for col in columns))
+
+def is_text_column(values: pd.Series) -> bool:
+    """Check whether a column holds text, as Python objects or as a string dtype."""
+    return values.dtype == 'object' or isinstance(values.dtype, pd.StringDtype)
+
+def to_arrow_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the object columns of a DataFrame that only hold strings to string_dtype().
+    
+    The DataFrame is returned unchanged when pyarrow is unavailable.
+    """
+    dtype = string_dtype()
+    if dtype is None:
+        return df
+    converted = {}
+    for col in df.columns[df.dtypes == 'object']:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty'):
+            converted[col] = df[col].astype(dtype)
+    if not converted:
+        return df
+    result = df.copy(deep=False)
+    for col, values in converted.items():
+        result[col] = values
+    return result
+
+def _restore_string_storage(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give the string columns of a DataFrame read back from Arrow data the storage of string_dtype().
+    
+    pandas restores StringDtype columns from parquet files and Arrow tables with its
+    default (python) storage, whatever storage they were written with.
+    """
+    dtype = string_dtype()
+    if dtype is None:
+        return df
+    for col in df.columns[[isinstance(d, pd.StringDtype) and d != dtype for d in df.dtypes]]:
+        df[col] = df[col].astype(dtype)
+    return df
+
+def _infer_date_format(values: pd.Series, sample_size: int = DATE_FORMAT_SAMPLE_SIZE) -> Optional[str]:
+    """Infer the format that most of a sample of date strings follow."""
+    with warnings.catch_warnings():
+        # Day-first guesses are fine here; the format is applied explicitly
+        warnings.simplefilter("ignore", UserWarning)
+        formats = Counter(pd.tseries.api.guess_datetime_format(value) for value in values.head(sample_size))
+    formats.pop(None, None)
+    return formats.most_common(1)[0][0] if formats else None
+
+def parse_dates(values: pd.Series, sample_size: int = DATE_FORMAT_SAMPLE_SIZE) -> Tuple[pd.Series, int]:
+    """
+    Parse a column of date strings into datetime64 values at midnight.
+    
+    Each distinct value is parsed once. Exact ISO dates (YYYY-MM-DD) are parsed with
+    a fixed format, the other values with the format inferred from a sample of them,
+    and values that don't fit that format one by one.
+    
+    Args:
+        values: Column of date strings
+        sample_size: Number of distinct non-ISO values used to infer the format
+        
+    Returns:
+        Tuple of (parsed dates with NaT for missing and invalid values,
+        number of non-missing values that are not valid dates)
+    """
+    codes, uniques = pd.factorize(values)
+    distinct = pd.Series(np.asarray(uniques, dtype=object)).astype(str)
+    parsed = pd.Series(pd.NaT, index=distinct.index, dtype='datetime64[ns]')
+    
+    iso = distinct.str.fullmatch(r'\d{4}-\d{2}-\d{2}')
+    if iso.any():
+        parsed[iso] = pd.to_datetime(distinct[iso], format=ISO_DATE_FORMAT, errors='coerce')
+    
+    remaining = ~iso
+    if remaining.any():
+        date_format = _infer_date_format(distinct[remaining], sample_size)
+        if date_format is not None:
+            parsed[remaining] = pd.to_datetime(distinct[remaining], format=date_format, errors='coerce',
+                                               utc=True).dt.tz_localize(None).dt.normalize()
+        unparsed = remaining & parsed.isna()
+        if unparsed.any():
+            parsed[unparsed] = pd.to_datetime(distinct[unparsed], format='mixed', errors='coerce',
+                                              utc=True).dt.tz_localize(None).dt.normalize()
+    
+    # Code -1 (missing) picks the NaT appended after the distinct values
+    dates = np.append(parsed.values, np.datetime64('NaT', 'ns')).take(codes)
+    invalid_count = int(((codes >= 0) & np.isnat(dates)).sum())
+    return pd.Series(dates, index=values.index, name=values.name), invalid_count
+
+def parse_numbers(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Parse a column of formatted numbers into float64 values.
+    
+    Plain numbers are converted as they are. The other values have every character
+    but digits, separators and minus signs removed, such as currency signs, spaces and
+    parentheses. A comma then reads as the decimal separator when it follows a dotted
+    thousands group or is not followed by exactly three digits (French formatting such
+    as "1 234,50"), and as a thousands separator otherwise ("$12,500").
+    
+    Args:
+        values: Column of numbers as strings
+        
+    Returns:
+        Tuple of (numbers with NaN for missing and unparseable values,
+        mask of the values that were not plain numbers, missing ones included)
+    """
+    text = values if isinstance(values.dtype, pd.StringDtype) else values.astype(string_dtype() or pd.StringDtype("python"))
+    plain = text.str.fullmatch(PLAIN_NUMBER_PATTERN, na=False).astype(bool)
+    numbers = pd.Series(np.nan, index=values.index, name=values.name)
+    numbers[plain] = text[plain].astype('float64')
+    
+    formatted = ~plain & text.notna()
+    if formatted.any():
+        cleaned = text[formatted].str.replace(NUMBER_NOISE_PATTERN, '', regex=True)
+        decimal_comma = cleaned.str.fullmatch(DECIMAL_COMMA_PATTERN, na=False).astype(bool)
+        cleaned = cleaned.where(
+            ~decimal_comma,
+            cleaned.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        ).str.replace(',', '', regex=False)
+        numbers[formatted] = pd.to_numeric(cleaned.astype(object), errors='coerce')
+    
+    return numbers, ~plain
+
+def _stable_row_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Compute a key per row that depends only on the row's values.
+    
+    Columns are hashed in name order so the key does not depend on column order, and
+    identical rows are told apart by their occurrence number.
+    """
+    columns = sorted(df.columns, key=str)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False)
+    occurrence = hashes.groupby(hashes).cumcount()
+    keyed = pd.DataFrame({"hash": hashes.values, "occurrence": occurrence.values})
+    return pd.Series(pd.util.hash_pandas_object(keyed, index=False).values, index=df.index)
+
+def write_frame(df: pd.DataFrame, path: Union[str, Path]) -> Path:
+    """
+    Write a DataFrame in a fast columnar format.
+    
+    Parquet is used when pyarrow is available and the frame's types are supported;
+    otherwise the frame is pickled. The suffix of the given path is replaced.
+    
+    Args:
+        df: DataFrame to write
+        path: Destination path (without a meaningful suffix)
+        
+    Returns:
+        Path of the written file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        import pyarrow  # noqa: F401
+        parquet_path = path.with_suffix('.parquet')
+        df.to_parquet(parquet_path, index=True)
+        return parquet_path
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"Falling back to pickle for {path.name}: {str(e)}")
+        path.with_suffix('.parquet').unlink(missing_ok=True)
+    
+    pickle_path = path.with_suffix('.pkl')
+    df.to_pickle(pickle_path)
+    return pickle_path
+
+def read_frame(path: Union[str, Path]) -> Optional[pd.DataFrame]:
+    """
+    Read a DataFrame written by write_frame.
+    
+    Args:
+        path: Path given to write_frame (the suffix is ignored)
+        
+    Returns:
+        The stored DataFrame, or None if no readable file exists
+    """
+    path = Path(path)
+    for suffix, reader in (('.parquet', pd.read_parquet), ('.pkl', pd.read_pickle)):
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            try:
+                return _restore_string_storage(reader(candidate))
+            except Exception as e:
+                logger.warning(f"Could not read {candidate}: {str(e)}")
+    return None
+
+def _member_path(path: Path, name: str) -> Path:
+    """Get the path of a named frame of a write_frames entry ('' names the entry path itself)."""
+    return path.parent / f"{path.name}_{name}" if name else path
+
+def write_frames(path: Union[str, Path], frames: Dict[str, pd.DataFrame], meta: Dict) -> Path:
+    """
+    Store named DataFrames with their metadata as one entry.
+    
+    Each frame is written with write_frame to PATH_NAME (PATH itself for the name
+    ''), the metadata to PATH.json. The metadata file is removed first and written
+    last, so it marks the entry as complete.
+    
+    Args:
+        path: Entry path (without a meaningful suffix)
+        frames: DataFrames by name
+        meta: JSON-serializable metadata; the creation time is added
+        
+    Returns:
+        Path of the metadata file
+    """
+    path = Path(path)
+    meta_path = path.parent / f"{path.name}.json"
+    meta_path.unlink(missing_ok=True)
+    for name, df in frames.items():
+        write_frame(df, _member_path(path, name))
+    meta_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(meta_path, 'w') as f:
+        json.dump({**meta, "created": datetime.now().isoformat()}, f, indent=2, default=int)
+    return meta_path
+
+def read_meta(path: Union[str, Path], **expected) -> Optional[Dict]:
+    """
+    Read the metadata of an entry stored by write_frames.
+    
+    Args:
+        path: Entry path given to write_frames
+        **expected: Metadata values the entry must have, e.g. its format version
+        
+    Returns:
+        The metadata, or None if the entry is incomplete, unreadable or outdated
+    """
+    path = Path(path)
+    meta_path = path.parent / f"{path.name}.json"
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+    if any(meta.get(key) != value for key, value in expected.items()):
+        logger.debug(f"Ignoring outdated {path.name}")
+        return None
+    return meta
+
+def read_frames(path: Union[str, Path], names: List[str]) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Read named DataFrames of an entry stored by write_frames.
+    
+    Args:
+        path: Entry path given to write_frames
+        names: Names of the frames to read
+        
+    Returns:
+        DataFrames by name, or None if any of them cannot be read
+    """
+    path = Path(path)
+    frames = {}
+    for name in names:
+        df = read_frame(_member_path(path, name))
+        if df is None:
+            return None
+        frames[name] = df
+    return frames
+
+def companion_path(data_file: Union[str, Path], name: str) -> Path:
+    """
+    Get the path (without suffix) of a file stored next to a dataset file.
+    
+    Args:
+        data_file: Dataset file (CSV or a compressed version of it)
+        name: Name of the companion, appended to the dataset's name
+        
+    Returns:
+        Path next to the dataset file, shared by all its compressed versions
+    """
+    data_file = Path(data_file)
+    return data_file.parent / f"{data_file.name.split('.')[0]}_{name}"
+
+def remove_companions(data_file: Union[str, Path]) -> int:
+    """
+    Remove the files stored next to a dataset file (see companion_path).
+    
+    Args:
+        data_file: Dataset file, which itself is kept
+        
+    Returns:
+        Number of files removed
+    """
+    data_file = Path(data_file)
+    removed = 0
+    for path in data_file.parent.glob(f"{data_file.name.split('.')[0]}_*"):
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+def prune_entries(directory: Union[str, Path], keep: int) -> int:
+    """
+    Remove all but the most recently used entries of a cache directory.
+    
+    An entry is a metadata file NAME.json with the frames stored as NAME or NAME_*.
+    Entries are ordered by the modification time of their metadata file, which
+    readers touch on a hit. The metadata file goes first, so a partly removed
+    entry reads as incomplete.
+    
+    Args:
+        directory: Cache directory
+        keep: Number of entries to keep
+        
+    Returns:
+        Number of entries removed
+    """
+    directory = Path(directory)
+    if not directory.exists():
+        return 0
+    entries = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for meta_path in entries[keep:]:
+        meta_path.unlink(missing_ok=True)
+        for path in directory.glob(f"{meta_path.stem}[._]*"):
+            path.unlink(missing_ok=True)
+    return max(len(entries) - keep, 0)
+
+def frame_exists(path: Union[str, Path]) -> bool:
+    """Check whether write_frame has stored a DataFrame at the given path."""
+    path = Path(path)
+    return path.with_suffix('.parquet').exists() or path.with_suffix('.pkl').exists()
+
+def share_frame(df: pd.DataFrame) -> Tuple:
+    """
+    Place a DataFrame in shared memory as an Arrow IPC stream.
+    
+    Falls back to passing the frame itself when pyarrow is unavailable or cannot
+    represent the frame's types.
+    
+    Returns:
+        Handle to pass to another process and read with open_shared_frame()
+    """
+    try:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        # Measure the stream first so it can be written straight into the shared block
+        mock = pa.MockOutputStream()
+        with pa.ipc.new_stream(mock, table.schema) as writer:
+            writer.write_table(table)
+        size = mock.size()
+    except ImportError:
+        return ("frame", df)
+    except Exception as e:
+        logger.debug(f"Passing frame without shared memory: {str(e)}")
+        return ("frame", df)
+    
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        sink = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+        writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        sink.close()
+        # Arrow objects keep the block's buffer exported until they are released
+        del writer, sink
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return ("shm", shm.name, size)
+
+def open_shared_frame(handle: Tuple, release: bool = False) -> pd.DataFrame:
+    """
+    Read a DataFrame from a handle created by share_frame().
+    
+    The Arrow buffers are read in place from shared memory and converted to pandas.
+    The result is then copied once more, as columns the conversion did not copy
+    would still point into the block, which is closed before returning. String
+    columns get the storage of string_dtype() back.
+    
+    Args:
+        handle: Handle returned by share_frame()
+        release: Whether to free the shared memory block after reading
+    """
+    if handle[0] == "frame":
+        return handle[1]
+    
+    import pyarrow as pa
+    _, name, size = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf)[:size]).read_all()
+        view = table.to_pandas()
+        # Columns converted without a copy still point into the block, which is about to close
+        df = view.copy(deep=True)
+        df.index = view.index.copy(deep=True)
+        _restore_string_storage(df)
+        del table, view
+    finally:
+        shm.close()
+        if release:
+            shm.unlink()
+    return df
+
+def release_shared_frame(handle: Tuple) -> None:
+    """Free the shared memory block behind a handle that will not be read."""
+    if handle[0] != "shm":
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=handle[1])
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+# Pipeline of a worker process, set once by the executor initializer
+_worker_pipeline = None
+
+def _init_pipeline_worker(pipeline: 'ProcessingPipeline') -> None:
+    """Executor initializer storing the pipeline each chunk in this worker is processed with."""
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+def _process_shared_chunk(handle: Tuple, metadata: Dict) -> Tuple[Tuple, Dict, List[Dict], Dict]:
+    """
+    Process a chunk passed through shared memory in a worker process.
+    
+    Returns:
+        Tuple of (handle of the processed frame, chunk metadata, chunk history,
+        quality report state of this chunk)
+    """
+    # Each chunk gets its own report so the parent can add the chunks' counts together
+    _worker_pipeline.quality_report = DataQualityReport()
+    chunk = DataChunk(open_shared_frame(handle), metadata)
+    chunk = _worker_pipeline._process_chunk(chunk)
+    return share_frame(chunk.df), chunk.metadata, chunk.get_history(), _worker_pipeline.quality_report.export_state()
+
 class DataQualityReport:
     """Class to track data quality issues and fixes during preprocessing."""
     
@@ -60,18 +626,99 @@ class DataQualityReport:
             "final_column_count": 0,
             "processing_time": 0
         }
+        # Per-stage resource usage, keyed by processor name
+        self.stage_metrics = {}
         self.start_time = time.time()
+        # Per-thread lists of recorded entries, used to replay a stage's records later
+        self._captures = {}
         
     def record_issue(self, issue_type: str, column: str, count: int) -> None:
         """Record a data quality issue."""
+        self._capture_entry("issue", issue_type, column, count)
         if issue_type in self.issues:
             self.issues[issue_type][column] = count
         
     def record_fix(self, fix_type: str, column: str, count: int) -> None:
         """Record a data quality fix."""
+        self._capture_entry("fix", fix_type, column, count)
         if fix_type in self.fixes:
             self.fixes[fix_type][column] = count
     
+    def _capture_entry(self, kind: str, entry_type: str, column: str, count: int) -> None:
+        """Append an entry to the active capture of the current thread, if any."""
+        entries = self._captures.get(threading.get_ident())
+        if entries is not None:
+            entries.append((kind, entry_type, column, count))
+    
+    @contextmanager
+    def capture(self):
+        """
+        Capture the issues and fixes recorded by the current thread.
+        
+        Records still go into the report as usual; the yielded list additionally
+        receives (kind, type, column, count) tuples that can be passed to replay().
+        """
+        thread_id = threading.get_ident()
+        previous = self._captures.get(thread_id)
+        entries = []
+        self._captures[thread_id] = entries
+        try:
+            yield entries
+        finally:
+            if previous is None:
+                self._captures.pop(thread_id, None)
+            else:
+                self._captures[thread_id] = previous
+                previous.extend(entries)
+    
+    def replay(self, entries: List[Tuple]) -> None:
+        """Re-apply entries captured from this or another report."""
+        for kind, entry_type, column, count in entries:
+            if kind == "issue":
+                self.record_issue(entry_type, column, count)
+            else:
+                self.record_fix(entry_type, column, count)
+    
+    def record_stage(self, stage: str, metrics: Dict) -> None:
+        """
+        Add the metrics of one run of a stage to its totals.
+        
+        Counts and times are summed over runs (e.g. chunks), while peak_rss_delta
+        keeps the largest growth of peak memory seen in a single run.
+        """
+        totals = self.stage_metrics.setdefault(stage, {"runs": 0})
+        totals["runs"] += metrics.get("runs", 1)
+        for key, value in metrics.items():
+            if key == "runs" or value is None:
+                continue
+            if key == "peak_rss_delta":
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+    
+    def export_state(self) -> Dict:
+        """Get the issues, fixes and stage metrics to merge into another report."""
+        return {
+            "issues": self.issues,
+            "fixes": self.fixes,
+            "stage_metrics": self.stage_metrics
+        }
+    
+    def merge_state(self, state: Dict) -> None:
+        """
+        Merge the state of a report that covered a different part of the data.
+        
+        Issue and fix counts of the same type and column are added together, as
+        they were counted on disjoint chunks.
+        """
+        for target, counts in ((self.issues, state.get("issues", {})), (self.fixes, state.get("fixes", {}))):
+            for entry_type, columns in counts.items():
+                merged = target.setdefault(entry_type, {})
+                for column, count in columns.items():
+                    merged[column] = merged.get(column, 0) + count
+        for stage, metrics in state.get("stage_metrics", {}).items():
+            self.record_stage(stage, metrics)
+    
     def update_metrics(self, initial_df: pd.DataFrame, final_df: pd.DataFrame) -> None:
         """Update metrics based on initial and final DataFrames."""
         self.metrics["initial_row_count"] = len(initial_df)
@@ -80,12 +727,23 @@ class DataQualityReport:
         self.metrics["final_column_count"] = len(final_df.columns)
         self.metrics["processing_time"] = time.time() - self.start_time
     
+    def load_report(self, report: Dict) -> None:
+        """Restore issues, fixes and metrics from a report produced by get_report()."""
+        for issue_type, columns in report.get("issues", {}).items():
+            self.issues.setdefault(issue_type, {}).update(columns)
+        for fix_type, columns in report.get("fixes", {}).items():
+            self.fixes.setdefault(fix_type, {}).update(columns)
+        self.metrics.update(report.get("metrics", {}))
+        for stage, metrics in report.get("stages", {}).items():
+            self.stage_metrics[stage] = dict(metrics)
+    
     def get_report(self) -> Dict:
         """Generate a comprehensive data quality report."""
         return {
             "issues": self.issues,
             "fixes": self.fixes,
             "metrics": self.metrics,
+            "stages": self.stage_metrics,
             "summary": self._generate_summary()
         }
     
@@ -124,6 +782,12 @@ class DataQualityReport:
         print(f"Final Row Count: {self.metrics['final_row_count']:,}")
         print(f"Row Reduction: {summary['row_reduction']:,} ({summary['row_reduction_percent']:.2f}%)")
         
+        incremental = self.metrics.get("incremental")
+        if incremental:
+            print(f"Incremental Update: {incremental['new_rows']:,} new or changed rows, "
+                  f"{incremental['removed_rows']:,} removed rows, "
+                  f"{incremental['affected_groups']:,} groups reprocessed")
+        
         print(f"\nTotal Issues Detected: {summary['total_issues_detected']:,}")
         print(f"Total Issues Fixed: {summary['total_issues_fixed']:,}")
         
@@ -147,6 +811,22 @@ class DataQualityReport:
                     print(f"\n{fix_type.replace('_', ' ').title()}:")
                     for column, count in sorted(fixes.items(), key=lambda x: x[1], reverse=True):
                         print(f"  - {column}: {count:,}")
+            
+            if self.stage_metrics:
+                print("\n" + "-"*50)
+                print("STAGE METRICS")
+                print("-"*50)
+                
+                for stage, metrics in self.stage_metrics.items():
+                    rss = metrics.get("peak_rss_delta")
+                    print(f"\n{stage}:")
+                    print(f"  - Wall time: {metrics.get('wall_time', 0):.2f}s, CPU time: {metrics.get('cpu_time', 0):.2f}s")
+                    print(f"  - Rows: {metrics.get('rows_in', 0):,} -> {metrics.get('rows_out', 0):,}")
+                    print(f"  - Bytes: {metrics.get('bytes_in', 0) / 1024 / 1024:.1f}MB -> "
+                          f"{metrics.get('bytes_out', 0) / 1024 / 1024:.1f}MB")
+                    if rss is not None:
+                        print(f"  - Peak memory growth: {rss / 1024 / 1024:.1f}MB")
+                    print(f"  - Issues: {metrics.get('issues', 0):,}, Fixes: {metrics.get('fixes', 0):,}")
         
         print("\n" + "="*50)
 
@@ -157,11 +837,45 @@ class ProcessorRegistry:
         """Initialize an empty processor registry."""
         self.processors = {}
         
-    def register(self, name: str, func: Callable, description: str = "") -> None:
-        """Register a processor function."""
+    def register(self, name: str, func: Callable, description: str = "",
+                 reads: Optional[List[str]] = None, writes: Optional[List[str]] = None,
+                 columns_param: Optional[str] = None, version: Optional[str] = None,
+                 row_local: bool = False, group_key: Optional[str] = None,
+                 row_probe: Optional[Callable] = None, probe_param: Optional[str] = None) -> None:
+        """
+        Register a processor function.
+        
+        Args:
+            name: Name to register the processor under
+            func: Processor function
+            description: Description of what the processor does
+            reads: Columns the processor reads (None if it may read any column)
+            writes: Columns the processor writes, creates or renames (None if it may
+                write any column or change the rows)
+            columns_param: Name of a stage parameter that, when given, replaces both
+                the declared reads and writes
+            version: Code version of the processor (defaults to a hash of its source)
+            row_local: Whether each output row depends only on the matching input row,
+                so the processor can run on any subset of rows
+            group_key: Column whose groups the processor handles independently, so it
+                can run on any set of complete groups
+            row_probe: For a row-local processor that treats a whole column differently
+                when any of its rows matches, a function taking the processor's input
+                and parameters and returning the matching rows per column
+            probe_param: Parameter through which the processor is told the columns
+                matched anywhere in the data, when it runs on a subset of the rows
+        """
         self.processors[name] = {
             "function": func,
-            "description": description
+            "description": description,
+            "reads": reads,
+            "writes": writes,
+            "columns_param": columns_param,
+            "version": version,
+            "row_local": row_local,
+            "group_key": group_key,
+            "row_probe": row_probe,
+            "probe_param": probe_param
         }
         
     def get(self, name: str) -> Callable:
@@ -170,6 +884,67 @@ class ProcessorRegistry:
             raise ValueError(f"Processor '{name}' not registered")
         return self.processors[name]["function"]
     
+    def get_version(self, name: str) -> str:
+        """
+        Get the code version of a processor.
+        
+        Without a registered version, the processor's source is hashed together with
+        the source of its module, since the module's helpers and constants (date and
+        number parsing, patterns, amendment handling) shape its output as well.
+        """
+        if name not in self.processors:
+            raise ValueError(f"Processor '{name}' not registered")
+        info = self.processors[name]
+        if info.get("version") is None:
+            func = info["function"]
+            try:
+                source = inspect.getsource(func)
+            except (OSError, TypeError):
+                source = getattr(func, "__qualname__", repr(func))
+            source += _module_version(getattr(func, "__module__", None) or "")
+            info["version"] = hashlib.sha256(source.encode()).hexdigest()[:16]
+        return info["version"]
+    
+    def get_columns(self, name: str, params: Dict = None) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        """
+        Get the columns a processor reads and writes for the given stage parameters.
+        
+        Returns:
+            Tuple of (reads, writes) column sets, where None means all columns
+        """
+        if name not in self.processors:
+            raise ValueError(f"Processor '{name}' not registered")
+        info = self.processors[name]
+        reads, writes = info.get("reads"), info.get("writes")
+        
+        columns_param = info.get("columns_param")
+        if columns_param and params and params.get(columns_param) is not None:
+            reads = writes = params[columns_param]
+        
+        return (set(reads) if reads is not None else None,
+                set(writes) if writes is not None else None)
+    
+    def is_row_local(self, name: str) -> bool:
+        """Check whether a processor can run on any subset of rows."""
+        if name not in self.processors:
+            raise ValueError(f"Processor '{name}' not registered")
+        return self.processors[name].get("row_local", False)
+    
+    def get_group_key(self, name: str) -> Optional[str]:
+        """Get the column whose groups a processor handles independently, if any."""
+        if name not in self.processors:
+            raise ValueError(f"Processor '{name}' not registered")
+        return self.processors[name].get("group_key")
+    
+    def get_row_probe(self, name: str) -> Optional[Tuple[Callable, str]]:
+        """Get the row probe of a processor and the parameter that takes its matched columns, if any."""
+        if name not in self.processors:
+            raise ValueError(f"Processor '{name}' not registered")
+        info = self.processors[name]
+        if info.get("row_probe") is None:
+            return None
+        return info["row_probe"], info["probe_param"]
+    
     def list_processors(self) -> Dict:
         """List all registered processors."""
         return {name: info["description"] for name, info in self.processors.items()}
@@ -200,13 +975,61 @@ class ProcessingPipeline:
     A modular pipeline for processing data through a series of transformations.
     """
     
-    def __init__(self, registry: ProcessorRegistry = None, chunk_size: int = 100000):
-        """Initialize the processing pipeline."""
+    def __init__(self, registry: ProcessorRegistry = None, chunk_size: int = 100000,
+                 stage_workers: int = 1, stage_executor: str = "thread", cache_stages: bool = False,
+                 checkpoint_dir: Optional[Union[str, Path]] = None, engine: str = "pandas",
+                 arrow_strings: bool = True):
+        """
+        Initialize the processing pipeline.
+        
+        Args:
+            registry: Processor registry to use (a new one is created if None)
+            chunk_size: Size of data chunks for parallel processing
+            stage_workers: Number of workers used to run independent stages concurrently
+            stage_executor: How independent stages run concurrently: 'thread' or 'process'
+            cache_stages: Whether to reuse a stage's output when its input columns are
+                unchanged since a previous run of this pipeline
+            checkpoint_dir: Directory for per-stage checkpoints (disabled if None)
+            engine: DataFrame library that runs the stages: 'pandas' or 'polars'
+            arrow_strings: Whether text columns are converted to Arrow-backed strings
+                (see string_dtype) when data enters the pipeline
+        """
+        if stage_executor not in ("thread", "process"):
+            raise ValueError(f"Unknown stage executor '{stage_executor}'")
+        if engine not in ("pandas", "polars"):
+            raise ValueError(f"Unknown engine '{engine}'")
+        if engine == "polars":
+            # The polars engine runs the stages as one lazy plan, without per-stage outputs
+            unsupported = [option for option, used in (("stage_workers", stage_workers > 1),
+                                                       ("cache_stages", cache_stages),
+                                                       ("checkpoint_dir", checkpoint_dir is not None)) if used]
+            if unsupported:
+                raise ValueError(f"The polars engine does not support {', '.join(unsupported)}")
+            try:
+                import polars  # noqa: F401
+            except ImportError:
+                raise ImportError("The polars engine requires polars. Install it with: pip install polars")
         self.registry = registry or ProcessorRegistry()
         self.stages = []
         self.chunk_size = chunk_size
+        self.stage_workers = stage_workers
+        self.stage_executor = stage_executor
+        self.cache_stages = cache_stages
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir is not None else None
+        self.engine = engine
+        self.arrow_strings = arrow_strings
         self.quality_report = DataQualityReport()
+        self._stage_cache = {}
+        # Rows the last incremental run (retracted, inserted) from/into its previous output
+        self.last_delta: Optional[Tuple[pd.DataFrame, pd.DataFrame]] = None
         self._configure_default_processors()
+    
+    def __getstate__(self) -> Dict:
+        """Drop the stage cache and last delta when the pipeline is pickled for worker processes."""
+        state = self.__dict__.copy()
+        state["_stage_cache"] = {}
+        state["last_delta"] = None
+        return state
         
     def add_stage(self, processor_name: str, params: Dict = None) -> 'ProcessingPipeline':
         """Add a processing stage to the pipeline."""
@@ -222,13 +1045,17 @@ class ProcessingPipeline:
         self.registry.register(
             "clean_column_names",
             self._clean_column_names,
-            "Standardize column names to snake_case format"
+            "Standardize column names to snake_case format",
+            row_local=True
         )
         
         self.registry.register(
             "map_organization_codes",
             self._map_organization_codes,
-            "Map raw organization codes to standardized names"
+            "Map raw organization codes to standardized names",
+            reads=['owner_org', 'owner_org_title'],
+            writes=['owner_org', 'owner_org_title', 'org', 'org_title'],
+            row_local=True
         )
         
         # Data cleaning processors
@@ -236,70 +1063,324 @@ class ProcessingPipeline:
         self.registry.register(
             "clean_research_organization_names",
             self._clean_research_organization_names,
-            "Clean and standardize research organization names"
+            "Clean and standardize research organization names",
+            reads=['research_organization_name'],
+            writes=['research_organization_name'],
+            row_local=True
         )
         
         self.registry.register(
             "standardize_city_names",
             self._standardize_city_names,
-            "Standardize city names to consistent format"
+            "Standardize city names to consistent format",
+            reads=['recipient_city'],
+            writes=['recipient_city'],
+            row_local=True
         )
         
         self.registry.register(
             "extract_year_from_date",
             self._extract_year_from_date,
-            "Extract year from date fields and add as a column"
+            "Extract year from date fields and add as a column",
+            reads=['agreement_start_date'],
+            writes=['year'],
+            row_local=True
         )
         
         self.registry.register(
             "fix_research_organizations",
             self._fix_research_organizations,
-            "Fix missing research organization names using recipient names"
+            "Fix missing research organization names using recipient names",
+            reads=['recipient_legal_name', 'research_organization_name', 'recipient_city'],
+            writes=['recipient_legal_name', 'research_organization_name', 'recipient_city'],
+            row_local=True
         )
 
         self.registry.register(
             "clean_encoded_characters",
             self._clean_encoded_characters,
-            "Clean encoded characters like _x000D_ and _x000B_ in text fields"
+            "Clean encoded characters like _x000D_ and _x000B_ in text fields",
+            columns_param='columns_to_clean',
+            row_local=True,
+            row_probe=self._encoded_character_rows,
+            probe_param='encoded_columns'
         )
         
         # Data type processors
         self.registry.register(
             "ensure_numeric_values",
             self._ensure_numeric_values,
-            "Ensure specified columns are properly formatted as numeric values"
+            "Ensure specified columns are properly formatted as numeric values",
+            reads=NUMERIC_COLUMNS,
+            writes=NUMERIC_COLUMNS,
+            columns_param='numeric_columns',
+            row_local=True
         )
         
         self.registry.register(
             "normalize_date_fields",
             self._normalize_date_fields,
-            "Normalize date fields to consistent format"
+            "Parse date fields into a datetime dtype",
+            reads=DATE_COLUMNS,
+            writes=DATE_COLUMNS,
+            columns_param='date_columns',
+            row_local=True
         )
         
         # Advanced processors
         self.registry.register(
             "process_amendments",
             self._process_amendments,
-            "Process grant amendments to create a consolidated dataset"
+            "Process grant amendments to create a consolidated dataset",
+            group_key='ref_number'
         )
     
-    def _process_chunk(self, chunk: DataChunk) -> DataChunk:
-        """Process a single data chunk through all pipeline stages."""
-        for stage in self.stages:
+    def _stage_columns(self, stage: Dict) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        """Get the (reads, writes) column sets of a stage, None meaning all columns."""
+        return self.registry.get_columns(stage["processor"], stage["params"])
+    
+    @staticmethod
+    def _columns_overlap(first: Optional[Set[str]], second: Optional[Set[str]]) -> bool:
+        """Check whether two column sets (None meaning all columns) share a column."""
+        if first is None:
+            return second is None or len(second) > 0
+        if second is None:
+            return len(first) > 0
+        return not first.isdisjoint(second)
+    
+    def build_schedule(self) -> List[List[int]]:
+        """
+        Group the pipeline stages into waves of mutually independent stages.
+        
+        A stage depends on an earlier stage when one of them writes a column the
+        other reads or writes. Stages without column declarations depend on every
+        earlier stage, and every later stage depends on them.
+        
+        Returns:
+            List of waves, each a list of stage indices in pipeline order
+        """
+        columns = [self._stage_columns(stage) for stage in self.stages]
+        levels = []
+        for i, (reads, writes) in enumerate(columns):
+            touched = None if reads is None or writes is None else reads | writes
+            level = 0
+            for j in range(i):
+                earlier_reads, earlier_writes = columns[j]
+                if (self._columns_overlap(earlier_writes, touched) or
+                        self._columns_overlap(earlier_reads, writes)):
+                    level = max(level, levels[j] + 1)
+            levels.append(level)
+        
+        waves = [[] for _ in range(max(levels) + 1)] if levels else []
+        for index, level in enumerate(levels):
+            waves[level].append(index)
+        return waves
+    
+    def _ingest(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert raw data to the dtypes used inside the pipeline."""
+        return to_arrow_strings(df) if self.arrow_strings else df
+    
+    def _should_skip_stage(self, df: pd.DataFrame, stage: Dict) -> bool:
+        """Check whether a stage only transforms input columns that are all absent."""
+        reads, writes = self._stage_columns(stage)
+        if reads is None or writes is None or not writes.issubset(reads):
+            return False
+        return not any(col in df.columns for col in reads)
+    
+    def _projected_columns(self, df: pd.DataFrame, stage: Dict) -> Optional[List[str]]:
+        """Get the existing columns a stage touches, or None if it may touch any column."""
+        reads, writes = self._stage_columns(stage)
+        if reads is None or writes is None:
+            return None
+        touched = reads | writes
+        return [col for col in df.columns if col in touched]
+    
+    def _apply_stage_projection(self, df: pd.DataFrame, stage: Dict) -> Tuple[pd.DataFrame, List[Tuple], Dict]:
+        """
+        Run a stage on the projection of a DataFrame to the columns it touches.
+        
+        Returns:
+            Tuple of (processed projection, captured quality report entries, resource usage)
+        """
+        processor = self.registry.get(stage["processor"])
+        snapshot = _usage_snapshot()
+        with self.quality_report.capture() as entries:
+            result_df = processor(df, **stage["params"])
+        return result_df, entries, _usage_since(snapshot)
+    
+    def _record_stage_metrics(self, stage: Dict, usage: Dict, input_df: pd.DataFrame,
+                              output_df: pd.DataFrame, entries: List[Tuple]) -> None:
+        """Record the resource usage, row and byte counts, issues and fixes of a stage run."""
+        metrics = dict(usage)
+        metrics.update({
+            "rows_in": len(input_df),
+            "rows_out": len(output_df),
+            # Only the columns a stage touches count towards its bytes
+            "bytes_in": _frame_bytes(input_df, self._projected_columns(input_df, stage)),
+            "bytes_out": _frame_bytes(output_df, self._projected_columns(output_df, stage)),
+            "issues": int(sum(count for kind, _, _, count in entries if kind == "issue")),
+            "fixes": int(sum(count for kind, _, _, count in entries if kind == "fix"))
+        })
+        self.quality_report.record_stage(stage["processor"], metrics)
+    
+    @staticmethod
+    def _merge_projection(df: pd.DataFrame, input_columns: List[str], output: pd.DataFrame) -> pd.DataFrame:
+        """
+        Merge the output of a stage that ran on a column projection back into the full DataFrame.
+        
+        Columns keep their position, a projection whose columns were all replaced
+        one-for-one is treated as a rename, and new columns are appended.
+        """
+        result_df = df.copy(deep=False)
+        output_columns = list(output.columns)
+        
+        renames = {}
+        if len(output_columns) == len(input_columns):
+            renames = {old: new for old, new in zip(input_columns, output_columns)
+                       if old != new and old not in output_columns and new not in result_df.columns}
+        if renames:
+            result_df.columns = [renames.get(col, col) for col in result_df.columns]
+        
+        current_inputs = [renames.get(col, col) for col in input_columns]
+        dropped = [col for col in current_inputs if col not in output_columns]
+        if dropped:
+            result_df = result_df.drop(columns=dropped)
+        
+        for col in output_columns:
+            result_df[col] = output[col]
+        return result_df
+    
+    def _stage_cache_key(self, stage: Dict) -> str:
+        """Build the key identifying a stage in the stage cache."""
+        return json.dumps([stage["processor"], stage["params"]], sort_keys=True, default=str)
+    
+    def _run_stage(self, df: pd.DataFrame, stage: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """
+        Run a single stage on a DataFrame, skipping it or reusing a cached result when possible.
+        
+        Returns:
+            Tuple of (processed DataFrame, details for the chunk history)
+        """
+        processor_name = stage["processor"]
+        params = stage["params"]
+        
+        if self._should_skip_stage(df, stage):
+            return df, {"params": params, "skipped": "input columns absent"}
+        
+        input_columns = self._projected_columns(df, stage)
+        if not self.cache_stages or input_columns is None:
+            processor = self.registry.get(processor_name)
+            return processor(df, **params), {"params": params}
+        
+        # Reuse the cached output when the stage's input columns are unchanged
+        cache_key = self._stage_cache_key(stage)
+        fingerprint = _fingerprint_frame(df, input_columns)
+        cached = self._stage_cache.get(cache_key)
+        if cached is not None and cached[0] == fingerprint:
+            _, cached_columns, cached_output, entries = cached
+            self.quality_report.replay(entries)
+            return self._merge_projection(df, cached_columns, cached_output), {"params": params, "cached": True}
+        
+        output, entries, _ = self._apply_stage_projection(df[input_columns], stage)
+        self._stage_cache[cache_key] = (fingerprint, input_columns, output, entries)
+        return self._merge_projection(df, input_columns, output), {"params": params}
+    
+    def _run_wave(self, df: pd.DataFrame, wave: List[Dict]) -> Tuple[pd.DataFrame, List[Tuple[str, Dict]]]:
+        """
+        Run a wave of independent stages concurrently on column projections.
+        
+        Returns:
+            Tuple of (processed DataFrame, list of (processor name, history details))
+        """
+        executor_class = ThreadPoolExecutor if self.stage_executor == "thread" else ProcessPoolExecutor
+        with executor_class(max_workers=min(self.stage_workers, len(wave))) as executor:
+            submitted = []
+            for stage in wave:
+                if self._should_skip_stage(df, stage):
+                    submitted.append((stage, None, None))
+                    continue
+                input_columns = self._projected_columns(df, stage)
+                future = executor.submit(self._apply_stage_projection, df[input_columns], stage)
+                submitted.append((stage, input_columns, future))
+            
+            # Merge in pipeline order so the resulting column order is deterministic
+            history = []
+            for stage, input_columns, future in submitted:
+                params = stage["params"]
+                if future is None:
+                    history.append((stage["processor"], {"params": params, "skipped": "input columns absent"}))
+                    continue
+                try:
+                    output, entries, usage = future.result()
+                    # Entries recorded in worker processes only exist in the worker's report
+                    self.quality_report.replay(entries)
+                    self._record_stage_metrics(stage, usage, df[input_columns], output, entries)
+                    df = self._merge_projection(df, input_columns, output)
+                    history.append((stage["processor"], {"params": params}))
+                except Exception as e:
+                    logger.error(f"Error in processor '{stage['processor']}': {str(e)}")
+                    history.append((stage["processor"], {"error": str(e), "params": params}))
+                    self.quality_report.record_stage(stage["processor"], {"errors": 1})
+        
+        return df, history
+    
+    def _execution_waves(self) -> List[List[int]]:
+        """Get the waves of stage indices to execute, one stage per wave when running serially."""
+        if self.stage_workers > 1:
+            return self.build_schedule()
+        return [[index] for index in range(len(self.stages))]
+    
+    def _run_stage_range(self, df: pd.DataFrame, start: int, end: int, strict: bool = False) -> pd.DataFrame:
+        """
+        Run the stages with indices in [start, end) on a DataFrame, without checkpoints.
+        
+        A stage that fails is logged and skipped, or raises a ValueError when strict.
+        """
+        chunk = DataChunk(df)
+        for wave in self._execution_waves():
+            stages = [self.stages[index] for index in wave if start <= index < end]
+            if stages and not self._run_chunk_wave(chunk, stages) and strict:
+                raise ValueError(f"Stage(s) {[stage['processor'] for stage in stages]} failed")
+        return chunk.df
+    
+    def _run_chunk_wave(self, chunk: DataChunk, stages: List[Dict]) -> bool:
+        """
+        Run one wave of stages on a chunk.
+        
+        Returns:
+            True if every stage in the wave completed without an error
+        """
+        succeeded = True
+        
+        # Independent stages that declare their columns run concurrently
+        if len(stages) > 1 and all(self._projected_columns(chunk.df, stage) is not None for stage in stages):
+            rows_before = len(chunk.df)
+            chunk.df, history = self._run_wave(chunk.df, stages)
+            for processor_name, details in history:
+                if "error" in details:
+                    succeeded = False
+                else:
+                    details.update({"rows_before": rows_before, "rows_after": len(chunk.df)})
+                chunk.record_operation(processor_name, details)
+            return succeeded
+        
+        for stage in stages:
             processor_name = stage["processor"]
             params = stage["params"]
             
             try:
-                processor = self.registry.get(processor_name)
                 # Pass the chunk DataFrame and any parameters to the processor
-                result_df = processor(chunk.df, **params)
+                snapshot = _usage_snapshot()
+                with self.quality_report.capture() as entries:
+                    result_df, details = self._run_stage(chunk.df, stage)
+                self._record_stage_metrics(stage, _usage_since(snapshot), chunk.df, result_df, entries)
                 
                 # Record the operation in chunk history
-                chunk.record_operation(processor_name, {
-                    "params": params,
+                details.update({
                     "rows_before": len(chunk.df),
                     "rows_after": len(result_df),
                 })
+                chunk.record_operation(processor_name, details)
                 
                 # Update the chunk with the processed DataFrame
                 chunk.df = result_df
@@ -311,70 +1392,679 @@ class ProcessingPipeline:
                     "error": str(e),
                     "params": params
                 })
+                self.quality_report.record_stage(processor_name, {"errors": 1})
+                succeeded = False
+        
+        return succeeded
+    
+    def _checkpoint_keys(self, df: pd.DataFrame, waves: List[List[int]]) -> List[str]:
+        """
+        Build the checkpoint key after each wave.
+        
+        Each key hashes the previous key (starting from the input fingerprint) with the
+        name, parameters and code version of every stage in the wave, so a key is only
+        valid for the exact input and stage prefix that produced it.
+        """
+        key = _fingerprint_frame(df)
+        keys = []
+        for wave in waves:
+            stages = [[self.stages[index]["processor"],
+                       self.stages[index]["params"],
+                       self.registry.get_version(self.stages[index]["processor"])]
+                      for index in wave]
+            payload = json.dumps([key, stages], sort_keys=True, default=str)
+            key = hashlib.sha256(payload.encode()).hexdigest()
+            keys.append(key)
+        return keys
+    
+    def _restore_checkpoint(self, keys: List[str]) -> Tuple[int, Optional[pd.DataFrame], List[Tuple]]:
+        """
+        Find the deepest valid checkpoint.
+        
+        Returns:
+            Tuple of (number of completed waves, restored DataFrame, quality report entries)
+        """
+        for position in range(len(keys) - 1, -1, -1):
+            meta_path = self.checkpoint_dir / f"{keys[position]}.json"
+            if not meta_path.exists():
+                continue
+            df = read_frame(self.checkpoint_dir / keys[position])
+            if df is None:
+                continue
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                continue
+            return position + 1, df, [tuple(entry) for entry in meta.get("quality_entries", [])]
+        return 0, None, []
+    
+    def _save_checkpoint(self, key: str, df: pd.DataFrame, stage_names: List[str], entries: List[Tuple]) -> None:
+        """Write a checkpoint; the metadata file is written last and marks it as complete."""
+        try:
+            write_frame(df, self.checkpoint_dir / key)
+            meta = {
+                "stages": stage_names,
+                "rows": len(df),
+                "created": datetime.now().isoformat(),
+                "quality_entries": [list(entry) for entry in entries]
+            }
+            with open(self.checkpoint_dir / f"{key}.json", 'w') as f:
+                json.dump(meta, f, default=int)
+        except Exception as e:
+            logger.warning(f"Could not write checkpoint after {stage_names}: {str(e)}")
+    
+    def clear_checkpoints(self) -> int:
+        """
+        Remove all checkpoints from the checkpoint directory.
+        
+        Returns:
+            Number of checkpoints removed
+        """
+        if self.checkpoint_dir is None or not self.checkpoint_dir.exists():
+            return 0
+        removed = 0
+        for meta_path in self.checkpoint_dir.glob("*.json"):
+            for suffix in ('.parquet', '.pkl'):
+                meta_path.with_suffix(suffix).unlink(missing_ok=True)
+            meta_path.unlink()
+            removed += 1
+        return removed
+    
+    def _process_chunk(self, chunk: DataChunk) -> DataChunk:
+        """Process a single data chunk through all pipeline stages."""
+        waves = self._execution_waves()
+        
+        if self.checkpoint_dir is None:
+            for wave in waves:
+                self._run_chunk_wave(chunk, [self.stages[index] for index in wave])
+            return chunk
+        
+        # Resume from the deepest checkpoint whose input and stage prefix still match
+        keys = self._checkpoint_keys(chunk.df, waves)
+        completed, restored_df, entries = self._restore_checkpoint(keys)
+        if restored_df is not None:
+            restored_stages = [self.stages[index]["processor"] for wave in waves[:completed] for index in wave]
+            logger.info(f"Resuming from checkpoint after stage '{restored_stages[-1]}'")
+            self.quality_report.replay(entries)
+            chunk.record_operation("restore_checkpoint", {
+                "stages": restored_stages,
+                "rows_before": len(chunk.df),
+                "rows_after": len(restored_df)
+            })
+            chunk.df = restored_df
+        
+        checkpointing = True
+        for position in range(completed, len(waves)):
+            stages = [self.stages[index] for index in waves[position]]
+            with self.quality_report.capture() as wave_entries:
+                succeeded = self._run_chunk_wave(chunk, stages)
+            entries = entries + wave_entries
+            
+            # Output after a failed stage must not be reused as if the stage had run
+            checkpointing = checkpointing and succeeded
+            if checkpointing:
+                self._save_checkpoint(keys[position], chunk.df, [stage["processor"] for stage in stages], entries)
         
         return chunk
     
+    def effective_chunk_size(self, n_rows: int, max_workers: int = 1) -> Optional[int]:
+        """
+        Get the size of the chunks process() splits a DataFrame into.
+        
+        Amendments are consolidated per chunk, so the chunking can change the output.
+        
+        Args:
+            n_rows: Number of rows to process
+            max_workers: Maximum number of worker processes
+            
+        Returns:
+            The chunk size, or None if the rows are processed as a single chunk
+        """
+        if self.engine == "polars" or n_rows <= self.chunk_size or max_workers <= 1:
+            return None
+        return self.chunk_size
+    
     def process(self, df: pd.DataFrame, max_workers: int = 1) -> pd.DataFrame:
         """
-        Process a DataFrame through the entire pipeline.
+        Process a DataFrame through the entire pipeline.
+        
+        Args:
+            df: Input DataFrame to process
+            max_workers: Maximum number of worker processes for parallel processing
+        
+        Returns:
+            Processed DataFrame
+        """
+        if df.empty:
+            logger.warning("Empty DataFrame provided for processing")
+            return df
+        
+        # Reset quality report
+        self.quality_report = DataQualityReport()
+        
+        # Record initial metrics
+        initial_df = df.copy()
+        df = self._ingest(df)
+        
+        if self.engine == "polars":
+            # Polars parallelizes each stage itself, so the frame is not split into chunks
+            from polars_engine import PolarsEngine
+            logger.info(f"Processing {len(df):,} rows with the polars engine")
+            result = PolarsEngine(self).process(df)
+        # For small DataFrames, process as a single chunk
+        elif self.effective_chunk_size(len(df), max_workers) is None:
+            logger.info(f"Processing {len(df):,} rows as a single chunk")
+            result = self._process_chunk(DataChunk(df)).df
+        else:
+            # Split the DataFrame into chunks for parallel processing
+            chunk_count = (len(df) + self.chunk_size - 1) // self.chunk_size
+            logger.info(f"Processing {len(df):,} rows in {chunk_count} chunks with {max_workers} workers")
+            
+            # Place the chunks in shared memory so workers only receive handles
+            handles = []
+            for i in range(0, len(df), self.chunk_size):
+                handles.append(share_frame(df.iloc[i:i+self.chunk_size]))
+            
+            # Process chunks in parallel; each worker receives the pipeline once
+            processed_chunks = []
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_pipeline_worker,
+                                         initargs=(self,)) as executor:
+                    future_to_chunk = {executor.submit(_process_shared_chunk, handle, {"chunk_index": i}): i
+                                       for i, handle in enumerate(handles)}
+                    
+                    with tqdm(total=len(handles), desc="Processing chunks") as pbar:
+                        for future in as_completed(future_to_chunk):
+                            chunk_idx = future_to_chunk[future]
+                            try:
+                                result_handle, metadata, history, quality_state = future.result()
+                                processed_chunk = DataChunk(open_shared_frame(result_handle, release=True), metadata)
+                                processed_chunk.history = history
+                                processed_chunks.append(processed_chunk)
+                                self.quality_report.merge_state(quality_state)
+                            except Exception as e:
+                                logger.error(f"Error processing chunk {chunk_idx}: {str(e)}")
+                            pbar.update(1)
+            finally:
+                for handle in handles:
+                    release_shared_frame(handle)
+            
+            # Sort chunks by their original index to maintain order
+            processed_chunks.sort(key=lambda c: c.metadata.get("chunk_index", 0))
+            
+            # Combine processed chunks
+            result = pd.concat([chunk.df for chunk in processed_chunks], ignore_index=True)
+        
+        # Update quality report with final metrics
+        self.quality_report.update_metrics(initial_df, result)
+        
+        return result
+    
+    def _incremental_split(self) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Split the stages for incremental processing.
+        
+        Returns:
+            Tuple of (number of leading row-local stages, group key of the remaining
+            stages), or None if a remaining stage is neither row-local nor grouped
+            by a single shared key
+        """
+        prefix_count = 0
+        while prefix_count < len(self.stages) and self.registry.is_row_local(self.stages[prefix_count]["processor"]):
+            prefix_count += 1
+        
+        group_keys = set()
+        for stage in self.stages[prefix_count:]:
+            if self.registry.is_row_local(stage["processor"]):
+                continue
+            group_key = self.registry.get_group_key(stage["processor"])
+            if group_key is None:
+                return None
+            group_keys.add(group_key)
+        
+        if len(group_keys) > 1:
+            return None
+        return prefix_count, (group_keys.pop() if group_keys else None)
+    
+    def _load_incremental_state(self, state_dir: Path, raw_columns: List[str]) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Load the rows and output of the previous incremental run.
+        
+        Returns:
+            Tuple of (row-local stage output with row keys, final output), or None if
+            there is no state for this pipeline configuration and input schema
+        """
+        meta_path = state_dir / "state.json"
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+        if meta.get("pipeline_signature") != self.get_signature() or meta.get("raw_columns") != raw_columns:
+            return None
+        
+        rows = read_frame(state_dir / "rows")
+        output = read_frame(state_dir / "output")
+        if rows is None or output is None:
+            return None
+        return rows, output
+    
+    def _save_incremental_state(self, state_dir: Path, raw_columns: List[str],
+                                rows: pd.DataFrame, output: pd.DataFrame) -> None:
+        """Store the state of an incremental run; the metadata file is written last."""
+        try:
+            (state_dir / "state.json").unlink(missing_ok=True)
+            write_frame(rows, state_dir / "rows")
+            write_frame(output, state_dir / "output")
+            meta = {
+                "pipeline_signature": self.get_signature(),
+                "raw_columns": raw_columns,
+                "rows": len(rows),
+                "output_rows": len(output),
+                "created": datetime.now().isoformat()
+            }
+            with open(state_dir / "state.json", 'w') as f:
+                json.dump(meta, f)
+        except Exception as e:
+            logger.warning(f"Could not save incremental state: {str(e)}")
+    
+    def process_deferred(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Process columns that were left out of process() until they are needed.
+        
+        Only the row-local stages that read these columns (or any column) run, so
+        e.g. heavy text columns still get their encoded characters cleaned.
+        
+        Args:
+            df: Deferred columns of processed rows
+            
+        Returns:
+            Processed columns for the same rows
+        """
+        result_df = self._ingest(df)
+        for stage in self.stages:
+            if not self.registry.is_row_local(stage["processor"]):
+                continue
+            reads, _ = self._stage_columns(stage)
+            if reads is not None and not reads.intersection(result_df.columns):
+                continue
+            result_df, _ = self._run_stage(result_df, stage)
+        return result_df
+    
+    def _run_row_local_stages(self, df: pd.DataFrame, prefix_count: int, strict: bool = False,
+                              retained: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Run the leading row-local stages and attach the stable key of each input row.
+        
+        The rows matched by the row probe of a stage are kept in PROBE_COLUMN_PREFIX
+        columns, so that a later run on a subset can tell the stage which columns
+        match in the retained rows as well.
+        
+        Args:
+            df: Raw rows
+            prefix_count: Number of leading row-local stages to run
+            strict: Whether a failing stage raises a ValueError instead of being skipped
+            retained: Previously processed rows that, with df, make up the data
+        """
+        row_keys = _stable_row_keys(df)
+        probed = [index for index in range(prefix_count) if self.registry.get_row_probe(self.stages[index]["processor"])]
+        if not probed:
+            rows = self._run_stage_range(self._ingest(df), 0, prefix_count, strict=strict)
+            probes = {}
+        else:
+            rows, probes = self._ingest(df), {}
+            for index in range(prefix_count):
+                stage = self.stages[index]
+                if index in probed and not self._should_skip_stage(rows, stage):
+                    probe, param = self.registry.get_row_probe(stage["processor"])
+                    hits = probe(rows, **stage["params"])
+                    matched = [col for col in hits.columns if hits[col].any()]
+                    if retained is not None:
+                        prefix = f"{PROBE_COLUMN_PREFIX}{index}:"
+                        matched += [col[len(prefix):] for col in retained.columns
+                                    if col.startswith(prefix) and retained[col].any()]
+                    probes.update({f"{PROBE_COLUMN_PREFIX}{index}:{col}": hits[col].values for col in hits.columns})
+                    stage = {"processor": stage["processor"],
+                             "params": {**stage["params"], param: sorted(set(matched))}}
+                chunk = DataChunk(rows)
+                if not self._run_chunk_wave(chunk, [stage]) and strict:
+                    raise ValueError(f"Stage '{stage['processor']}' failed")
+                rows = chunk.df
+        if len(rows) != len(df):
+            raise ValueError("A row-local stage changed the number of rows")
+        rows = rows.copy()
+        for col, values in probes.items():
+            rows[col] = values
+        rows["_row_key"] = row_keys.values
+        return rows
+    
+    @staticmethod
+    def _drop_state_columns(rows: pd.DataFrame) -> pd.DataFrame:
+        """Drop the row keys and probe results from rows of the incremental state."""
+        return rows.drop(columns=[col for col in rows.columns
+                                  if col == "_row_key" or str(col).startswith(PROBE_COLUMN_PREFIX)])
+    
+    def process_incremental(self, df: pd.DataFrame, state_dir: Union[str, Path], max_workers: int = 1,
+                            verify: bool = False) -> pd.DataFrame:
+        """
+        Process a raw snapshot by only processing the rows that changed since the last run.
+        
+        Rows are matched to the previous snapshot by a stable hash of their values. The
+        leading row-local stages only run on new or changed rows, the remaining stages
+        only run on the groups (e.g. ref_number) that gained or lost a row, and their
+        output replaces those groups in the previous output. Without usable state from
+        a previous run with the same pipeline, or when a stage fails on the changed
+        rows, the whole snapshot is processed.
+        
+        The output rows that were replaced and their replacements are kept in
+        last_delta, so aggregates of the previous output can be updated instead of
+        recomputed.
+        
+        Args:
+            df: Raw snapshot to process
+            state_dir: Directory holding the state of the previous run
+            max_workers: Maximum number of worker processes when the whole snapshot is processed
+            verify: Whether to check the output of an incremental update against processing
+                the whole snapshot, and use the latter if they differ
+        
+        Returns:
+            Processed DataFrame
+        """
+        self.last_delta = None
+        if df.empty:
+            logger.warning("Empty DataFrame provided for processing")
+            return df
+        
+        split = self._incremental_split()
+        if split is None:
+            logger.warning("Pipeline has stages that cannot run incrementally; processing all rows")
+            return self.process(df, max_workers=max_workers)
+        prefix_count, group_key = split
+        
+        state_dir = Path(state_dir)
+        raw_columns = sorted(str(col) for col in df.columns)
+        state = self._load_incremental_state(state_dir, raw_columns)
+        
+        self.quality_report = DataQualityReport()
+        
+        if state is None:
+            logger.info(f"No previous incremental state; processing all {len(df):,} rows")
+            rows = self._run_row_local_stages(df, prefix_count)
+            result = self._run_stage_range(self._drop_state_columns(rows), prefix_count, len(self.stages))
+            self._save_incremental_state(state_dir, raw_columns, rows, result)
+            self.quality_report.update_metrics(df, result)
+            return result
+        
+        previous_rows, previous_output = state
+        if group_key is not None and (group_key not in previous_rows.columns or
+                                      group_key not in previous_output.columns):
+            logger.warning(f"Group column '{group_key}' missing from the previous state; processing all rows")
+            state_dir.joinpath("state.json").unlink(missing_ok=True)
+            return self.process_incremental(df, state_dir, max_workers)
+        
+        try:
+            result = self._apply_incremental_update(df, state_dir, raw_columns, state, prefix_count, group_key)
+        except ValueError as e:
+            # A stage that fails on a subset would leave the changed rows unprocessed
+            logger.warning(f"Incremental update failed ({str(e)}); processing all rows")
+            state_dir.joinpath("state.json").unlink(missing_ok=True)
+            return self.process_incremental(df, state_dir, max_workers)
+        
+        if verify and self.last_delta is not None:
+            report, delta = self.quality_report, self.last_delta
+            full = self.process(df, max_workers=max_workers)
+            self.quality_report, self.last_delta = report, delta
+            if not _same_rows(result, full):
+                logger.warning("Incremental output differs from processing all rows; rebuilding the state")
+                state_dir.joinpath("state.json").unlink(missing_ok=True)
+                return self.process_incremental(df, state_dir, max_workers)
+            logger.info("Incremental output matches processing all rows")
+        return result
+    
+    def _apply_incremental_update(self, df: pd.DataFrame, state_dir: Path, raw_columns: List[str],
+                                  state: Tuple[pd.DataFrame, pd.DataFrame], prefix_count: int,
+                                  group_key: Optional[str]) -> pd.DataFrame:
+        """Process the rows of a snapshot that changed since the previous run, failing on any stage error."""
+        previous_rows, previous_output = state
+        
+        # Diff the snapshot against the rows of the previous run
+        row_keys = _stable_row_keys(df)
+        new_mask = ~row_keys.isin(previous_rows["_row_key"]).values
+        removed_mask = ~previous_rows["_row_key"].isin(row_keys).values
+        new_count, removed_count = int(new_mask.sum()), int(removed_mask.sum())
+        logger.info(f"Incremental update: {new_count:,} new or changed rows, {removed_count:,} removed rows")
+        
+        retained_rows = previous_rows[~removed_mask]
+        new_rows = (self._run_row_local_stages(df[new_mask], prefix_count, strict=True, retained=retained_rows)
+                    if new_count else previous_rows.iloc[0:0])
+        rows = pd.concat([retained_rows, new_rows], ignore_index=True)
+        probe_columns = [col for col in rows.columns if str(col).startswith(PROBE_COLUMN_PREFIX)]
+        rows[probe_columns] = rows[probe_columns].eq(True)
+        
+        # A stage treating another set of columns as matched would change the retained rows too
+        matched = {col for col in probe_columns if rows[col].any()}
+        previously_matched = {col for col in previous_rows.columns
+                              if str(col).startswith(PROBE_COLUMN_PREFIX) and previous_rows[col].any()}
+        if matched != previously_matched:
+            raise ValueError("The columns matched by a row probe changed")
+        
+        # Only the groups that gained or lost a row need the remaining stages again
+        if group_key is None:
+            # Every stage is row-local
+            affected_count = new_count + removed_count
+            result = self._drop_state_columns(rows)
+            retracted = previous_output[removed_mask]
+            inserted = self._drop_state_columns(new_rows)
+        else:
+            affected = pd.concat([new_rows[group_key], previous_rows.loc[removed_mask, group_key]]).unique()
+            affected_count = len(affected)
+            logger.info(f"Re-running {len(self.stages) - prefix_count} stage(s) on {affected_count:,} affected '{group_key}' groups")
+            replaced = previous_output[group_key].isin(affected)
+            retained = previous_output[~replaced]
+            if affected_count:
+                group_rows = self._drop_state_columns(rows[rows[group_key].isin(affected)])
+                recomputed = self._run_stage_range(group_rows, prefix_count, len(self.stages), strict=True)
+                result = pd.concat([retained, recomputed], ignore_index=True)
+            else:
+                recomputed = previous_output.iloc[0:0]
+                result = retained.reset_index(drop=True)
+            retracted, inserted = previous_output[replaced], recomputed
+        
+        if new_count or removed_count:
+            self._save_incremental_state(state_dir, raw_columns, rows, result)
+        self.last_delta = (retracted, inserted)
+        
+        self.quality_report.update_metrics(df, result)
+        self.quality_report.metrics["incremental"] = {
+            "new_rows": new_count,
+            "removed_rows": removed_count,
+            "affected_groups": affected_count
+        }
+        return result
+    
+    @contextmanager
+    def _separate_report(self):
+        """Record into a fresh quality report whose counts are then added to the current one."""
+        report = self.quality_report
+        self.quality_report = DataQualityReport()
+        try:
+            yield
+        finally:
+            state = self.quality_report.export_state()
+            self.quality_report = report
+            report.merge_state(state)
+    
+    def process_stream(self, input_path: Union[str, Path], output_path: Union[str, Path],
+                       batch_size: Optional[int] = None, partitions: int = 16,
+                       spill_dir: Optional[Union[str, Path]] = None,
+                       row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+                       amendment_engine: str = "partition") -> int:
+        """
+        Process a CSV file into a CSV file with bounded memory.
         
-        Args:
-            df: Input DataFrame to process
-            max_workers: Maximum number of worker processes for parallel processing
+        The input is read in batches that go through the leading row-local stages
+        and are spilled to disk, partitioned by the group key of the remaining stages
+        (ref_number for amendment consolidation). Each partition is then processed
+        on its own and appended to the output, so peak memory depends on the batch
+        and partition sizes rather than on the size of the file.
         
+        Args:
+            input_path: CSV file to read
+            output_path: CSV file to write
+            batch_size: Number of rows read per batch (defaults to the chunk size)
+            partitions: Number of spill partitions
+            spill_dir: Directory for the spill area (defaults to the system temp directory)
+            row_filter: Optional function applied to each output partition before writing
+            amendment_engine: 'partition' to consolidate amendments one spill partition
+                at a time in memory, 'external' to external-sort all rows by grant
+                so no partition has to fit in memory, or 'duckdb' to spill the rows to
+                Parquet and consolidate them with a SQL query in DuckDB
+            
         Returns:
-            Processed DataFrame
+            Number of rows written
         """
-        if df.empty:
-            logger.warning("Empty DataFrame provided for processing")
-            return df
+        if amendment_engine not in ("partition", "external", "duckdb"):
+            raise ValueError(f"Unknown amendment engine '{amendment_engine}'")
+        if amendment_engine == "duckdb":
+            try:
+                from duckdb_engine import DuckDBEngine
+            except ImportError:
+                raise ImportError("The duckdb amendment engine requires duckdb. Install it with: pip install duckdb")
+        batch_size = batch_size or self.chunk_size
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Reset quality report
         self.quality_report = DataQualityReport()
         
-        # Record initial metrics
-        initial_df = df.copy()
+        split = self._incremental_split()
+        if split is None:
+            logger.warning("Pipeline has stages that need all rows at once; processing the file in memory")
+            result = self.process(pd.read_csv(input_path, low_memory=False))
+            if row_filter is not None:
+                result = row_filter(result)
+            result.to_csv(output_path, index=False)
+            return len(result)
+        prefix_count, group_key = split
+        
+        # The external and duckdb engines replace a final process_amendments stage
+        if amendment_engine != "partition" and \
+                [stage["processor"] for stage in self.stages[prefix_count:]] != ["process_amendments"]:
+            logger.warning(f"The {amendment_engine} amendment engine needs process_amendments as the only "
+                           "non-row-local stage; using partitions instead")
+            amendment_engine = "partition"
+        
+        if spill_dir is not None:
+            Path(spill_dir).mkdir(parents=True, exist_ok=True)
+        spill_root = Path(tempfile.mkdtemp(prefix="preprocess_spill_", dir=spill_dir))
+        consolidator = None
+        if amendment_engine == "external":
+            consolidator = ExternalAmendmentConsolidator(spill_root, block_size=batch_size)
+        row_files = []
+        
+        rows_read = rows_local = rows_written = 0
+        input_columns = output_columns = None
+        
+        def write_output(frame: pd.DataFrame) -> None:
+            nonlocal rows_written, output_columns
+            if row_filter is not None:
+                frame = row_filter(frame)
+            if output_columns is None:
+                output_columns = list(frame.columns)
+                frame.to_csv(output_path, index=False)
+            else:
+                frame.reindex(columns=output_columns).to_csv(output_path, mode='a', header=False, index=False)
+            rows_written += len(frame)
         
-        # For small DataFrames, process as a single chunk
-        if len(df) <= self.chunk_size or max_workers <= 1:
-            logger.info(f"Processing {len(df):,} rows as a single chunk")
-            result = self._process_chunk(DataChunk(df)).df
-        else:
-            # Split the DataFrame into chunks for parallel processing
-            chunk_count = (len(df) + self.chunk_size - 1) // self.chunk_size
-            logger.info(f"Processing {len(df):,} rows in {chunk_count} chunks with {max_workers} workers")
-            
-            # Create chunks
-            chunks = []
-            for i in range(0, len(df), self.chunk_size):
-                chunk_df = df.iloc[i:i+self.chunk_size].copy()
-                chunks.append(DataChunk(chunk_df, {"chunk_index": i // self.chunk_size}))
-            
-            # Process chunks in parallel
-            processed_chunks = []
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                future_to_chunk = {executor.submit(self._process_chunk, chunk): i for i, chunk in enumerate(chunks)}
+        try:
+            # Pass 1: row-local stages on each batch, spilled by partition of the group key
+            for batch_index, batch in enumerate(pd.read_csv(input_path, chunksize=batch_size, low_memory=False)):
+                rows_read += len(batch)
+                input_columns = input_columns or len(batch.columns)
+                with self._separate_report():
+                    rows = self._run_stage_range(self._ingest(batch), 0, prefix_count)
                 
-                with tqdm(total=len(chunks), desc="Processing chunks") as pbar:
-                    for future in as_completed(future_to_chunk):
-                        chunk_idx = future_to_chunk[future]
-                        try:
-                            processed_chunk = future.result()
-                            processed_chunks.append(processed_chunk)
-                        except Exception as e:
-                            logger.error(f"Error processing chunk {chunk_idx}: {str(e)}")
-                        pbar.update(1)
-            
-            # Sort chunks by their original index to maintain order
-            processed_chunks.sort(key=lambda c: c.metadata.get("chunk_index", 0))
-            
-            # Combine processed chunks
-            result = pd.concat([chunk.df for chunk in processed_chunks], ignore_index=True)
-        
-        # Update quality report with final metrics
-        self.quality_report.update_metrics(initial_df, result)
-        
-        return result
+                if group_key is None:
+                    write_output(rows)
+                    continue
+                if consolidator is not None:
+                    consolidator.add_batch(rows)
+                    logger.info(f"Sorted batch {batch_index + 1} ({rows_read:,} rows read)")
+                    continue
+                if amendment_engine == "duckdb":
+                    # Number the rows so DuckDB breaks ties in file order, like the other engines
+                    rows = rows.assign(_amend_seq=np.arange(rows_local, rows_local + len(rows)))
+                    row_files.append(spill_root / f"rows_{batch_index:06d}.parquet")
+                    rows.to_parquet(row_files[-1], index=False)
+                    rows_local += len(rows)
+                    logger.info(f"Spilled batch {batch_index + 1} ({rows_read:,} rows read)")
+                    continue
+                if group_key not in rows.columns:
+                    raise ValueError(f"Group column '{group_key}' not found after the row-local stages")
+                
+                partition_ids = pd.util.hash_array(rows[group_key].astype(str).values) % partitions
+                for partition in range(partitions):
+                    part = rows[partition_ids == partition]
+                    if not part.empty:
+                        write_frame(part, spill_root / f"part_{partition:04d}" / f"batch_{batch_index:06d}")
+                logger.info(f"Spilled batch {batch_index + 1} ({rows_read:,} rows read)")
+            
+            # Pass 2: merge the sorted runs into one row per grant
+            if consolidator is not None:
+                snapshot = _usage_snapshot()
+                for block in consolidator.consolidate():
+                    write_output(block)
+                rows_reduced = consolidator.rows_in - consolidator.rows_out
+                self.quality_report.record_fix("inconsistencies_resolved", "amendments", rows_reduced)
+                metrics = _usage_since(snapshot)
+                metrics.update({"rows_in": consolidator.rows_in, "rows_out": consolidator.rows_out,
+                                "fixes": rows_reduced})
+                self.quality_report.record_stage("process_amendments", metrics)
+                logger.info(f"Consolidated {consolidator.rows_in:,} rows from {len(consolidator.runs)} "
+                            f"sorted runs into {consolidator.rows_out:,} rows")
+            
+            # Pass 2: one SQL query over all spilled rows
+            elif amendment_engine == "duckdb":
+                snapshot = _usage_snapshot()
+                grants = 0
+                with DuckDBEngine(temp_dir=spill_root / "duckdb") as engine:
+                    for block in engine.iter_consolidated_amendments(row_files, batch_size):
+                        grants += len(block)
+                        write_output(block)
+                rows_reduced = rows_local - grants
+                self.quality_report.record_fix("inconsistencies_resolved", "amendments", rows_reduced)
+                metrics = _usage_since(snapshot)
+                metrics.update({"rows_in": rows_local, "rows_out": grants, "fixes": rows_reduced})
+                self.quality_report.record_stage("process_amendments", metrics)
+                logger.info(f"Consolidated {rows_local:,} rows into {grants:,} rows with DuckDB")
+            
+            # Pass 2: the remaining stages on each partition, which holds complete groups
+            elif group_key is not None:
+                for partition in range(partitions):
+                    partition_dir = spill_root / f"part_{partition:04d}"
+                    if not partition_dir.exists():
+                        continue
+                    frames = [read_frame(path.with_suffix('')) for path in sorted(partition_dir.iterdir())]
+                    part = pd.concat(frames, ignore_index=True)
+                    del frames
+                    with self._separate_report():
+                        result = self._run_stage_range(part, prefix_count, len(self.stages))
+                    write_output(result)
+                    shutil.rmtree(partition_dir, ignore_errors=True)
+                    logger.info(f"Processed partition {partition + 1}/{partitions} ({rows_written:,} rows written)")
+        finally:
+            shutil.rmtree(spill_root, ignore_errors=True)
+        
+        self.quality_report.metrics.update({
+            "initial_row_count": rows_read,
+            "final_row_count": rows_written,
+            "initial_column_count": input_columns or 0,
+            "final_column_count": len(output_columns or []),
+            "processing_time": time.time() - self.quality_report.start_time
+        })
+        return rows_written
     
     def configure_standard_pipeline(self) -> 'ProcessingPipeline':
         """Configure the pipeline with a standard set of processors."""
@@ -383,14 +2073,23 @@ class ProcessingPipeline:
             .add_stage("map_organization_codes")
             .add_stage("clean_research_organization_names")
             .add_stage("standardize_city_names")
+            .add_stage("normalize_date_fields")
             .add_stage("extract_year_from_date")
             .add_stage("fix_research_organizations")
             .add_stage("clean_encoded_characters")
             .add_stage("ensure_numeric_values")
-            .add_stage("normalize_date_fields")
             .add_stage("process_amendments")
         )
     
+    def get_signature(self) -> str:
+        """Hash the configured stages with their parameters and code versions."""
+        stages = [[stage["processor"], stage["params"], self.registry.get_version(stage["processor"])]
+                  for stage in self.stages]
+        if self.engine != "pandas":
+            stages.append(["engine", self.engine, _module_version(f"{self.engine}_engine")])
+        payload = json.dumps(stages, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
     def get_quality_report(self) -> Dict:
         """Get the data quality report."""
         return self.quality_report.get_report()
@@ -471,17 +2170,12 @@ class ProcessingPipeline:
         if error_count > 0:
             self.quality_report.record_issue("invalid_formats", col, error_count)
         
-        # Use vectorized operations for better performance
-        # Replace delimiters with spaces on both sides
-        result_df.loc[mask, col] = result_df.loc[mask, col].str.replace(
-            r'\s*([|/\\])\s*', r' \1 ', regex=True)
-        
-        # Clean up double spaces
-        result_df.loc[mask, col] = result_df.loc[mask, col].str.replace(
-            r'\s{2,}', ' ', regex=True)
-        
-        # Trim whitespace
-        result_df.loc[mask, col] = result_df.loc[mask, col].str.strip()
+        # Replace delimiters with spaces on both sides, clean up double spaces and trim.
+        # Missing values pass through, so the whole column goes through each kernel at once
+        result_df[col] = (result_df[col]
+            .str.replace(WHITESPACE + r'*([|/\\])' + WHITESPACE + '*', r' \1 ', regex=True)
+            .str.replace(WHITESPACE + '{2,}', ' ', regex=True)
+            .str.strip())
         
         # Record the fix
         self.quality_report.record_fix("formats_corrected", col, error_count)
@@ -544,11 +2238,14 @@ class ProcessingPipeline:
         # Make a copy to avoid modifying the input
         result_df = df.copy()
         
-        # Use vectorized regex extraction
-        result_df['year'] = result_df[col].str.extract(r'^(\d{4})')
+        # Take the year from the parsed dates, parsing them first if they are still strings
+        dates = result_df[col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates, _ = parse_dates(dates)
         
-        # Convert to numeric for easier analysis
-        result_df['year'] = pd.to_numeric(result_df['year'], errors='coerce')
+        # Keep whole years as integers unless some are missing
+        year = dates.dt.year
+        result_df['year'] = year.astype('float64') if year.hasnans else year.astype('int64')
         
         # Record issues and fixes
         missing_years = result_df['year'].isna().sum()
@@ -585,7 +2282,7 @@ class ProcessingPipeline:
         # Check if any of the keywords are in the name
         return any(keyword in name_lower for keyword in institution_keywords)
     
-    def _fix_research_organizations(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _fix_research_organizations(self, df: pd.DataFrame, fill_missing: bool = True) -> pd.DataFrame:
         """
         Fix recipient and research organization names by:
         1. Parsing patterns like "text (text)" to separate recipient and org names
@@ -595,6 +2292,7 @@ class ProcessingPipeline:
         5. Handling complex nested parentheses situations
         6. Removing trailing parentheses information and unbalanced brackets
         7. Filling in missing research organization names using recipient names
+           (skipped when fill_missing is False)
         """
         # Define the column names
         recipient_col = 'recipient_legal_name'
@@ -666,7 +2364,7 @@ class ProcessingPipeline:
         
         # Find rows matching the pattern in recipient name
         if recipient_col in result_df.columns:
-            mask_parentheses = result_df[recipient_col].str.contains(contains_parentheses_pattern, regex=True, na=False)
+            mask_parentheses = result_df[recipient_col].str.contains(contains_parentheses_pattern, regex=True, na=False).astype(bool)
             
             if mask_parentheses.any():
                 # Extract both parts
@@ -675,66 +2373,66 @@ class ProcessingPipeline:
                 # Store both parts temporarily
                 result_df.loc[mask_parentheses, 'text_before_paren'] = extracted[0].str.strip()
                 result_df.loc[mask_parentheses, 'text_inside_paren'] = extracted[1].str.strip()
-            
-            # Check for name indicators (comma) and organization indicators
-            has_comma_before = result_df.loc[mask_parentheses, 'text_before_paren'].str.contains(',', regex=False)
-            has_comma_inside = result_df.loc[mask_parentheses, 'text_inside_paren'].str.contains(',', regex=False)
-            
-            # Keywords that suggest an institution (lowercase for case-insensitive matching)
-            org_keywords = ['university', 'université', 'univ', 'college', 'collège', 'institute', 
-                    'institut', 'school', 'école', 'center', 'centre', 'hospital', 'hôpital']
-            
-            # Check for org keywords
-            has_org_kw_before = result_df.loc[mask_parentheses, 'text_before_paren'].str.lower().apply(
-                lambda x: any(kw in x.lower() for kw in org_keywords))
-            has_org_kw_inside = result_df.loc[mask_parentheses, 'text_inside_paren'].str.lower().apply(
-                lambda x: any(kw in x.lower() for kw in org_keywords))
-            
-            # Determine which part is name and which is org
-            
-            # Case 1: Clear indicators in both parts - one has comma (name), other has org keywords
-            name_in_before_mask = has_comma_before & has_org_kw_inside & ~has_comma_inside
-            name_in_inside_mask = has_comma_inside & has_org_kw_before & ~has_comma_before
-            
-            # Case 2: Only one part has comma - assume it's a name
-            name_likely_before_mask = has_comma_before & ~has_comma_inside & ~name_in_inside_mask & ~name_in_before_mask
-            name_likely_inside_mask = has_comma_inside & ~has_comma_before & ~name_in_inside_mask & ~name_in_before_mask
-            
-            # Case 3: Only one part has org keywords - assume it's an organization
-            org_likely_before_mask = has_org_kw_before & ~has_org_kw_inside & ~name_in_inside_mask & ~name_in_before_mask & ~name_likely_before_mask & ~name_likely_inside_mask
-            org_likely_inside_mask = has_org_kw_inside & ~has_org_kw_before & ~name_in_inside_mask & ~name_in_before_mask & ~name_likely_before_mask & ~name_likely_inside_mask
-            
-            # Default case: Just use before as name and inside as org (original behavior)
-            default_mask = ~(name_in_before_mask | name_in_inside_mask | name_likely_before_mask | 
-                    name_likely_inside_mask | org_likely_before_mask | org_likely_inside_mask)
-            
-            # Apply the appropriate assignment based on determined cases
-            
-            # Case 1 & 2: Name is in the before part, org is inside
-            recipient_is_before_mask = name_in_before_mask | name_likely_before_mask | org_likely_inside_mask | default_mask
-            if recipient_is_before_mask.any():
-                result_df.loc[mask_parentheses & recipient_is_before_mask, 'temp_recipient'] = result_df.loc[mask_parentheses & recipient_is_before_mask, 'text_before_paren']
-                result_df.loc[mask_parentheses & recipient_is_before_mask, 'temp_org'] = result_df.loc[mask_parentheses & recipient_is_before_mask, 'text_inside_paren']
-            
-            # Case 1 & 2 inverted: Name is inside, org is before
-            recipient_is_inside_mask = name_in_inside_mask | name_likely_inside_mask | org_likely_before_mask
-            if recipient_is_inside_mask.any():
-                result_df.loc[mask_parentheses & recipient_is_inside_mask, 'temp_recipient'] = result_df.loc[mask_parentheses & recipient_is_inside_mask, 'text_inside_paren']
-                result_df.loc[mask_parentheses & recipient_is_inside_mask, 'temp_org'] = result_df.loc[mask_parentheses & recipient_is_inside_mask, 'text_before_paren']
-            
-            # Only update research org if it's missing
-            update_mask = mask_parentheses & result_df[research_org_col].isna()
-            if update_mask.any():
-                result_df.loc[update_mask, research_org_col] = result_df.loc[update_mask, 'temp_org']
-            
-            # Update recipient names
-            result_df.loc[mask_parentheses, recipient_col] = result_df.loc[mask_parentheses, 'temp_recipient']
-            
-            # Drop temporary columns
-            result_df = result_df.drop(['text_before_paren', 'text_inside_paren'], axis=1)
-            
-            pattern_fixes['recipient_parentheses'] = mask_parentheses.sum()
-            logger.info(f"Fixed {mask_parentheses.sum():,} recipient names with parentheses pattern")
+                
+                # Check for name indicators (comma) and organization indicators
+                has_comma_before = result_df.loc[mask_parentheses, 'text_before_paren'].str.contains(',', regex=False, na=False).astype(bool)
+                has_comma_inside = result_df.loc[mask_parentheses, 'text_inside_paren'].str.contains(',', regex=False, na=False).astype(bool)
+                
+                # Keywords that suggest an institution (lowercase for case-insensitive matching)
+                org_keywords = ['university', 'université', 'univ', 'college', 'collège', 'institute', 
+                        'institut', 'school', 'école', 'center', 'centre', 'hospital', 'hôpital']
+                
+                # Check for org keywords
+                has_org_kw_before = result_df.loc[mask_parentheses, 'text_before_paren'].str.lower().apply(
+                    lambda x: any(kw in x.lower() for kw in org_keywords)).astype(bool)
+                has_org_kw_inside = result_df.loc[mask_parentheses, 'text_inside_paren'].str.lower().apply(
+                    lambda x: any(kw in x.lower() for kw in org_keywords)).astype(bool)
+                
+                # Determine which part is name and which is org
+                
+                # Case 1: Clear indicators in both parts - one has comma (name), other has org keywords
+                name_in_before_mask = has_comma_before & has_org_kw_inside & ~has_comma_inside
+                name_in_inside_mask = has_comma_inside & has_org_kw_before & ~has_comma_before
+                
+                # Case 2: Only one part has comma - assume it's a name
+                name_likely_before_mask = has_comma_before & ~has_comma_inside & ~name_in_inside_mask & ~name_in_before_mask
+                name_likely_inside_mask = has_comma_inside & ~has_comma_before & ~name_in_inside_mask & ~name_in_before_mask
+                
+                # Case 3: Only one part has org keywords - assume it's an organization
+                org_likely_before_mask = has_org_kw_before & ~has_org_kw_inside & ~name_in_inside_mask & ~name_in_before_mask & ~name_likely_before_mask & ~name_likely_inside_mask
+                org_likely_inside_mask = has_org_kw_inside & ~has_org_kw_before & ~name_in_inside_mask & ~name_in_before_mask & ~name_likely_before_mask & ~name_likely_inside_mask
+                
+                # Default case: Just use before as name and inside as org (original behavior)
+                default_mask = ~(name_in_before_mask | name_in_inside_mask | name_likely_before_mask | 
+                        name_likely_inside_mask | org_likely_before_mask | org_likely_inside_mask)
+                
+                # Apply the appropriate assignment based on determined cases
+                
+                # Case 1 & 2: Name is in the before part, org is inside
+                recipient_is_before_mask = name_in_before_mask | name_likely_before_mask | org_likely_inside_mask | default_mask
+                if recipient_is_before_mask.any():
+                    result_df.loc[mask_parentheses & recipient_is_before_mask, 'temp_recipient'] = result_df.loc[mask_parentheses & recipient_is_before_mask, 'text_before_paren']
+                    result_df.loc[mask_parentheses & recipient_is_before_mask, 'temp_org'] = result_df.loc[mask_parentheses & recipient_is_before_mask, 'text_inside_paren']
+                
+                # Case 1 & 2 inverted: Name is inside, org is before
+                recipient_is_inside_mask = name_in_inside_mask | name_likely_inside_mask | org_likely_before_mask
+                if recipient_is_inside_mask.any():
+                    result_df.loc[mask_parentheses & recipient_is_inside_mask, 'temp_recipient'] = result_df.loc[mask_parentheses & recipient_is_inside_mask, 'text_inside_paren']
+                    result_df.loc[mask_parentheses & recipient_is_inside_mask, 'temp_org'] = result_df.loc[mask_parentheses & recipient_is_inside_mask, 'text_before_paren']
+                
+                # Only update research org if it's missing
+                update_mask = mask_parentheses & result_df[research_org_col].isna()
+                if update_mask.any():
+                    result_df.loc[update_mask, research_org_col] = result_df.loc[update_mask, 'temp_org']
+                
+                # Update recipient names
+                result_df.loc[mask_parentheses, recipient_col] = result_df.loc[mask_parentheses, 'temp_recipient']
+                
+                # Drop temporary columns
+                result_df = result_df.drop(['text_before_paren', 'text_inside_paren'], axis=1)
+                
+                pattern_fixes['recipient_parentheses'] = mask_parentheses.sum()
+                logger.info(f"Fixed {mask_parentheses.sum():,} recipient names with parentheses pattern")
         
         # STEP 3: Clean recipient names and research org names with pattern "text | text" - extract English version
         contains_pipe_pattern = r'^.*?\s*\|\s*.*?$'
@@ -875,7 +2573,7 @@ class ProcessingPipeline:
         
         # STEP 9: Now handle the case where research organization is still missing
         # Count missing research organization names
-        if research_org_col in result_df.columns and recipient_col in result_df.columns:
+        if fill_missing and research_org_col in result_df.columns and recipient_col in result_df.columns:
             missing_before = result_df[research_org_col].isna().sum()
             
             if missing_before > 0:
@@ -934,117 +2632,122 @@ class ProcessingPipeline:
         
         # Default numeric columns to check if none provided
         if numeric_columns is None:
-            numeric_columns = [
-                'agreement_value', 
-                'foreign_currency_value',
-                'amendment_number'
-            ]
+            numeric_columns = NUMERIC_COLUMNS
         
         # Filter to columns that actually exist in the DataFrame
         existing_columns = [col for col in numeric_columns if col in result_df.columns]
         
         for col in existing_columns:
-            # Count non-numeric values before conversion
-            if result_df[col].dtype == 'object':
-                # Use a regex to identify values that aren't numeric
-                non_numeric_mask = ~result_df[col].astype(str).str.match(r'^-?\d+(\.\d+)?$', na=False)
-                non_numeric_count = non_numeric_mask.sum()
+            if is_text_column(result_df[col]):
+                # Parse the formatted numbers in one pass; values that were not plain
+                # numbers (missing ones included) count as invalid formats
+                numbers, invalid_format = parse_numbers(result_df[col])
+                non_numeric_count = invalid_format.sum()
                 
                 if non_numeric_count > 0:
                     self.quality_report.record_issue("invalid_formats", col, non_numeric_count)
+                    self.quality_report.record_fix("formats_corrected", col, non_numeric_count)
                 
-                # Clean the column by removing non-numeric characters except decimal points and negative signs
-                result_df[col] = result_df[col].astype(str).str.replace(r'[^0-9.-]', '', regex=True)
-            
-            # Convert to numeric and fill NaN with 0
-            result_df[col] = pd.to_numeric(result_df[col], errors='coerce').fillna(0)
-            
-            # Record the fix
-            if 'non_numeric_count' in locals() and non_numeric_count > 0:
-                self.quality_report.record_fix("formats_corrected", col, non_numeric_count)
+                # Like pd.to_numeric, a column without missing or fractional values stays integer;
+                # otherwise missing and unparseable values become 0
+                if not numbers.hasnans and (numbers % 1 == 0).all():
+                    result_df[col] = numbers.astype('int64')
+                else:
+                    result_df[col] = numbers.fillna(0)
+            else:
+                # Convert to numeric and fill NaN with 0
+                result_df[col] = pd.to_numeric(result_df[col], errors='coerce').fillna(0)
         
         return result_df
     
     def _normalize_date_fields(self, df: pd.DataFrame, date_columns: List[str] = None) -> pd.DataFrame:
-        """Normalize date fields to consistent format."""
+        """Parse date fields into datetime64 values at midnight."""
         # Make a copy to avoid modifying the input
         result_df = df.copy()
         
         # Default date columns if none provided
         if date_columns is None:
-            date_columns = [
-                'agreement_start_date', 
-                'agreement_end_date',
-                'amendment_date'
-            ]
+            date_columns = DATE_COLUMNS
         
         # Filter to columns that actually exist in the DataFrame
         existing_columns = [col for col in date_columns if col in result_df.columns]
         
         for col in existing_columns:
-            # Count invalid dates before normalization
-            if result_df[col].dtype == 'object':
-                # Use pd.to_datetime with coerce to identify invalid dates
-                temp_dates = pd.to_datetime(result_df[col], errors='coerce')
-                invalid_count = temp_dates.isna().sum() - result_df[col].isna().sum()
+            values = result_df[col]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                # Already dates; only the time of day is dropped
+                result_df[col] = values.dt.normalize()
+            elif is_text_column(values):
+                # Parse each distinct value once, counting the invalid dates in the same pass
+                result_df[col], invalid_count = parse_dates(values)
                 
                 if invalid_count > 0:
                     self.quality_report.record_issue("invalid_formats", col, invalid_count)
-            
-            # Convert to pandas datetime, handling different formats
-            result_df[col] = pd.to_datetime(result_df[col], errors='coerce')
-            
-            # Convert back to string in ISO format (YYYY-MM-DD)
-            result_df[col] = result_df[col].dt.strftime('%Y-%m-%d')
-            
-            # Record the fix
-            if 'invalid_count' in locals() and invalid_count > 0:
-                self.quality_report.record_fix("formats_corrected", col, invalid_count)
+                    self.quality_report.record_fix("formats_corrected", col, invalid_count)
+            else:
+                result_df[col] = pd.to_datetime(values, errors='coerce').dt.normalize()
         
         return result_df
 
-    def _clean_encoded_characters(self, df: pd.DataFrame, columns_to_clean: List[str] = None) -> pd.DataFrame:
-        """Clean encoded characters like _x000D_ and _x000B_ in text fields."""
-        # Make a copy to avoid modifying the input
-        result_df = df.copy()
-        
-        # If no specific columns are provided, check all object (string) columns
+    @staticmethod
+    def _encoded_character_rows(df: pd.DataFrame, columns_to_clean: List[str] = None,
+                                **params) -> pd.DataFrame:
+        """Find the rows of each text column to clean that contain an encoded character."""
         if columns_to_clean is None:
-            columns_to_clean = result_df.select_dtypes(include=['object']).columns.tolist()
-        else:
-            # Filter to only include columns that actually exist in the DataFrame
-            columns_to_clean = [col for col in columns_to_clean if col in result_df.columns]
+            columns_to_clean = df.columns
+        return pd.DataFrame({
+            col: df[col].str.contains(r'_x000[DB]_', regex=True, na=False).astype(bool)
+            for col in columns_to_clean
+            # Columns without any string (e.g. all missing) cannot hold an encoded character
+            if col in df.columns and is_text_column(df[col]) and df[col].notna().any()
+        }, index=df.index)
+    
+    def _clean_encoded_characters(self, df: pd.DataFrame, columns_to_clean: List[str] = None,
+                                  encoded_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Clean encoded characters like _x000D_ and _x000B_ in text fields.
         
-        for col in columns_to_clean:
-            # Skip non-object columns
-            if result_df[col].dtype != 'object':
-                continue
-                
-            # Create mask for non-null values
-            mask = result_df[col].notna()
-            
-            if mask.sum() == 0:
+        Each column is probed with one combined search, and only the rows that
+        contain an encoded character are cleaned, in a single regex pass.
+        
+        Args:
+            df: DataFrame to clean
+            columns_to_clean: Columns to clean (all text columns if None)
+            encoded_columns: Columns that hold encoded characters elsewhere in the data,
+                when df is a subset of it; their whitespace runs are collapsed as well
+        """
+        # Columns are replaced rather than modified in place, so a shallow copy is enough
+        result_df = df.copy(deep=False)
+        
+        # Probe for either encoded character; most columns have none and are skipped
+        hit_rows = self._encoded_character_rows(result_df, columns_to_clean)
+        
+        for col in hit_rows.columns:
+            values = result_df[col]
+            hits = hit_rows[col]
+            if not hits.any() and col not in (encoded_columns or ()):
                 continue
-                
-            # Count occurrences of _x000D_ before cleaning
-            encoded_cr_count = result_df.loc[mask & result_df[col].str.contains('_x000D_', regex=False), col].shape[0]
-            encoded_cr_count += result_df.loc[mask & result_df[col].str.contains('_x000B_', regex=False), col].shape[0]
+            affected = values[hits]
             
+            # Count rows with _x000D_ and rows with _x000B_ (rows with both count twice)
+            encoded_cr_count = int(affected.str.contains('_x000D_', regex=False).sum() +
+                                   affected.str.contains('_x000B_', regex=False).sum())
             if encoded_cr_count > 0:
                 self.quality_report.record_issue("invalid_formats", col, encoded_cr_count)
-                
-                # Replace _x000D_ with a space
-                result_df.loc[mask, col] = result_df.loc[mask, col].str.replace('_x000D_', ' ', regex=False)
-
-                # Replace _x000B_ with a space
-                result_df.loc[mask, col] = result_df.loc[mask, col].str.replace('_x000B_', ' ', regex=False)
-                
-                # Clean up any double spaces that might have been created
-                result_df.loc[mask, col] = result_df.loc[mask, col].str.replace(r'\s{2,}', ' ', regex=True)
-                
-                # Record the fix
+            
+            # Whitespace runs are collapsed throughout a cleaned column, so rows holding
+            # one also need rewriting even without an encoded character
+            rewrite = hits | values.str.contains(WHITESPACE + '{2}', regex=True, na=False).astype(bool)
+            
+            # Replace each encoded character with a space and collapse any run of two or more
+            # spaces or encoded characters into one space, in one pass over the affected rows
+            cleaned = values.copy()
+            cleaned[rewrite] = values[rewrite].str.replace(f'(?:_x000[DB]_|{WHITESPACE}){{2,}}|_x000[DB]_', ' ', regex=True)
+            result_df[col] = cleaned
+            
+            # Record the fix
+            if encoded_cr_count > 0:
                 self.quality_report.record_fix("formats_corrected", col, encoded_cr_count)
-                
                 logger.info(f"Cleaned {encoded_cr_count:,} encoded carriage returns in column '{col}'")
         
         return result_df
@@ -1059,17 +2762,16 @@ class ProcessingPipeline:
                 return df
         
         try:
-            # First ensure amendment_number is numeric for proper sorting
-            if df['amendment_number'].dtype not in ['int64', 'float64']:
+            # First ensure amendment_number is numeric for proper sorting (ensure_numeric_values
+            # has already typed it in the standard pipeline)
+            if not pd.api.types.is_numeric_dtype(df['amendment_number']):
                 logger.info("Converting amendment_number to numeric")
                 df['amendment_number'] = pd.to_numeric(df['amendment_number'], errors='coerce').fillna(0)
             
             # Identify which columns to use for creating unique identifiers
             # Check if these key columns exist
             discriminator_columns = []
-            potential_discriminators = ['recipient_legal_name', 'org', 'prog_name_en', 'agreement_title_en']
-            
-            for col in potential_discriminators:
+            for col in AMENDMENT_DISCRIMINATOR_COLUMNS:
                 if col in df.columns:
                     discriminator_columns.append(col)
             
@@ -1096,16 +2798,23 @@ class ProcessingPipeline:
             logger.info(f"Processing {unique_id_count:,} unique ref+discriminator combinations across {total_rows_before:,} rows")
             
             # Define the columns to include in the amendment history
-            history_columns = [
-                'amendment_number', 'amendment_date', 'agreement_value',
-                'agreement_start_date', 'agreement_end_date', 'additional_information_en'
-            ]
-            
             # Keep only columns that actually exist in the dataframe
-            history_columns = [col for col in history_columns if col in df.columns]
+            history_columns = [col for col in AMENDMENT_HISTORY_COLUMNS if col in df.columns]
             
             logger.info("Creating amendment histories...")
             
+            # The per-group loop below works on Python objects, so Arrow strings are
+            # converted once up front (with NaN for missing values) instead of on every row access
+            string_dtypes = {col: dtype for col, dtype in df.dtypes.items() if isinstance(dtype, pd.StringDtype)}
+            if string_dtypes:
+                df = df.astype({col: object for col in string_dtypes}).fillna(
+                    {col: np.nan for col in string_dtypes}).copy()
+            
+            # Dates are written to amendments_history as ISO strings
+            date_columns = [col for col, dtype in df.dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+            if date_columns:
+                df = df.assign(**{col: df[col].dt.strftime(ISO_DATE_FORMAT) for col in date_columns})
+            
             # Create an empty list to store the processed records
             processed_records = []
             
@@ -1149,6 +2858,14 @@ class ProcessingPipeline:
             if '_unique_id' in result_df.columns:
                 result_df = result_df.drop('_unique_id', axis=1)
             
+            # Restore the input's string and date dtypes
+            for col, dtype in string_dtypes.items():
+                if col in result_df.columns:
+                    result_df[col] = result_df[col].astype(dtype)
+            for col in date_columns:
+                if col in result_df.columns:
+                    result_df[col] = pd.to_datetime(result_df[col], format=ISO_DATE_FORMAT)
+            
             # Rename amendment_number to latest_amendment_number
             if 'amendment_number' in result_df.columns:
                 result_df.rename(columns={'amendment_number': 'latest_amendment_number'}, inplace=True)
@@ -1170,15 +2887,196 @@ class ProcessingPipeline:
         except Exception as e:
             logger.error(f"Error processing amendments: {str(e)}")
             logger.exception("Amendment processing failed with exception")
-            return df  # Return original dataframe if processing fails
+            # Let the pipeline see the failure so the stage is not treated as completed
+            raise
+        
+class ExternalAmendmentConsolidator:
+    """
+    Out-of-core amendment consolidation for inputs larger than memory.
+    
+    Rows are added in batches. Each batch is written to disk as a sorted run, ordered
+    by a fixed-width hash of ref_number and the discriminator columns and then by
+    amendment_number (descending). consolidate() merges the runs and yields blocks of
+    consolidated rows with the same latest rows and amendments_history as the
+    in-memory process_amendments processor.
+    """
+    
+    # Helper columns added to the runs
+    KEY_COLUMNS = ['_amend_key', '_amend_missing', '_amend_order', '_amend_seq']
+    
+    def __init__(self, spill_dir: Union[str, Path], block_size: int = 100000):
+        """
+        Initialize the consolidator.
+        
+        Args:
+            spill_dir: Directory for the sorted runs
+            block_size: Number of rows read from each run at a time while merging
+        """
+        self.spill_dir = Path(spill_dir)
+        self.block_size = block_size
+        self.runs = []
+        self.rows_in = 0
+        self.rows_out = 0
+        self.columns = None
+        self.discriminator_columns = []
+        self.history_columns = []
+    
+    def _identity_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Get the columns that identify a grant, as strings the way process_amendments compares them."""
+        identity = {'ref_number': df['ref_number'].astype(str)}
+        for col in self.discriminator_columns:
+            identity[col] = df[col].fillna('').astype(str)
+        return pd.DataFrame(identity)
+    
+    def add_batch(self, df: pd.DataFrame) -> None:
+        """Sort a batch of rows and write it to disk as a run."""
+        if df.empty:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.discriminator_columns = [col for col in AMENDMENT_DISCRIMINATOR_COLUMNS if col in df.columns]
+            self.history_columns = [col for col in AMENDMENT_HISTORY_COLUMNS if col in df.columns]
+        
+        run = df.reset_index(drop=True)
+        if not pd.api.types.is_numeric_dtype(run['amendment_number']):
+            run['amendment_number'] = pd.to_numeric(run['amendment_number'], errors='coerce').fillna(0)
+        amendment = run['amendment_number'].astype('float64')
+        
+        # A 64-bit hash of the identifying columns replaces the concatenated identifier string
+        run['_amend_key'] = pd.util.hash_pandas_object(self._identity_frame(run), index=False).values
+        run['_amend_missing'] = amendment.isna().values
+        run['_amend_order'] = -amendment.fillna(0).values
+        run['_amend_seq'] = np.arange(self.rows_in, self.rows_in + len(run), dtype='int64')
+        
+        run = run.take(self._sort_order(run)).reset_index(drop=True)
+        self.runs.append(write_frame(run, self.spill_dir / f"run_{len(self.runs):06d}"))
+        self.rows_in += len(run)
+    
+    @staticmethod
+    def _sort_order(df: pd.DataFrame, group_codes: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the row order by key, then amendment_number descending with missing values
+        last, then input order.
+        """
+        keys = [df['_amend_seq'].values, df['_amend_order'].values, df['_amend_missing'].values]
+        if group_codes is not None:
+            keys.append(group_codes)
+        keys.append(df['_amend_key'].values)
+        return np.lexsort(keys)
+    
+    def _iter_run(self, path: Path):
+        """Read a run back in blocks."""
+        if path.suffix == '.parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.block_size):
+                yield _restore_string_storage(batch.to_pandas())
+        else:
+            run = pd.read_pickle(path)
+            for start in range(0, len(run), self.block_size):
+                yield run.iloc[start:start + self.block_size]
+    
+    def consolidate(self):
+        """
+        Merge the sorted runs and yield blocks of consolidated rows.
         
+        A block only contains complete groups: rows are released once every run
+        that is not yet exhausted has moved past their key.
+        """
+        readers = [self._iter_run(path) for path in self.runs]
+        pending = [None] * len(readers)
+        exhausted = [False] * len(readers)
+        
+        def refill(index: int) -> None:
+            for block in readers[index]:
+                if block.empty:
+                    continue
+                pending[index] = block if pending[index] is None else pd.concat([pending[index], block], ignore_index=True)
+                return
+            exhausted[index] = True
+        
+        for index in range(len(readers)):
+            refill(index)
+        
+        while True:
+            active = [index for index in range(len(readers)) if not exhausted[index]]
+            if not active:
+                remaining = [block for block in pending if block is not None and not block.empty]
+                if remaining:
+                    yield self._consolidate_block(pd.concat(remaining, ignore_index=True))
+                return
+            
+            # Keys below the smallest last key of the active runs cannot appear again
+            bound = min(pending[index]['_amend_key'].iloc[-1] for index in active)
+            ready = []
+            for index, block in enumerate(pending):
+                if block is None or block.empty:
+                    continue
+                below = (block['_amend_key'] < bound).values
+                if below.any():
+                    ready.append(block[below])
+                    pending[index] = block[~below].reset_index(drop=True)
+            
+            if ready:
+                yield self._consolidate_block(pd.concat(ready, ignore_index=True))
+            else:
+                for index in active:
+                    if pending[index]['_amend_key'].iloc[-1] == bound:
+                        refill(index)
+    
+    def _consolidate_block(self, block: pd.DataFrame) -> pd.DataFrame:
+        """Consolidate a block of complete groups into one row per grant."""
+        block = block.take(self._sort_order(block)).reset_index(drop=True)
+        keys = block['_amend_key'].values
+        starts = np.r_[True, keys[1:] != keys[:-1]]
+        
+        # Rows sharing a key must also share their identifying values; split hash collisions
+        identity = self._identity_frame(block)
+        first_rows = np.maximum.accumulate(np.where(starts, np.arange(len(block)), 0))
+        collided = np.zeros(len(block), dtype=bool)
+        for col in identity.columns:
+            values = identity[col].values
+            collided |= values != values[first_rows]
+        if collided.any():
+            codes = pd.MultiIndex.from_frame(identity).factorize()[0]
+            order = self._sort_order(block, codes)
+            block = block.take(order).reset_index(drop=True)
+            codes = codes[order]
+            keys = block['_amend_key'].values
+            starts = np.r_[True, (keys[1:] != keys[:-1]) | (codes[1:] != codes[:-1])]
+        
+        group_ids = np.cumsum(starts) - 1
+        histories = [[] for _ in range(int(starts.sum()))]
+        
+        # Every row after the first of its group is a previous amendment
+        previous = block[~starts]
+        values = {col: (previous[col].dt.strftime(ISO_DATE_FORMAT)
+                        if pd.api.types.is_datetime64_any_dtype(previous[col]) else previous[col]).tolist()
+                  for col in self.history_columns}
+        present = {col: previous[col].notna().values for col in self.history_columns}
+        for position, group in enumerate(group_ids[~starts]):
+            histories[group].append({col: values[col][position] for col in self.history_columns
+                                     if present[col][position]})
+        
+        result = block[starts].drop(columns=self.KEY_COLUMNS).reset_index(drop=True)
+        result = result.reindex(columns=self.columns)
+        result['amendments_history'] = [json.dumps(history) if history else None for history in histories]
+        result = result.rename(columns={'amendment_number': 'latest_amendment_number'})
+        self.rows_out += len(result)
+        return result
+    
 class DataPreprocessor:
     """
     Main class for preprocessing tri-agency grant data.
     Provides a user-friendly interface to the processing pipeline.
     """
     
-    def __init__(self, chunk_size: int = 100000, max_workers: int = 1, quiet: bool = False):
+    def __init__(self, chunk_size: int = 100000, max_workers: int = 1, quiet: bool = False,
+                 stage_workers: int = 1, stage_executor: str = "thread", cache_stages: bool = False,
+                 checkpoint_dir: Optional[Union[str, Path]] = None,
+                 cache_dir: Optional[Union[str, Path]] = None,
+                 incremental_dir: Optional[Union[str, Path]] = None, engine: str = "pandas",
+                 arrow_strings: bool = True, projection: Optional[str] = None,
+                 verify_incremental: bool = False, cache_entries: int = DEFAULT_CACHE_ENTRIES):
         """
         Initialize the DataPreprocessor with options for performance tuning.
         
@@ -1186,22 +3084,71 @@ class DataPreprocessor:
             chunk_size: Size of data chunks for processing large datasets
             max_workers: Maximum number of worker processes for parallel processing
             quiet: Whether to suppress progress output
+            stage_workers: Number of workers used to run independent pipeline stages concurrently
+            stage_executor: How independent stages run concurrently: 'thread' or 'process'
+            cache_stages: Whether to reuse stage outputs whose input columns are unchanged
+            checkpoint_dir: Directory for per-stage checkpoints, so reruns resume from the
+                deepest stage whose input and configuration are unchanged (disabled if None)
+            cache_dir: Directory for cached pipeline results keyed by the raw data's content
+                hash and the pipeline configuration (disabled if None)
+            incremental_dir: Directory for the state of incremental runs, so only rows
+                that changed since the previous snapshot are processed (disabled if None)
+            engine: DataFrame library that runs the pipeline: 'pandas' or 'polars'
+            arrow_strings: Whether text columns are processed as Arrow-backed strings
+            projection: Columns to process: None for all, 'minimal' to leave out the heavy
+                text columns no analysis reads, or 'full' to process them only when
+                the rows are saved (see restore_deferred_columns)
+            verify_incremental: Whether to check each incremental update against processing
+                all rows (doubles the processing time; for diagnosing incremental runs)
+            cache_entries: Number of results kept in cache_dir; storing a result removes
+                the least recently used ones beyond it
         """
+        if projection is not None and projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection '{projection}'")
         self.chunk_size = chunk_size
         self.max_workers = max_workers
         self.quiet = quiet
+        self.stage_workers = stage_workers
+        self.stage_executor = stage_executor
+        self.cache_stages = cache_stages
+        self.checkpoint_dir = checkpoint_dir
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.incremental_dir = Path(incremental_dir) if incremental_dir is not None else None
+        self.engine = engine
+        self.arrow_strings = arrow_strings
+        self.projection = projection
+        self.verify_incremental = verify_incremental
+        self.cache_entries = cache_entries
         self.timestamp = time.strftime("%Y%m%d_%H%M%S")
         
+        # Heavy text columns of the last input under the 'full' projection, indexed by row id
+        self._deferred = None
+        self._deferred_pipeline = None
+        self._raw_columns = []
+        
         # Set up logging
         self._configure_logging()
         
         # Create the processing pipeline
-        self.pipeline = ProcessingPipeline(chunk_size=chunk_size)
+        self.pipeline = self._create_pipeline()
         self.registry = self.pipeline.registry
         
         # Configure with standard processors by default
         self.pipeline.configure_standard_pipeline()
     
+    def _create_pipeline(self, registry: ProcessorRegistry = None) -> ProcessingPipeline:
+        """Create a processing pipeline with this preprocessor's performance settings."""
+        return ProcessingPipeline(
+            registry,
+            self.chunk_size,
+            stage_workers=self.stage_workers,
+            stage_executor=self.stage_executor,
+            cache_stages=self.cache_stages,
+            checkpoint_dir=self.checkpoint_dir,
+            engine=self.engine,
+            arrow_strings=self.arrow_strings
+        )
+    
     def _configure_logging(self) -> None:
         """Configure logging based on quiet setting."""
         log_level = logging.WARNING if self.quiet else logging.INFO
@@ -1232,11 +3179,31 @@ class DataPreprocessor:
         # Use the provided pipeline or the default
         processing_pipeline = pipeline if pipeline is not None else self.pipeline
         
+        processing_pipeline.last_delta = None
+        
+        # Key the cache on the whole input, then leave out the columns outside the projection
+        cache_key = self.get_cache_key(df, processing_pipeline) if self.cache_dir is not None else None
+        df = self._project(df, processing_pipeline)
+        
+        # Return the stored result if this exact input went through this exact pipeline before
+        if cache_key is not None:
+            cached_df = self._load_cached_result(cache_key, processing_pipeline)
+            if cached_df is not None:
+                self._print(f"Using cached preprocessing result ({len(cached_df):,} rows)")
+                return cached_df
+        
         # Process the data
         start_time = time.time()
-        result_df = processing_pipeline.process(df, max_workers=self.max_workers)
+        if self.incremental_dir is not None:
+            result_df = processing_pipeline.process_incremental(df, self.incremental_dir, max_workers=self.max_workers,
+                                                                verify=self.verify_incremental)
+        else:
+            result_df = processing_pipeline.process(df, max_workers=self.max_workers)
         processing_time = time.time() - start_time
         
+        if cache_key is not None:
+            self._store_cached_result(cache_key, result_df, processing_pipeline)
+        
         # Print summary and quality report
         self._print(f"Preprocessing complete in {processing_time:.2f} seconds.")
         self._print(f"Output dataset has {len(result_df):,} rows.")
@@ -1246,6 +3213,255 @@ class DataPreprocessor:
         
         return result_df
     
+    def _project(self, df: pd.DataFrame, pipeline: ProcessingPipeline) -> pd.DataFrame:
+        """Leave the heavy text columns out of a raw DataFrame according to the projection."""
+        self._deferred = None
+        heavy_columns = [col for col in HEAVY_TEXT_COLUMNS if col in df.columns]
+        if self.projection is None or not heavy_columns:
+            return df
+        if self.projection == "minimal":
+            return df.drop(columns=heavy_columns)
+        
+        # Amendment histories are built from the rows that consolidation drops, so their
+        # columns have to go through the pipeline
+        if any(stage["processor"] == "process_amendments" for stage in pipeline.stages):
+            heavy_columns = [col for col in heavy_columns if col not in AMENDMENT_HISTORY_COLUMNS]
+        
+        # Rows are identified by a hash of their values, which stays stable across snapshots
+        row_ids = _stable_row_keys(df).values
+        self._deferred = df[heavy_columns].set_axis(row_ids)
+        self._deferred_pipeline = pipeline
+        self._raw_columns = list(df.columns)
+        return df.drop(columns=heavy_columns).assign(**{ROW_ID_COLUMN: row_ids})
+    
+    def restore_deferred_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Join the heavy text columns deferred by the 'full' projection back onto processed rows.
+        
+        The deferred columns of the given rows are processed by the row-local stages
+        that read them and put back in their original position.
+        
+        Args:
+            df: Rows returned by preprocess_data (or a subset of them)
+            
+        Returns:
+            DataFrame with the deferred columns and without the row id column; other
+            DataFrames are returned as they are
+        """
+        if self._deferred is None or ROW_ID_COLUMN not in df.columns:
+            return df
+        
+        deferred = self._deferred.reindex(df[ROW_ID_COLUMN].values).reset_index(drop=True)
+        deferred = self._deferred_pipeline.process_deferred(deferred).set_axis(df.index)
+        
+        result_df = df.drop(columns=ROW_ID_COLUMN)
+        for col in deferred.columns:
+            # Insert after the nearest raw column that precedes it
+            position = 0
+            for previous in reversed(self._raw_columns[:self._raw_columns.index(col)]):
+                if previous in result_df.columns:
+                    position = result_df.columns.get_loc(previous) + 1
+                    break
+            result_df.insert(position, col, deferred[col])
+        return result_df
+    
+    def preprocess_file(self, input_path: Union[str, Path], output_path: Union[str, Path],
+                        partitions: int = 16, spill_dir: Optional[Union[str, Path]] = None,
+                        row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+                        amendment_engine: str = "partition",
+                        pipeline: ProcessingPipeline = None) -> Optional[Path]:
+        """
+        Process a CSV file into a CSV file in batches of chunk_size rows with bounded memory.
+        
+        Args:
+            input_path: Raw CSV file to read
+            output_path: Processed CSV file to write
+            partitions: Number of spill partitions used for amendment consolidation
+            spill_dir: Directory for the spill area (defaults to the system temp directory)
+            row_filter: Optional function applied to the processed rows before writing
+            amendment_engine: 'partition', 'external' (external sort for inputs whose
+                partitions would not fit in memory) or 'duckdb' (SQL over spilled Parquet)
+            pipeline: Optional custom pipeline to use instead of the default
+            
+        Returns:
+            Path to the written file, or None if no rows were written
+        """
+        processing_pipeline = pipeline if pipeline is not None else self.pipeline
+        output_path = Path(output_path)
+        
+        self._print(f"Streaming {input_path} in batches of {self.chunk_size:,} rows "
+                    f"across {partitions} partitions...")
+        start_time = time.time()
+        rows_written = processing_pipeline.process_stream(
+            input_path, output_path,
+            batch_size=self.chunk_size,
+            partitions=partitions,
+            spill_dir=spill_dir,
+            row_filter=row_filter,
+            amendment_engine=amendment_engine
+        )
+        processing_time = time.time() - start_time
+        
+        if not output_path.exists():
+            self._print("Warning: No rows were written")
+            return None
+        
+        self._print(f"Preprocessing complete in {processing_time:.2f} seconds.")
+        self._print(f"✅ Saved {rows_written:,} rows to {output_path}")
+        
+        if not self.quiet:
+            processing_pipeline.print_quality_report(detailed=True)
+        
+        return output_path
+    
+    def get_cache_key(self, df: pd.DataFrame, pipeline: ProcessingPipeline = None) -> str:
+        """
+        Build the result cache key for a raw DataFrame.
+        
+        Args:
+            df: Raw DataFrame
+            pipeline: Pipeline to key on (defaults to the configured pipeline)
+            
+        Returns:
+            Hash of the raw data's content, the pipeline signature and the settings
+            that change the output (projection and chunking)
+        """
+        processing_pipeline = pipeline if pipeline is not None else self.pipeline
+        key = [_fingerprint_frame(df), processing_pipeline.get_signature()]
+        if self.projection is not None:
+            key.append(self.projection)
+        chunk_size = processing_pipeline.effective_chunk_size(len(df), self.max_workers)
+        if chunk_size is not None:
+            key.append(["chunk_size", chunk_size])
+        payload = json.dumps(key)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _load_cached_result(self, cache_key: str, pipeline: ProcessingPipeline) -> Optional[pd.DataFrame]:
+        """Load a cached pipeline result and restore its quality report."""
+        meta = read_meta(self.cache_dir / cache_key)
+        frames = read_frames(self.cache_dir / cache_key, ['']) if meta is not None else None
+        if frames is None:
+            return None
+        pipeline.quality_report = DataQualityReport()
+        pipeline.quality_report.load_report(meta.get("quality_report", {}))
+        # Mark the entry as recently used, so pruning keeps it
+        os.utime(self.cache_dir / f"{cache_key}.json")
+        return frames['']
+    
+    def _store_cached_result(self, cache_key: str, df: pd.DataFrame, pipeline: ProcessingPipeline) -> None:
+        """Store a pipeline result; the metadata file is written last and marks it as complete."""
+        try:
+            write_frames(self.cache_dir / cache_key, {'': df}, {
+                "pipeline_signature": pipeline.get_signature(),
+                "stages": [stage["processor"] for stage in pipeline.stages],
+                "rows": len(df),
+                "quality_report": pipeline.get_quality_report()
+            })
+            removed = prune_entries(self.cache_dir, self.cache_entries)
+            if removed:
+                logger.debug(f"Removed {removed} least recently used cached results")
+        except Exception as e:
+            logger.warning(f"Could not cache preprocessing result: {str(e)}")
+    
+    def materialize_cube(self, df: pd.DataFrame, data_path: Union[str, Path]) -> Optional['AggregateCube']:
+        """
+        Build the aggregate cube of a processed dataset and store it next to the dataset file.
+        
+        Args:
+            df: Processed DataFrame
+            data_path: File the dataset was saved to
+            
+        Returns:
+            The AggregateCube, or None if the dataset lacks cube columns or storing failed
+        """
+        from cube import CUBE_SOURCE_COLUMNS, AggregateCube, cube_path
+        
+        missing = [col for col in CUBE_SOURCE_COLUMNS if col not in df.columns]
+        if missing:
+            logger.debug(f"Not building an aggregate cube, missing columns: {', '.join(missing)}")
+            return None
+        try:
+            cube = AggregateCube.from_frame(df)
+            cube.save(cube_path(data_path))
+            return cube
+        except Exception as e:
+            logger.warning(f"Could not materialize the aggregate cube: {str(e)}")
+            return None
+    
+    def materialize_aggregates(self, df: pd.DataFrame, data_path: Union[str, Path],
+                               previous_path: Optional[Union[str, Path]] = None) -> Optional['AnalyticsState']:
+        """
+        Store the aggregate state of a processed dataset next to the dataset file.
+        
+        When the dataset came out of an incremental run and the state of the previous
+        dataset is stored next to previous_path, the rows that run replaced are
+        retracted from that state and their replacements inserted, instead of
+        aggregating the whole dataset again.
+        
+        Args:
+            df: Processed DataFrame
+            data_path: File the dataset was saved to
+            previous_path: File of the dataset the incremental run started from
+            
+        Returns:
+            The AnalyticsState, or None if the dataset lacks its columns or storing failed
+        """
+        from analytics import STATE_SOURCE_COLUMNS, AnalyticsState, content_fingerprint, state_path
+        
+        missing = [col for col in STATE_SOURCE_COLUMNS if col not in df.columns]
+        if missing:
+            logger.debug(f"Not building an aggregate state, missing columns: {', '.join(missing)}")
+            return None
+        try:
+            state = None
+            delta = self.pipeline.last_delta
+            if previous_path is not None and delta is not None:
+                state = AnalyticsState.load(state_path(previous_path))
+            if state is not None:
+                retracted, inserted = delta
+                try:
+                    state = state.apply(inserted=inserted, retracted=retracted)
+                except ValueError:
+                    state = None
+                if state is None or not state.matches_totals(df):
+                    logger.info("Aggregates of the previous dataset do not match the update; rebuilding them")
+                    state = None
+                else:
+                    logger.info(f"Updated aggregates with {len(inserted):,} inserted and {len(retracted):,} retracted rows")
+            if state is None:
+                state = AnalyticsState.from_frame(df)
+            state.fingerprint = content_fingerprint(df, STATE_SOURCE_COLUMNS)
+            state.save(state_path(data_path))
+            return state
+        except Exception as e:
+            logger.warning(f"Could not materialize the aggregate state: {str(e)}")
+            return None
+    
+    def materialize_trajectories(self, df: pd.DataFrame, data_path: Union[str, Path]) -> Optional['TrajectoryIndex']:
+        """
+        Build the funding trajectory index of a processed dataset and store it next to the dataset file.
+        
+        Args:
+            df: Processed DataFrame
+            data_path: File the dataset was saved to
+            
+        Returns:
+            The TrajectoryIndex, or None if the dataset lacks its columns or storing failed
+        """
+        from trajectories import TRAJECTORY_SOURCE_COLUMNS, TrajectoryIndex, trajectory_path
+        
+        missing = [col for col in TRAJECTORY_SOURCE_COLUMNS if col not in df.columns]
+        if missing:
+            logger.debug(f"Not building a trajectory index, missing columns: {', '.join(missing)}")
+            return None
+        try:
+            index = TrajectoryIndex.from_frame(df)
+            index.save(trajectory_path(data_path))
+            return index
+        except Exception as e:
+            logger.warning(f"Could not materialize the trajectory index: {str(e)}")
+            return None
+    
     def save_processed_data(self, df: pd.DataFrame, output_dir: Union[str, Path], 
                             filename: str = None, compress: bool = False) -> Optional[Path]:
         """
@@ -1277,9 +3493,13 @@ class DataPreprocessor:
         
         output_path = output_dir / filename
         
-        # Save the DataFrame
+        # Save the DataFrame, with any deferred columns joined back
         self._print(f"Saving processed data to {output_path}...")
+        df = self.restore_deferred_columns(df)
         df.to_csv(output_path, index=False)
+        self.materialize_cube(df, output_path)
+        self.materialize_aggregates(df, output_path)
+        self.materialize_trajectories(df, output_path)
         
         # Report results
         self._print(f"✅ Saved {len(df):,} rows to {output_path}")
@@ -1389,7 +3609,7 @@ class DataPreprocessor:
                 Each processor should be a dict with 'name' and optional 'params'
         """
         # Create a new pipeline
-        self.pipeline = ProcessingPipeline(self.registry, self.chunk_size)
+        self.pipeline = self._create_pipeline(self.registry)
         
         # Add each processor to the pipeline
         for processor in processors:
@@ -1449,7 +3669,10 @@ class DataPreprocessor:
         Returns:
             DataFrame with processed amendments
         """
-        return self.pipeline.registry.get('process_amendments')(df)
+        try:
+            return self.pipeline.registry.get('process_amendments')(df)
+        except Exception:
+            return df  # Return original dataframe if processing fails
     
     def get_quality_report(self) -> Dict:
         """Get the data quality report from the last processing run."""
@@ -1509,9 +3732,38 @@ if __name__ == "__main__":
     parser.add_argument('--quiet', '-q', action='store_true', help='Suppress output')
     parser.add_argument('--workers', '-w', type=int, default=1, help='Number of worker processes')
     parser.add_argument('--chunk-size', '-s', type=int, default=100000, help='Processing chunk size')
-    parser.add_argument('--report', '-r', action='store_true', help='Generate detailed quality report')
+    parser.add_argument('--stage-workers', type=int, default=1, help='Number of workers for independent stages')
+    parser.add_argument('--stage-executor', choices=['thread', 'process'], default='thread',
+                        help='Run independent stages on threads or processes')
+    parser.add_argument('--checkpoint-dir', help='Directory for per-stage checkpoints to resume from')
+    parser.add_argument('--cache-dir', help='Directory for cached results keyed by input hash and pipeline')
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help='Number of cached results kept in --cache-dir')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process the file in batches of --chunk-size rows with bounded memory')
+    parser.add_argument('--partitions', type=int, default=16, help='Number of spill partitions in stream mode')
+    parser.add_argument('--spill-dir', help='Directory for the spill area in stream mode')
+    parser.add_argument('--amendment-engine', choices=['partition', 'external', 'duckdb'], default='partition',
+                        help='Consolidate amendments per spill partition, by external sort or with DuckDB in stream mode')
+    parser.add_argument('--incremental-dir', help='Directory for incremental state; only changed rows are processed')
+    parser.add_argument('--verify-incremental', action='store_true',
+                        help='Check incremental updates against processing all rows')
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help='DataFrame library that runs the pipeline')
+    parser.add_argument('--no-arrow-strings', action='store_true',
+                        help='Process text columns as Python objects instead of Arrow strings')
+    parser.add_argument('--projection', choices=list(PROJECTIONS), default=None,
+                        help='Leave out (minimal) or defer until saving (full) the heavy text columns')
+    parser.add_argument('--report', '-r', action='store_true',
+                        help='Print the detailed quality report and write it as JSON next to the output file')
+    parser.add_argument('--report-json', metavar='PATH',
+                        help='Write the quality report as JSON to PATH (single input file only)')
     
     args = parser.parse_args()
+    if args.report_json is not None and len(args.input) > 1:
+        parser.error("--report-json takes a single input file; use --report to write a report per file")
+    if args.engine == 'polars' and (args.stage_workers > 1 or args.checkpoint_dir is not None):
+        parser.error("--engine polars does not support --stage-workers or --checkpoint-dir")
     
     # Handle input files
     input_files = args.input
@@ -1541,6 +3793,9 @@ if __name__ == "__main__":
     
     output_dir.mkdir(parents=True, exist_ok=True)
     
+    # Quality reports are never written over an input file
+    input_paths = {Path(path).resolve() for path in input_files}
+    
     # Process each input file
     for input_path in input_files:
         input_file = Path(input_path)
@@ -1552,17 +3807,19 @@ if __name__ == "__main__":
             preprocessor = DataPreprocessor(
                 chunk_size=args.chunk_size,
                 max_workers=args.workers,
-                quiet=args.quiet
+                quiet=args.quiet,
+                stage_workers=args.stage_workers,
+                stage_executor=args.stage_executor,
+                checkpoint_dir=args.checkpoint_dir,
+                cache_dir=args.cache_dir,
+                cache_entries=args.cache_entries,
+                incremental_dir=args.incremental_dir,
+                verify_incremental=args.verify_incremental,
+                engine=args.engine,
+                arrow_strings=not args.no_arrow_strings,
+                projection=args.projection
             )
             
-            # Read the input file
-            print(f"Reading input file...")
-            df = pd.read_csv(input_file, low_memory=False)
-            print(f"Read {len(df):,} rows")
-            
-            # Process the data
-            processed_df = preprocessor.preprocess_data(df)
-
             # Generate output filename based on input filename
             output_filename = f"{input_file.stem}.csv"
 
@@ -1571,15 +3828,10 @@ if __name__ == "__main__":
                 output_dir = Path('data/filtered')
                 if args.year_end is None:
                     print("Filtering data for years starting from", args.year_start)
-                    processed_df = processed_df[processed_df['year'] >= args.year_start]
                     output_filename = f"{input_file.stem}_{args.year_start}-.csv"
                 else:
                     if args.year_end >= args.year_start:
                         print("Filtering data for years between", args.year_start, "and", args.year_end)
-                        processed_df = processed_df[
-                            (processed_df['year'] >= args.year_start) & 
-                            (processed_df['year'] <= args.year_end)
-                        ]
                         output_filename = f"{input_file.stem}_{args.year_start}-{args.year_end}.csv"
                     else:
                         print("Error: --year-end must be greater than or equal to --year-start")
@@ -1588,20 +3840,62 @@ if __name__ == "__main__":
                 if args.year_end is not None:
                     output_dir = Path('data/filtered')
                     print("Filtering data for years up to", args.year_end)
-                    processed_df = processed_df[processed_df['year'] <= args.year_end]
                     output_filename = f"{input_file.stem}_-{args.year_end}.csv"
             
-            # Save the processed data
-            preprocessor.save_processed_data(
-                processed_df, 
-                output_dir, 
-                filename=output_filename,
-                compress=args.compress
-            )
+            def filter_by_year(frame: pd.DataFrame) -> pd.DataFrame:
+                """Keep the rows within the requested year range."""
+                if args.year_start is not None:
+                    frame = frame[frame['year'] >= args.year_start]
+                if args.year_end is not None:
+                    frame = frame[frame['year'] <= args.year_end]
+                return frame
+            
+            if args.stream:
+                # Stream the file through the pipeline without loading it whole
+                output_path = preprocessor.preprocess_file(
+                    input_file,
+                    output_dir / output_filename,
+                    partitions=args.partitions,
+                    spill_dir=args.spill_dir,
+                    row_filter=filter_by_year,
+                    amendment_engine=args.amendment_engine
+                )
+                if args.compress and output_path is not None:
+                    preprocessor._compress_file(output_path)
+            else:
+                # Read the input file
+                print(f"Reading input file...")
+                df = pd.read_csv(input_file, low_memory=False)
+                print(f"Read {len(df):,} rows")
+                
+                # Process the data and apply the year filter
+                processed_df = filter_by_year(preprocessor.preprocess_data(df))
+                
+                # Save the processed data
+                preprocessor.save_processed_data(
+                    processed_df, 
+                    output_dir, 
+                    filename=output_filename,
+                    compress=args.compress
+                )
             
             # Print detailed report if requested
             if args.report:
                 preprocessor.print_quality_report(detailed=True)
+            
+            # Write the report as JSON to the given path, or next to the output file
+            if args.report or args.report_json is not None:
+                if args.report_json is not None:
+                    report_path = Path(args.report_json)
+                else:
+                    report_path = output_dir / f"{Path(output_filename).stem}_quality_report.json"
+                if report_path.resolve() in input_paths:
+                    print(f"Error: not writing the quality report over input file {report_path}")
+                else:
+                    report_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(report_path, 'w') as f:
+                        json.dump(preprocessor.get_quality_report(), f, indent=2, default=int)
+                    print(f"Quality report written to {report_path}")
                 
         except Exception as e:
             print(f"Error processing {input_file}: {str(e)}")
@@ -0,0 +1,291 @@
+"""
+Data Sketches
+
+This module provides small, mergeable summaries of grant data columns that can be
+stored next to a dataset and combined without going back to the rows.
+
+Features:
+- Stable 64-bit hashes of column values, independent of the column's dtype
+- HyperLogLog distinct counts kept as sparse (register, rank) observations
+- Vectorized estimates for many sketches at once
+- HyperLogLog and KLL quantile sketches sized from a requested error bound
+- Merging of sketches built on separate chunks or workers
+"""
+
+import logging
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default HyperLogLog precision: 2**12 registers, about 1.6% relative error
+HLL_PRECISION = 12
+
+# Smallest and largest HyperLogLog precision a requested error bound maps to
+HLL_MIN_PRECISION = 4
+HLL_MAX_PRECISION = 18
+
+# Default KLL accuracy parameter: about 1.3% rank error
+KLL_K = 200
+
+# Capacity ratio between neighbouring KLL levels and the smallest level capacity
+KLL_CAPACITY_DECAY = 2 / 3
+KLL_MIN_CAPACITY = 8
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """
+    Hash the non-missing values of a column.
+
+    Values are hashed as strings, so the same value gets the same hash whatever the
+    column's dtype. Each distinct value is hashed once.
+
+    Args:
+        values: Column to hash
+
+    Returns:
+        uint64 hashes of the non-missing values, in row order
+    """
+    codes, uniques = pd.factorize(values.dropna())
+    hashed = pd.util.hash_array(np.asarray(uniques.astype(str), dtype=object))
+    return hashed[codes]
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Number of significant bits of each uint64 value."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp is exact for 32-bit integers and returns their bit length as the exponent
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1]).astype(np.int64)
+
+def hll_observations(hashes: np.ndarray, precision: int = HLL_PRECISION) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn hashes into HyperLogLog register observations.
+
+    Args:
+        hashes: uint64 hashes of the counted values
+        precision: Number of index bits (the sketch has 2**precision registers)
+
+    Returns:
+        Tuple of (register index, rank) arrays; a sketch keeps the highest rank
+        seen for each register
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    rest_bits = 64 - precision
+    index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    rank = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+    return index, rank
+
+def _estimate(inverse_sum: np.ndarray, zeros: np.ndarray, m: int) -> np.ndarray:
+    """HyperLogLog estimate from the sum of 2**-rank over all registers and the empty registers."""
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / inverse_sum
+
+    # Use linear counting while many registers are still empty
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+def hll_estimate(registers: np.ndarray) -> np.ndarray:
+    """
+    Estimate distinct counts from dense HyperLogLog registers.
+
+    Args:
+        registers: Array of shape (sketches, 2**precision) with the highest rank
+            seen per register
+
+    Returns:
+        float64 estimate per sketch
+    """
+    registers = np.atleast_2d(registers)
+    inverse_sum = np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    return _estimate(inverse_sum, (registers == 0).sum(axis=1), registers.shape[1])
+
+def hll_group_estimate(groups: np.ndarray, index: np.ndarray, rank: np.ndarray,
+                       n_groups: int, precision: int = HLL_PRECISION) -> np.ndarray:
+    """
+    Merge sparse HyperLogLog observations by group and estimate each group's distinct count.
+
+    Observations of the same group and register are merged by keeping the highest
+    rank, so the result is the same as merging the dense sketches.
+
+    Args:
+        groups: Group of each observation (0 to n_groups - 1)
+        index: Register index of each observation
+        rank: Rank of each observation
+        n_groups: Number of groups
+        precision: HyperLogLog precision of the observations
+
+    Returns:
+        float64 estimate per group (0 for groups without observations)
+    """
+    m = 2 ** precision
+    merged = pd.Series(np.asarray(rank, dtype=np.float64)).groupby(
+        [np.asarray(groups, dtype=np.int64), np.asarray(index, dtype=np.int64)], sort=False).max()
+    merged_groups = merged.index.get_level_values(0).to_numpy()
+
+    nonzero = np.bincount(merged_groups, minlength=n_groups)
+    zeros = m - nonzero
+    inverse_sum = np.bincount(merged_groups, weights=np.exp2(-merged.to_numpy()), minlength=n_groups) + zeros
+    return _estimate(inverse_sum, zeros, m)
+
+def hll_relative_error(precision: int = HLL_PRECISION) -> float:
+    """Standard relative error of a HyperLogLog estimate at the given precision."""
+    return 1.04 / np.sqrt(2 ** precision)
+
+def hll_precision_for_error(relative_error: float) -> int:
+    """Smallest HyperLogLog precision whose standard relative error is within the given bound."""
+    if not 0 < relative_error < 1:
+        raise ValueError(f"Relative error must be between 0 and 1, got {relative_error}")
+    precision = math.ceil(math.log2((1.04 / relative_error) ** 2))
+    return min(max(precision, HLL_MIN_PRECISION), HLL_MAX_PRECISION)
+
+def kll_rank_error(k: int) -> float:
+    """Normalized rank error of a KLL sketch with accuracy parameter k (99% confidence)."""
+    return 2.296 / k ** 0.9723
+
+def kll_k_for_error(rank_error: float) -> int:
+    """Smallest KLL accuracy parameter whose rank error is within the given bound."""
+    if not 0 < rank_error < 1:
+        raise ValueError(f"Rank error must be between 0 and 1, got {rank_error}")
+    return max(KLL_MIN_CAPACITY, math.ceil((2.296 / rank_error) ** (1 / 0.9723)))
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch of the distinct values of a column.
+
+    Sketches with the same precision merge by keeping the highest rank per register,
+    which gives the sketch of all their values.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            precision: Number of index bits (the sketch has 2**precision registers)
+        """
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    @classmethod
+    def for_error(cls, relative_error: float) -> 'HyperLogLog':
+        """Create an empty sketch whose estimates are within the given relative standard error."""
+        return cls(hll_precision_for_error(relative_error))
+
+    def update(self, values: pd.Series) -> 'HyperLogLog':
+        """Add the non-missing values of a column to the sketch."""
+        index, rank = hll_observations(hash_values(values), self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Add the values of another sketch with the same precision to this one."""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> float:
+        """Estimate the number of distinct values added to the sketch."""
+        return float(hll_estimate(self.registers)[0])
+
+    @property
+    def relative_error(self) -> float:
+        """Standard relative error of the estimate."""
+        return hll_relative_error(self.precision)
+
+class KLLSketch:
+    """
+    KLL quantile sketch of float values.
+
+    Values are kept in levels of compactors; a full level is sorted and every other
+    value moves up a level with twice the weight. Sketches with the same k merge by
+    joining their levels, which gives the sketch of all their values.
+    """
+
+    def __init__(self, k: int = KLL_K, seed: int = 0):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            k: Accuracy parameter (capacity of the top level)
+            seed: Seed of the random compaction offsets, for reproducible sketches
+        """
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def for_error(cls, rank_error: float, seed: int = 0) -> 'KLLSketch':
+        """Create an empty sketch whose quantiles are within the given normalized rank error."""
+        return cls(kll_k_for_error(rank_error), seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(KLL_MIN_CAPACITY, math.ceil(self.k * KLL_CAPACITY_DECAY ** depth))
+
+    def _compress(self) -> None:
+        """Compact every level that is over its capacity, from the bottom up."""
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                odd = len(items) % 2
+                promoted = items[odd:][self._rng.integers(2)::2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values: Sequence[float]) -> 'KLLSketch':
+        """Add values to the sketch; missing values are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        # A compaction adds the same error however many values it halves, so a
+        # large batch is compacted as a whole
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Add the values of another sketch with the same k to this one."""
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge KLL sketches with k={self.k} and k={other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Estimate quantiles of the values added to the sketch.
+
+        Args:
+            qs: Quantiles between 0 and 1
+
+        Returns:
+            float64 estimate per quantile (NaN if the sketch is empty)
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side='left')
+        return items[order][np.minimum(positions, len(items) - 1)]
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error of the quantile estimates."""
+        return kll_rank_error(self.k)
@@ -0,0 +1,297 @@
+"""
+Funding Trajectories
+
+This module indexes the yearly funding of every institution and recipient of a
+processed dataset, so the trajectory of any of them can be read without filtering
+and grouping the rows again.
+
+Features:
+- Entity x year totals and grant counts, stored sparse and columnar
+- Constant-time lookup of any entity's yearly series
+- Year-over-year growth, 3-year moving averages and rank changes of all
+  entities at once
+- Storage next to the dataset file it was built from
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from analytics import content_fingerprint, to_float
+from preprocessor import companion_path, read_frames, read_meta, write_frames
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout or meaning of stored trajectory indexes changes
+TRAJECTORY_VERSION = "2"
+
+# Indexed entities and the column naming them
+TRAJECTORY_ENTITIES = {
+    'institutions': 'research_organization_name',
+    'recipients': 'recipient_legal_name',
+}
+
+# Columns a dataset needs for a trajectory index to be built from it
+TRAJECTORY_SOURCE_COLUMNS = ['year', 'agreement_value'] + list(TRAJECTORY_ENTITIES.values())
+
+# Window of the moving average, in years
+MOVING_AVERAGE_YEARS = 3
+
+def trajectory_path(data_file: Union[str, Path]) -> Path:
+    """Get the path (without suffix) of the trajectory index stored for a dataset file."""
+    return companion_path(data_file, "trajectories")
+
+class Trajectories:
+    """
+    Yearly funding totals and grant counts of the entities named by one column.
+
+    Entries are sorted by entity and year, and the entries of entity i are
+    entries[offsets[i]:offsets[i + 1]], so an entity's series is a slice. Years
+    without grants have no entry.
+    """
+
+    def __init__(self, names: pd.Index, offsets: np.ndarray, entries: pd.DataFrame):
+        """
+        Initialize the trajectories.
+
+        Args:
+            names: Entity names, in entity order
+            offsets: Start of each entity's entries, plus the number of entries
+            entries: year, total and count of each entity and year
+        """
+        self.names = names
+        self.offsets = offsets
+        self.entries = entries
+        self._trends: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, column: str) -> 'Trajectories':
+        """
+        Build the trajectories of the entities named by a column.
+
+        Args:
+            df: Grant data with year, agreement_value and the entity column
+            column: Column naming the entities
+
+        Returns:
+            Trajectories of every entity with at least one grant of known year
+        """
+        years = pd.to_numeric(df['year'], errors='coerce').to_numpy(dtype=np.float64)
+        values = to_float(df['agreement_value']).to_numpy()
+        codes, names = pd.factorize(df[column], sort=True)
+        known = (codes >= 0) & ~np.isnan(years)
+
+        frame = pd.DataFrame({'entity': codes[known], 'year': years[known].astype(np.int16), 'value': values[known]})
+        entries = frame.groupby(['entity', 'year'], sort=True)['value'].agg(total='sum', count='size').reset_index()
+
+        # Drop names without entries so that entity codes stay contiguous
+        present = np.unique(entries['entity'].to_numpy())
+        remap = np.full(len(names), -1, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        entity = remap[entries['entity'].to_numpy()]
+
+        offsets = np.searchsorted(entity, np.arange(len(present) + 1)).astype(np.int64)
+        entries = pd.DataFrame({
+            'year': entries['year'].to_numpy(dtype=np.int16),
+            'total': entries['total'].to_numpy(dtype=np.float64),
+            'count': entries['count'].to_numpy(dtype=np.int32),
+        })
+        return cls(pd.Index(np.asarray(names)[present], dtype=object), offsets, entries)
+
+    def entities(self) -> np.ndarray:
+        """Entity code of each entry."""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+
+    def locate(self, name: str) -> Optional[int]:
+        """Entity code of a name (hash lookup), or None if it is not indexed."""
+        try:
+            return self.names.get_loc(name)
+        except KeyError:
+            return None
+
+    def series(self, name: str, trends: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Yearly funding of one entity.
+
+        Args:
+            name: Entity name
+            trends: Include the trend statistics (see trends)
+
+        Returns:
+            DataFrame indexed by year with total and count (and the trend
+            statistics), or None if the entity is not indexed
+        """
+        code = self.locate(name)
+        if code is None:
+            return None
+        rows = slice(self.offsets[code], self.offsets[code + 1])
+        data = self.trends().iloc[rows].drop(columns='entity') if trends else self.entries.iloc[rows]
+        return data.set_index('year')
+
+    def trends(self) -> pd.DataFrame:
+        """
+        Trend statistics of every entity and year, computed for all entities at once.
+
+        Years without grants count as zero funding in the statistics.
+
+        Returns:
+            DataFrame aligned with the entries, with entity, year, total and count,
+            yoy_growth (relative to the previous year, NaN without funding that year),
+            moving_average (mean total of the last MOVING_AVERAGE_YEARS years), rank
+            (by total among the entities funded that year, 1 = most) and rank_change
+            (places gained since the previous year, NaN if not funded then)
+        """
+        if self._trends is not None:
+            return self._trends
+
+        entity = self.entities()
+        years = self.entries['year'].to_numpy(dtype=np.int64)
+        totals = self.entries['total'].to_numpy()
+
+        # One sorted key per entry; the gap between entities keeps windows from
+        # reaching into the previous entity's years
+        first = years.min() if len(years) else 0
+        span = (years.max() - first + 1 if len(years) else 1) + MOVING_AVERAGE_YEARS
+        keys = entity * span + (years - first)
+
+        previous = np.searchsorted(keys, keys - 1)
+        has_previous = previous < len(keys)
+        has_previous[has_previous] = keys[previous[has_previous]] == keys[has_previous] - 1
+        previous_total = np.where(has_previous, totals[np.minimum(previous, len(keys) - 1)], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yoy_growth = np.where(previous_total > 0, (totals - previous_total) / previous_total, np.nan)
+
+        cumulative = np.concatenate([[0.0], np.cumsum(totals)])
+        window_start = np.searchsorted(keys, keys - (MOVING_AVERAGE_YEARS - 1))
+        moving_average = (cumulative[np.arange(len(keys)) + 1] - cumulative[window_start]) / MOVING_AVERAGE_YEARS
+
+        rank = pd.Series(totals).groupby(years).rank(method='min', ascending=False).to_numpy()
+        rank_change = np.where(has_previous, rank[np.minimum(previous, len(keys) - 1)] - rank, np.nan)
+
+        self._trends = pd.DataFrame({
+            'entity': pd.Categorical.from_codes(entity, categories=self.names),
+            'year': self.entries['year'].to_numpy(),
+            'total': totals,
+            'count': self.entries['count'].to_numpy(),
+            'yoy_growth': yoy_growth,
+            'moving_average': moving_average,
+            'rank': rank.astype(np.int64),
+            'rank_change': rank_change,
+        })
+        return self._trends
+
+class TrajectoryIndex:
+    """
+    Trajectories of the institutions and recipients of a processed dataset.
+
+    The index also records a content fingerprint of the dataset it was built from,
+    so it is only used for that data.
+    """
+
+    def __init__(self, trajectories: Dict[str, Trajectories], fingerprint: str):
+        """
+        Initialize the index.
+
+        Args:
+            trajectories: Trajectories per entity kind (see TRAJECTORY_ENTITIES)
+            fingerprint: content_fingerprint of the TRAJECTORY_SOURCE_COLUMNS of the
+                indexed dataset
+        """
+        self.trajectories = trajectories
+        self.fingerprint = fingerprint
+
+    def __getitem__(self, kind: str) -> Trajectories:
+        if kind not in self.trajectories:
+            raise ValueError(f"Unknown trajectory entity '{kind}'. Choose from: {', '.join(TRAJECTORY_ENTITIES)}")
+        return self.trajectories[kind]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'TrajectoryIndex':
+        """
+        Build the trajectory index of a processed dataset.
+
+        Args:
+            df: Processed grant data with the TRAJECTORY_SOURCE_COLUMNS
+
+        Returns:
+            TrajectoryIndex of the dataset
+        """
+        return cls({kind: Trajectories.from_frame(df, column) for kind, column in TRAJECTORY_ENTITIES.items()},
+                   content_fingerprint(df, TRAJECTORY_SOURCE_COLUMNS))
+
+    def describes(self, df: pd.DataFrame) -> bool:
+        """Check whether the index was built from a DataFrame, by the fingerprint of its source columns."""
+        if any(col not in df.columns for col in TRAJECTORY_SOURCE_COLUMNS):
+            return False
+        return content_fingerprint(df, TRAJECTORY_SOURCE_COLUMNS) == self.fingerprint
+
+    def lookup(self, name: str, trends: bool = True) -> Optional[pd.DataFrame]:
+        """
+        Yearly funding of an institution or, failing that, a recipient.
+
+        Args:
+            name: Institution or recipient name
+            trends: Include the trend statistics
+
+        Returns:
+            The entity's series (see Trajectories.series), or None if neither kind
+            indexes the name
+        """
+        for trajectories in self.trajectories.values():
+            series = trajectories.series(name, trends=trends)
+            if series is not None:
+                return series
+        return None
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Store the index; the metadata file is written last and marks it as complete.
+
+        Args:
+            path: Index path (see trajectory_path)
+
+        Returns:
+            Path of the index's metadata file
+        """
+        frames = {}
+        for kind, trajectories in self.trajectories.items():
+            frames[kind] = trajectories.entries
+            frames[f"{kind}_names"] = pd.DataFrame({'name': trajectories.names.to_numpy(dtype=object),
+                                                    'offset': trajectories.offsets[:-1]})
+        return write_frames(path, frames, {
+            "version": TRAJECTORY_VERSION,
+            "entities": TRAJECTORY_ENTITIES,
+            "fingerprint": self.fingerprint,
+            "sizes": {kind: [len(t), len(t.entries)] for kind, t in self.trajectories.items()},
+        })
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional['TrajectoryIndex']:
+        """
+        Load a stored index.
+
+        Args:
+            path: Index path (see trajectory_path)
+
+        Returns:
+            The stored TrajectoryIndex, or None if there is no complete, current index
+        """
+        meta = read_meta(path, version=TRAJECTORY_VERSION, entities=TRAJECTORY_ENTITIES)
+        members = [name for kind in TRAJECTORY_ENTITIES for name in (kind, f"{kind}_names")]
+        frames = read_frames(path, members) if meta is not None else None
+        if frames is None:
+            return None
+
+        trajectories = {}
+        for kind in TRAJECTORY_ENTITIES:
+            entries, names = frames[kind], frames[f"{kind}_names"]
+            offsets = np.append(names['offset'].to_numpy(dtype=np.int64), len(entries))
+            trajectories[kind] = Trajectories(pd.Index(names['name'].to_numpy(dtype=object), dtype=object),
+                                              offsets, entries)
+        return cls(trajectories, meta["fingerprint"])